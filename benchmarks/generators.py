@@ -0,0 +1,102 @@
+"""
+Seeded generators of synthetic channel messages.
+
+Messages mimic real posts: official ones have emoji header, bullet list of raions and hashtag footer,
+volunteer ones are free-form eTryvoga posts. Same seed always gives the same messages.
+"""
+
+import datetime
+import random
+from typing import Iterator
+
+from processors.location_index import load_location_index
+from processors.message_sources import ArchivedMessage
+from processors.volunteer_etryvoga_processor import city_keywords
+
+OFFICIAL_START_DATE = datetime.datetime(2022, 3, 15, tzinfo=datetime.timezone.utc)
+VOLUNTEER_START_DATE = datetime.datetime(2022, 2, 25, tzinfo=datetime.timezone.utc)
+
+VOLUNTEER_TEMPLATES = [
+    "Повітряна тривога! {place}",
+    "❗️{place} — повітряна тривога, всі в укриття!",
+    "Загроза ракетного удару, {place}",
+    "{place}: сирени",
+    "Відбій тривоги {place}",
+    "✅ {place} — відбій",
+    "Кінець тривоги. {place}",
+    # Ignored notifications
+    "{place}, тривога триває",
+]
+
+
+def display_name(location: tuple[str, str, str, str]) -> str:
+    oblast, raion, hromada, level = location
+    return {"oblast": oblast, "raion": raion, "hromada": hromada}[level]
+
+
+def hashtag(name: str) -> str:
+    # Same as location_to_hashtag, but keeps the case as the channel does
+    return "#" + name.replace("-", "").replace(" ", "_").replace(".", "").replace("'", "").replace("’", "")
+
+
+def official_message_text(rng: random.Random, date: datetime.datetime, names: list[str], is_activated: bool) -> str:
+    header = (
+        "🔴 {} Повітряна тривога в" if is_activated else rng.choice(["🟢 {} Відбій тривоги в", "🟡 {} Відбій тривоги в"])
+    )
+    header = header.format(date.strftime("%H:%M"))
+    footer = " ".join(hashtag(name) for name in names)
+
+    if len(names) == 1:
+        return f"{header} {names[0]}.\n\n{footer}"
+
+    bullets = "\n".join(f"• {name}" for name in names)
+    return f"{header}\n{bullets}\n\n{footer}"
+
+
+def official_messages(count: int, seed: int = 0, start_id: int = 1) -> Iterator[ArchivedMessage]:
+    """
+    Messages of `air_alert_ua` channel, about 2% are test region messages, which are ignored.
+    """
+    rng = random.Random(seed)
+
+    # Only names which give the same hashtag as in index, like real posts
+    names = sorted(
+        {
+            display_name(location)
+            for key, location in load_location_index().items()
+            if hashtag(display_name(location)).lower() == key
+        }
+    )
+    active_names = set()
+    date = OFFICIAL_START_DATE
+
+    for message_id in range(start_id, start_id + count):
+        date += datetime.timedelta(seconds=rng.randint(0, 600))
+
+        if rng.random() < 0.02:
+            text = "🔴 Тестовий Регіон\n\n#Тестовий_регіон"
+        elif rng.random() < 0.55 or not active_names:
+            started_names = rng.sample(names, rng.choice([1, 1, 1, 2, 3, 5]))
+            active_names.update(started_names)
+            text = official_message_text(rng, date, started_names, is_activated=True)
+        else:
+            finished_names = rng.sample(sorted(active_names), min(len(active_names), rng.choice([1, 1, 2, 4])))
+            active_names.difference_update(finished_names)
+            text = official_message_text(rng, date, finished_names, is_activated=False)
+
+        yield ArchivedMessage(id=message_id, date=date, message=text)
+
+
+def volunteer_messages(count: int, seed: int = 0, start_id: int = 1) -> Iterator[ArchivedMessage]:
+    """
+    Messages of `UkraineAlarmSignal` channel in eTryvoga style.
+    """
+    rng = random.Random(seed)
+    places = sorted(keyword for keywords in city_keywords.values() for keyword in keywords)
+    date = VOLUNTEER_START_DATE
+
+    for message_id in range(start_id, start_id + count):
+        date += datetime.timedelta(seconds=rng.randint(0, 600))
+        text = rng.choice(VOLUNTEER_TEMPLATES).format(place=rng.choice(places))
+
+        yield ArchivedMessage(id=message_id, date=date, message=text)
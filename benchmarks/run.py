@@ -0,0 +1,171 @@
+"""
+Benchmarks of channel processors on synthetic messages.
+
+Usage:
+    python -m benchmarks.run --messages 20000 --output benchmarks/results/current.json
+    python -m benchmarks.run --compare benchmarks/results/baseline.json
+
+Every benchmark reports operations per second and peak memory allocated by Python (tracemalloc),
+results are written as JSON, so they can be compared between commits.
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import pathlib
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from typing import Callable
+
+from processors.official_channel_processor import OfficialAirAlertProcessor
+from processors.state_store import StateStore
+from processors.volunteer_etryvoga_processor import VolunteerEtryvogaProcessor
+
+from .generators import official_messages, volunteer_messages
+
+results_dir_path = pathlib.Path(__file__).parent.resolve() / "results"
+
+
+def measure(name: str, operations: int, function: Callable[[], None], repeat: int = 3) -> dict:
+    """
+    Runs function several times, the best time is reported.
+    Memory is measured in a separate run, because tracemalloc slows everything down.
+
+    :param operations: Number of processed items in one run, e.g. messages
+    """
+    timings = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started_at)
+
+    tracemalloc.start()
+    function()
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    best_time = min(timings)
+    print(f"{name:<30} {operations / best_time:>14,.0f} ops/s {peak_memory / 2**20:>10.1f} MiB")
+
+    return {
+        "name": name,
+        "operations": operations,
+        "seconds": best_time,
+        "ops_per_second": operations / best_time,
+        "peak_memory_bytes": peak_memory,
+    }
+
+
+def new_processor(processor_class, tmp_dir: pathlib.Path):
+    # Nothing should be read from or written to real state and datasets
+    processor = processor_class(source=object(), state_store=StateStore(":memory:"))
+    processor.active_alerts_by_location = {}
+    processor.completed_alerts = []
+    processor.dataset_file_paths = {
+        lang: tmp_dir / f"{processor.dataset_name}_data_{lang}.csv" for lang in processor.dataset_file_paths
+    }
+
+    return processor
+
+
+def run_benchmarks(messages_count: int, seed: int) -> list[dict]:
+    results = []
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = pathlib.Path(tmp_dir)
+
+        for processor_class, generate in [
+            (OfficialAirAlertProcessor, official_messages),
+            (VolunteerEtryvogaProcessor, volunteer_messages),
+        ]:
+            messages = list(generate(messages_count, seed=seed))
+            processor = new_processor(processor_class, tmp_dir)
+            prefix = processor.dataset_name
+
+            def parse_messages():
+                for message in messages:
+                    processor.parse_message(message)
+
+            def process_messages():
+                processor.active_alerts_by_location = {}
+                processor.completed_alerts = []
+                for message in messages:
+                    processor.process_message(message)
+
+            def write_to_file():
+                for file_path in processor.dataset_file_paths.values():
+                    file_path.unlink(missing_ok=True)
+                processor.write_to_file("uk")
+
+            results.append(measure(f"{prefix}.parse_message", len(messages), parse_messages))
+            results.append(measure(f"{prefix}.process_message", len(messages), process_messages))
+            results.append(measure(f"{prefix}.write_to_file", len(processor.completed_alerts), write_to_file))
+
+        processor = new_processor(OfficialAirAlertProcessor, tmp_dir)
+        results.append(measure("official.load_states", 1, processor.load_states))
+
+    return results
+
+
+def current_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results: list[dict], baseline_path: pathlib.Path):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {result["name"]: result for result in json.load(f)["results"]}
+
+    print(f"\nCompared with {baseline_path}:")
+    for result in results:
+        if result["name"] not in baseline:
+            continue
+
+        speedup = result["ops_per_second"] / baseline[result["name"]]["ops_per_second"]
+        memory = result["peak_memory_bytes"] / max(baseline[result["name"]]["peak_memory_bytes"], 1)
+        print(f"{result['name']:<30} {speedup:>8.2f}x speed {memory:>8.2f}x memory")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark channel processors on synthetic messages")
+    parser.add_argument("--messages", type=int, default=20000, help="Number of generated messages per channel")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=pathlib.Path, help="JSON file, `results/<commit>.json` by default")
+    parser.add_argument("--compare", type=pathlib.Path, help="JSON file with results of another run")
+    args = parser.parse_args()
+
+    # Processors log every message, it would be benchmarked instead of processing
+    logging.disable(logging.CRITICAL)
+
+    commit = current_commit()
+    results = run_benchmarks(args.messages, args.seed)
+
+    output_path = args.output or results_dir_path / f"{commit}.json"
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "commit": commit,
+                "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "messages": args.messages,
+                "seed": args.seed,
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    print(f"\nResults are written to {output_path}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
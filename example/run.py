@@ -0,0 +1,21 @@
+"""
+Renders hourly maps of official alerts for the first week of the official channel (since 15 March 2022)
+into `maps/official/`.
+
+Boundaries are needed only for the first run, the lookup of shapes is cached afterwards.
+Boundaries of Ukraine in this layout are published by OCHA (COD-AB), e.g. on https://data.humdata.org/.
+"""
+
+import logging
+import sys
+
+from processors.maps import render_frames
+
+logging.basicConfig(level=logging.INFO)
+
+boundary_paths = None
+if len(sys.argv) == 4:
+    boundary_paths = dict(zip(["oblast", "raion", "hromada"], sys.argv[1:]))
+
+paths = render_frames("2022-03-15", "2022-03-22", freq="1h", boundary_paths=boundary_paths)
+print(f"Rendered {len(paths)} frames, the first one is {paths[0]}")
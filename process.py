@@ -1,21 +1,131 @@
+import argparse
+import asyncio
+import sys
+
 from telethon import TelegramClient
 from telethon.sessions import StringSession
 
 from config import API_ID, API_HASH, API_SESSION_STRING
+from processors.aggregations import aggregate_all
+from processors.backfill import ParallelBackfillSource
+from processors.hierarchy_rollup import write_coverage
+from processors.message_archive import ArchivingMessageSource, MessageArchive, archive_dir_path
+from processors.live import make_live
+from processors.message_sources import source_from_path
+from processors.metrics import write_metrics
 from processors.official_channel_processor import OfficialAirAlertProcessor
+from processors.parquet_export import export_all
+from processors.runner import run_processors
+from processors.sharded_rebuild import ShardedRebuild
 from processors.volunteer_etryvoga_processor import VolunteerEtryvogaProcessor
 
-client = TelegramClient(StringSession(API_SESSION_STRING), API_ID, API_HASH)
+parser = argparse.ArgumentParser(description="Download channel messages and build datasets")
+parser.add_argument(
+    "--volunteer-archive",
+    help="Replay volunteer channel from local .jsonl or .sqlite archive instead of Telegram",
+)
+parser.add_argument(
+    "--official-archive",
+    help="Replay official channel from local .jsonl or .sqlite archive instead of Telegram",
+)
+parser.add_argument(
+    "--from-archive",
+    action="store_true",
+    help="Replay both channels from local compressed archive, populated by previous runs",
+)
+parser.add_argument(
+    "--backfill",
+    action="store_true",
+    help="Fetch channel history from Telegram in concurrent chunks, useful to rebuild datasets from scratch",
+)
+parser.add_argument(
+    "--live",
+    action="store_true",
+    help="Keep running and process new messages as soon as they're posted, see processors/live.py",
+)
+parser.add_argument(
+    "--shards",
+    type=int,
+    default=0,
+    help="Run state machines of locations in this many worker processes, for rebuilds of long history",
+)
+args = parser.parse_args()
+
+if args.live and args.shards:
+    # Messages are processed in batches, while in live mode every message should be processed at once
+    parser.error("--shards can't be used with --live")
+
+if args.live and (args.volunteer_archive or args.official_archive or args.from_archive):
+    # New messages are received from Telegram only
+    parser.error("--live can't be used with archives")
+
+if args.from_archive:
+    args.volunteer_archive = args.volunteer_archive or str(archive_dir_path)
+    args.official_archive = args.official_archive or str(archive_dir_path)
+
+
+def telegram_source(client):
+    if client is None or not args.backfill:
+        # Processors read channels page by page by default
+        return None
+
+    return ArchivingMessageSource(ParallelBackfillSource(client), MessageArchive())
+
+
+def run(client, loop) -> list[str]:
+    # One source for both channels, so concurrency limit and FloodWait of the account are shared
+    shared_source = telegram_source(client)
+
+    # Both channels are independent, so they're downloaded and processed concurrently
+    volunteer_source = source_from_path(args.volunteer_archive) if args.volunteer_archive else shared_source
+    official_source = source_from_path(args.official_archive) if args.official_archive else shared_source
+
+    processors = [
+        # process_oblasts_only() creates a dataset with only oblasts info
+        # and starts from 26th of February
+        VolunteerEtryvogaProcessor(client, source=volunteer_source),
+        # Create a dataset with all official data
+        #  for oblasts, raions and hromadas,
+        #  and it starts from 15th of March
+        OfficialAirAlertProcessor(client, source=official_source),
+    ]
+
+    if args.live:
+        # Processors never finish in live mode, completed alerts are appended to datasets as usual
+        for processor in processors:
+            make_live(processor, client, MessageArchive())
+
+    if args.shards:
+        # Datasets are the same, only alerts of different locations are tracked in parallel
+        runners = [ShardedRebuild(processor, args.shards) for processor in processors]
+    else:
+        runners = processors
+
+    failed_channels = loop.run_until_complete(run_processors(runners))
+
+    # Timings and counters are written even for failed channels
+    write_metrics([processor.metrics for processor in processors], failed_channels)
+
+    # Columnar copy and summaries of datasets for analytical loads
+    for processor in processors:
+        if processor.channel_name not in failed_channels:
+            export_all(processor.dataset_name)
+            aggregate_all(processor.dataset_name)
+
+            if processor.dataset_name == "official":
+                write_coverage()
+
+    return failed_channels
+
 
+if args.volunteer_archive and args.official_archive:
+    # Everything is local, no need to connect to Telegram
+    failed_channels = run(client=None, loop=asyncio.new_event_loop())
+else:
+    client = TelegramClient(StringSession(API_SESSION_STRING), API_ID, API_HASH)
 
-with client:
-    # process_oblasts_only() creates a dataset with only oblasts info
-    # and starts from 26th of February
-    processor = VolunteerEtryvogaProcessor(client)
-    client.loop.run_until_complete(processor.process())
+    with client:
+        failed_channels = run(client, client.loop)
 
-    # Create a dataset with all official data
-    #  for oblasts, raions and hromadas,
-    #  and it starts from 15th of March
-    processor = OfficialAirAlertProcessor(client)
-    client.loop.run_until_complete(processor.process())
+if failed_channels:
+    sys.exit(f"Failed to process channels: {', '.join(failed_channels)}")
@@ -0,0 +1,126 @@
+"""
+Per-day, per-week and per-month alert counts and durations by location.
+
+Alerts crossing period boundaries are split between periods. Periods are computed both in UTC
+and in Kyiv local time, so daylight saving time changes are taken into account.
+Summaries are written to `datasets/aggregates/`.
+"""
+
+import logging
+import pathlib
+
+import numpy as np
+import pandas as pd
+
+from .datasets import LANGUAGES, LOCATION_COLUMNS, datasets_dir_path, read_dataset
+
+logger = logging.getLogger(__name__)
+
+aggregates_dir_path = datasets_dir_path / "aggregates"
+
+# Period name => pandas period frequency, weeks start on Monday
+PERIODS = {
+    "daily": "D",
+    "weekly": "W-SUN",
+    "monthly": "M",
+}
+
+TIMEZONES = {
+    "utc": "UTC",
+    "kyiv": "Europe/Kyiv",
+}
+
+
+def split_by_periods(df: pd.DataFrame, freq: str, tz: str) -> pd.DataFrame:
+    """
+    Splits alerts into parts, which are fully inside one period of local time.
+
+    :return: DataFrame with index of original alert (`alert`), `period` (start of period in local time),
+             `started_at` and `finished_at` of the part in nanoseconds since epoch
+    """
+    # Nanoseconds since epoch, so clipping by period boundaries is done on integers
+    started_at = to_nanoseconds(df["started_at"])
+    finished_at = to_nanoseconds(df["finished_at"])
+    # Alert finished exactly at midnight doesn't take any time of the next day
+    last_moment = np.maximum(finished_at - 1, started_at)
+
+    first_period = to_periods(started_at, freq, tz)
+    last_period = to_periods(last_moment, freq, tz)
+
+    parts_count = last_period - first_period + 1
+    alert = np.repeat(np.arange(len(df)), parts_count)
+    # Position of every part inside its alert
+    part = np.arange(parts_count.sum()) - np.repeat(np.cumsum(parts_count) - parts_count, parts_count)
+    period = first_period[alert] + part
+
+    # Period boundaries in local time, converted to absolute moments
+    period_start = pd.PeriodIndex.from_ordinals(period, freq=freq).start_time
+    period_end = pd.PeriodIndex.from_ordinals(period + 1, freq=freq).start_time
+
+    return pd.DataFrame(
+        {
+            "alert": alert,
+            "period": period_start,
+            "started_at": np.maximum(started_at[alert], to_nanoseconds(period_start.tz_localize(tz))),
+            "finished_at": np.minimum(finished_at[alert], to_nanoseconds(period_end.tz_localize(tz))),
+        }
+    )
+
+
+def to_nanoseconds(dates) -> np.ndarray:
+    return pd.DatetimeIndex(dates).tz_convert("UTC").as_unit("ns").asi8
+
+
+def to_periods(nanoseconds: np.ndarray, freq: str, tz: str) -> np.ndarray:
+    """
+    :return: ordinals of periods in local time
+    """
+    local_time = pd.DatetimeIndex(nanoseconds, tz="UTC").tz_convert(tz).tz_localize(None)
+    return local_time.to_period(freq).asi8
+
+
+def aggregate(df: pd.DataFrame, location_columns: list[str], freq: str, tz: str) -> pd.DataFrame:
+    """
+    :return: DataFrame with location columns, `period`, `alerts` (number of alerts started in the period)
+             and `minutes` (time under alert in the period)
+    """
+    parts = split_by_periods(df, freq, tz)
+
+    for column in location_columns:
+        parts[column] = df[column].array[parts["alert"]]
+    parts["minutes"] = (parts["finished_at"] - parts["started_at"]) / 60e9
+    # Every alert is counted only in the period where it started
+    parts["alerts"] = ~parts["alert"].duplicated()
+
+    summary = parts.groupby(location_columns + ["period"], observed=True, sort=True).agg(
+        alerts=("alerts", "sum"), minutes=("minutes", "sum")
+    )
+    summary["minutes"] = summary["minutes"].round(2)
+
+    return summary.reset_index()
+
+
+def aggregate_dataset(dataset_name: str, lang: str = "uk") -> list[pathlib.Path]:
+    """
+    Writes all summaries of a dataset, returns their paths.
+    """
+    df = read_dataset(dataset_name, lang)
+    aggregates_dir_path.mkdir(parents=True, exist_ok=True)
+
+    paths = []
+    for period_name, freq in PERIODS.items():
+        for tz_name, tz in TIMEZONES.items():
+            summary = aggregate(df, LOCATION_COLUMNS[dataset_name], freq, tz)
+
+            path = aggregates_dir_path / f"{dataset_name}_{period_name}_{tz_name}_{lang}.csv"
+            summary.to_csv(path, index=False)
+            paths.append(path)
+
+    logger.info("Aggregated %s rows of %s dataset into %s files", len(df), dataset_name, len(paths))
+
+    return paths
+
+
+def aggregate_all(dataset_name: str):
+    for lang in LANGUAGES:
+        aggregate_dataset(dataset_name, lang)
@@ -0,0 +1,200 @@
+"""
+Interval index over alert datasets for point-in-time and range-overlap queries.
+
+Alerts are grouped by location (oblast, raion, hromada, level for official dataset and region for volunteer one).
+Inside every group alerts are sorted by `started_at` and `max_finished_at` keeps the running maximum of
+`finished_at`, so both arrays are monotonic and candidates are found with binary search.
+
+The index is saved to `cache/alert_index/<dataset file>.npz` and rebuilt only when the dataset file is changed.
+"""
+
+import datetime
+import io
+import logging
+import os
+import pathlib
+from typing import Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from .datasets import LOCATION_COLUMNS, NOT_FINISHED, dataset_path, read_dataset, series_to_seconds, to_seconds
+from .files import write_atomically
+
+logger = logging.getLogger(__name__)
+
+alert_index_dir_path = pathlib.Path(__file__).parent.resolve() / "cache" / "alert_index"
+
+# Seconds fit into 33 bits till year 2242
+GROUP_SHIFT = 33
+MAX_SECONDS = (1 << GROUP_SHIFT) - 1
+
+
+class AlertIndex:
+    def __init__(
+        self,
+        dataset_name: str,
+        locations: np.ndarray,
+        offsets: np.ndarray,
+        started_at: np.ndarray,
+        finished_at: np.ndarray,
+        max_finished_at: np.ndarray,
+    ):
+        """
+        :param locations: 2d array of location names, one row per group
+        :param offsets: group i occupies [offsets[i], offsets[i + 1]) of alert arrays
+        """
+        self.dataset_name = dataset_name
+        self.location_columns = LOCATION_COLUMNS[dataset_name]
+        self.locations = locations
+        self.offsets = offsets
+        self.started_at = started_at
+        self.finished_at = finished_at
+        self.max_finished_at = max_finished_at
+
+        # Group number in high bits makes keys sorted across all groups, so all groups are searched at once
+        group_keys = np.repeat(np.arange(len(locations), dtype=np.int64), np.diff(offsets)) << GROUP_SHIFT
+        self.started_at_keys = group_keys | np.minimum(started_at, MAX_SECONDS)
+        self.max_finished_at_keys = group_keys | np.minimum(max_finished_at, MAX_SECONDS)
+
+    def __len__(self) -> int:
+        return len(self.started_at)
+
+    @classmethod
+    def from_dataframe(cls, dataset_name: str, df: pd.DataFrame) -> "AlertIndex":
+        location_columns = LOCATION_COLUMNS[dataset_name]
+
+        df = df[location_columns + ["started_at", "finished_at"]].copy()
+        for column in location_columns:
+            df[column] = df[column].astype(str)
+        df["started_at"] = series_to_seconds(df["started_at"])
+        df["finished_at"] = series_to_seconds(df["finished_at"])
+        df = df.sort_values(location_columns + ["started_at"], kind="stable").reset_index(drop=True)
+
+        # First row of every group
+        is_first = np.ones(len(df), dtype=bool)
+        if len(df):
+            is_first[1:] = (df[location_columns].iloc[1:].values != df[location_columns].iloc[:-1].values).any(axis=1)
+        starts = np.flatnonzero(is_first)
+
+        started_at = df["started_at"].to_numpy(dtype=np.int64)
+        finished_at = df["finished_at"].to_numpy(dtype=np.int64)
+
+        # Running maximum restarts at every group
+        max_finished_at = np.empty_like(finished_at)
+        bounds = np.append(starts, len(df))
+        for begin, end in zip(bounds[:-1], bounds[1:]):
+            max_finished_at[begin:end] = np.maximum.accumulate(finished_at[begin:end])
+
+        return cls(
+            dataset_name=dataset_name,
+            locations=df[location_columns].iloc[starts].to_numpy(dtype=str).reshape(len(starts), len(location_columns)),
+            offsets=bounds,
+            started_at=started_at,
+            finished_at=finished_at,
+            max_finished_at=max_finished_at,
+        )
+
+    def save(self, path: pathlib.Path, source_stat: tuple[int, int]):
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        content = io.BytesIO()
+        np.savez(
+            content,
+            source_stat=np.array(source_stat, dtype=np.int64),
+            locations=self.locations,
+            offsets=self.offsets,
+            started_at=self.started_at,
+            finished_at=self.finished_at,
+            max_finished_at=self.max_finished_at,
+        )
+        write_atomically(path, content.getvalue())
+
+    @classmethod
+    def load(cls, dataset_name: str, lang: str = "uk") -> "AlertIndex":
+        """
+        Loads index from cache or builds it if the dataset file was changed.
+        """
+        csv_path = dataset_path(dataset_name, lang)
+        stat = os.stat(csv_path)
+        source_stat = (stat.st_mtime_ns, stat.st_size)
+        index_path = alert_index_dir_path / f"{csv_path.stem}.npz"
+
+        if os.path.exists(index_path):
+            try:
+                with np.load(index_path) as cached:
+                    if tuple(cached["source_stat"]) == source_stat:
+                        return cls(
+                            dataset_name=dataset_name,
+                            locations=cached["locations"],
+                            offsets=cached["offsets"],
+                            started_at=cached["started_at"],
+                            finished_at=cached["finished_at"],
+                            max_finished_at=cached["max_finished_at"],
+                        )
+            except (ValueError, KeyError, OSError):
+                logger.warning("Alert index %s is broken, rebuilding it", index_path)
+
+        logger.info("Building alert index for %s", csv_path)
+        index = cls.from_dataframe(dataset_name, read_dataset(dataset_name, lang))
+        index.save(index_path, source_stat)
+
+        return index
+
+    def groups(self, **location) -> np.ndarray:
+        """
+        :param location: filter by location columns, e.g. oblast="Харківська область"
+        :return: indices of matching groups
+        """
+        unknown_columns = set(location) - set(self.location_columns)
+        if unknown_columns:
+            raise ValueError(f"Unknown location columns for {self.dataset_name} dataset: {sorted(unknown_columns)}")
+
+        mask = np.ones(len(self.locations), dtype=bool)
+        for column, value in location.items():
+            mask &= self.locations[:, self.location_columns.index(column)] == value
+
+        return np.flatnonzero(mask)
+
+    def overlapping(
+        self, start: Union[datetime.datetime, str], end: Optional[Union[datetime.datetime, str]] = None, **location
+    ) -> pd.DataFrame:
+        """
+        Alerts active at any moment of [start, end], or at `start` if `end` isn't given.
+
+        :param location: filter by location columns, e.g. oblast="Харківська область"
+        :return: DataFrame with location columns, started_at and finished_at
+        """
+        start_seconds = to_seconds(start, round_up=True)
+        end_seconds = to_seconds(end if end is not None else start)
+
+        group_keys = self.groups(**location).astype(np.int64) << GROUP_SHIFT
+
+        # Alerts started after the end of the window can't overlap it
+        last = np.searchsorted(self.started_at_keys, group_keys | min(end_seconds, MAX_SECONDS), side="right")
+        # Alerts before the first one with max_finished_at >= start are all finished before the window
+        first = np.searchsorted(self.max_finished_at_keys, group_keys | min(start_seconds, MAX_SECONDS), side="left")
+
+        lengths = np.maximum(last - first, 0)
+        # Concatenation of ranges [first, last) of all groups
+        candidates = np.repeat(first - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        positions = candidates[self.finished_at[candidates] >= start_seconds]
+
+        return self.to_dataframe(positions)
+
+    def at(self, moment: Union[datetime.datetime, str], **location) -> pd.DataFrame:
+        """
+        Alerts active at the moment.
+        """
+        return self.overlapping(moment, **location)
+
+    def to_dataframe(self, positions: np.ndarray) -> pd.DataFrame:
+        groups = np.searchsorted(self.offsets, positions, side="right") - 1
+
+        df = pd.DataFrame(self.locations[groups], columns=self.location_columns)
+        df["started_at"] = pd.to_datetime(self.started_at[positions], unit="s", utc=True)
+
+        finished_at = pd.Series(self.finished_at[positions])
+        df["finished_at"] = pd.to_datetime(finished_at.where(finished_at != NOT_FINISHED), unit="s", utc=True)
+
+        return df.sort_values(["started_at"] + self.location_columns, kind="stable").reset_index(drop=True)
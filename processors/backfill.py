@@ -0,0 +1,109 @@
+"""
+Parallel backfill of channel history.
+
+Telethon pages through the history one request at a time, so rebuilding datasets from the first message
+is limited by round-trips. `ParallelBackfillSource` splits the id range into chunks, fetches several chunks
+at once and yields messages strictly in id order, as processors expect.
+"""
+
+import asyncio
+import collections
+import logging
+import time
+from typing import AsyncIterator
+
+from telethon.errors import FloodWaitError
+
+logger = logging.getLogger(__name__)
+
+
+class ParallelBackfillSource:
+    """
+    Source fetching id ranges of channel history concurrently with Telethon client.
+
+    One instance should be used for all channels of a client, so they share the concurrency limit and FloodWait.
+    """
+
+    def __init__(self, client, chunk_size: int = 1000, concurrency: int = 4, max_retries: int = 5):
+        """
+        :param chunk_size: Number of message ids in one chunk
+        :param concurrency: Max number of chunks fetched at the same time by all channels,
+                            at most twice as many chunks of every channel are kept in memory
+        :param max_retries: Retries of a chunk on connection errors, FloodWait is always waited out
+        """
+        self.client = client
+        self.chunk_size = chunk_size
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+
+        self.semaphore = asyncio.Semaphore(concurrency)
+        # FloodWait is applied to the whole account, so all chunks wait till this moment
+        self.resume_at = 0.0
+
+    async def wait_for_flood(self):
+        while (delay := self.resume_at - time.monotonic()) > 0:
+            await asyncio.sleep(delay)
+
+    async def fetch_chunk(self, channel_name: str, min_id: int, max_id: int) -> list:
+        """
+        :return: messages with min_id < id <= max_id in id order
+        """
+        retries = 0
+
+        while True:
+            await self.wait_for_flood()
+
+            async with self.semaphore:
+                try:
+                    return [
+                        message
+                        async for message in self.client.iter_messages(
+                            channel_name, reverse=True, min_id=min_id, max_id=max_id + 1
+                        )
+                    ]
+                except FloodWaitError as e:
+                    logger.warning("FloodWait for %s seconds while fetching %s..%s", e.seconds, min_id, max_id)
+                    self.resume_at = max(self.resume_at, time.monotonic() + e.seconds)
+                except (ConnectionError, asyncio.TimeoutError) as e:
+                    retries += 1
+                    if retries > self.max_retries:
+                        raise
+
+                    delay = 2**retries
+                    logger.warning("Failed to fetch %s..%s: %s, retrying in %s seconds", min_id, max_id, e, delay)
+                    await asyncio.sleep(delay)
+
+    async def iter_messages(self, channel_name: str, min_id: int = 0) -> AsyncIterator:
+        latest_messages = await self.client.get_messages(channel_name, limit=1)
+        if not latest_messages:
+            return
+
+        last_id = latest_messages[0].id
+        chunks = iter(range(min_id, last_id, self.chunk_size))
+
+        def schedule_next_chunk():
+            chunk_min_id = next(chunks, None)
+            if chunk_min_id is not None:
+                chunk_max_id = min(chunk_min_id + self.chunk_size, last_id)
+                pending.append(asyncio.ensure_future(self.fetch_chunk(channel_name, chunk_min_id, chunk_max_id)))
+
+        pending = collections.deque()
+        for _ in range(self.concurrency * 2):
+            schedule_next_chunk()
+
+        logger.info("Backfilling %s from %s to %s", channel_name, min_id, last_id)
+
+        try:
+            while pending:
+                messages = await pending.popleft()
+                schedule_next_chunk()
+
+                for message in messages:
+                    yield message
+        finally:
+            for task in pending:
+                task.cancel()
+
+        # Messages posted during backfill
+        async for message in self.client.iter_messages(channel_name, reverse=True, min_id=max(last_id, min_id)):
+            yield message
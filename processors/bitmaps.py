@@ -0,0 +1,399 @@
+"""
+Run-length bitmaps of alert state per location over minutes since the start of the full-scale invasion.
+
+Minute m of a location is set when any alert of the location overlaps [m, m + 1), so alerts of a location are merged
+into sorted disjoint runs [start, end) of minutes. Runs of all locations are kept in flat arrays with offsets,
+like rows of a compressed sparse row matrix, and every operation is vectorized over runs:
+ - `intersection` / `union` / `at_least` of several locations, by a single sweep over run boundaries;
+ - `popcount` of minutes under alert of every location in a time window;
+ - `cooccurrence` matrix, i.e. minutes under alert together for every pair of locations.
+
+Bitmaps are saved to `cache/bitmaps/<dataset file>.npz` together with the size of the processed part of CSV file.
+When rows are appended to the dataset, only the new rows are read and merged into existing runs.
+"""
+
+import datetime
+import hashlib
+import io
+import logging
+import os
+import pathlib
+from typing import Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from .datasets import LOCATION_COLUMNS, dataset_path, read_dataset, series_to_seconds, to_seconds
+from .files import write_atomically
+from .hierarchy_rollup import merge_intervals
+
+logger = logging.getLogger(__name__)
+
+bitmaps_dir_path = pathlib.Path(__file__).parent.resolve() / "cache" / "bitmaps"
+
+# Minute 0 of bitmaps
+BITMAP_EPOCH = pd.Timestamp("2022-02-24", tz="UTC")
+EPOCH_SECONDS = int(BITMAP_EPOCH.timestamp())
+
+# Appended rows are merged only if this tail of the processed part wasn't changed
+TAIL_CHECK_SIZE = 4096
+
+# Limit of cells in the coverage matrix of `cooccurrence`, i.e. locations * segments of time processed at once
+MAX_COVERAGE_CELLS = 2**22
+
+
+def to_minute(moment: Union[datetime.datetime, str], round_up: bool = False) -> int:
+    """
+    Minute number since `BITMAP_EPOCH`, naive moments are treated as UTC.
+    """
+    seconds = to_seconds(moment, round_up) - EPOCH_SECONDS
+    return -(-seconds // 60) if round_up else seconds // 60
+
+
+def seconds_to_minutes(started_at: np.ndarray, finished_at: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Alert [started_at, finished_at) covers minutes [floor(started_at), ceil(finished_at)).
+    """
+    starts = np.maximum((started_at - EPOCH_SECONDS) // 60, 0)
+    ends = -((EPOCH_SECONDS - finished_at) // 60)
+    return starts, ends
+
+
+def file_tail_hash(csv_path: pathlib.Path, size: int) -> str:
+    with open(csv_path, "rb") as f:
+        f.seek(max(size - TAIL_CHECK_SIZE, 0))
+        return hashlib.blake2b(f.read(min(size, TAIL_CHECK_SIZE)), digest_size=16).hexdigest()
+
+
+def merge_runs(locations: np.ndarray, starts: np.ndarray, ends: np.ndarray, count: int) -> tuple:
+    """
+    :return: tuple (offsets, starts, ends) of merged runs of locations 0..count-1
+    """
+    is_empty = ends <= starts
+    merged = merge_intervals(locations[~is_empty], starts[~is_empty], ends[~is_empty])
+
+    merged_locations = merged["location"].to_numpy(dtype=np.int64)
+    offsets = np.searchsorted(merged_locations, np.arange(count + 1), side="left")
+
+    return offsets, merged["started_at"].to_numpy(dtype=np.int64), merged["finished_at"].to_numpy(dtype=np.int64)
+
+
+def combine_runs(starts: np.ndarray, ends: np.ndarray, min_count: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Minutes covered by at least `min_count` of runs, runs of one location must be disjoint.
+
+    :return: tuple (starts, ends) of sorted disjoint runs
+    """
+    if not len(starts):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    positions = np.concatenate([starts, ends])
+    deltas = np.concatenate([np.ones(len(starts), dtype=np.int64), np.full(len(ends), -1, dtype=np.int64)])
+    order = np.argsort(positions, kind="stable")
+    positions, deltas = positions[order], deltas[order]
+
+    # Number of runs covering segment [boundaries[i], boundaries[i + 1])
+    boundaries, first_indices = np.unique(positions, return_index=True)
+    counts = np.cumsum(np.add.reduceat(deltas, first_indices))
+
+    is_selected = counts[:-1] >= min_count
+    segment_starts = boundaries[:-1][is_selected]
+    segment_ends = boundaries[1:][is_selected]
+
+    # Adjacent segments are merged into one run
+    is_first = np.ones(len(segment_starts), dtype=bool)
+    is_first[1:] = segment_starts[1:] != segment_ends[:-1]
+    is_last = np.append(is_first[1:], True)[: len(is_first)]
+
+    return segment_starts[is_first], segment_ends[is_last]
+
+
+class AlertBitmaps:
+    def __init__(
+        self,
+        dataset_name: str,
+        locations: np.ndarray,
+        offsets: np.ndarray,
+        starts: np.ndarray,
+        ends: np.ndarray,
+        source_size: int = 0,
+    ):
+        """
+        :param locations: 2d array of location names, one row per location
+        :param offsets: runs of location i are [offsets[i], offsets[i + 1]) of `starts` and `ends`
+        :param source_size: Size of processed part of the dataset file
+        """
+        self.dataset_name = dataset_name
+        self.location_columns = LOCATION_COLUMNS[dataset_name]
+        self.locations = locations
+        self.offsets = offsets
+        self.starts = starts
+        self.ends = ends
+        self.source_size = source_size
+
+    def __len__(self) -> int:
+        return len(self.locations)
+
+    @classmethod
+    def from_dataframe(cls, dataset_name: str, df: pd.DataFrame, source_size: int = 0) -> "AlertBitmaps":
+        bitmaps = cls(
+            dataset_name,
+            locations=np.empty((0, len(LOCATION_COLUMNS[dataset_name])), dtype=str),
+            offsets=np.zeros(1, dtype=np.int64),
+            starts=np.empty(0, dtype=np.int64),
+            ends=np.empty(0, dtype=np.int64),
+        )
+        bitmaps.append(df)
+        bitmaps.source_size = source_size
+
+        return bitmaps
+
+    def append(self, df: pd.DataFrame):
+        """
+        Merges alerts of new dataset rows into runs.
+        """
+        location_ids = {tuple(location): i for i, location in enumerate(self.locations.tolist())}
+        new_locations = []
+
+        row_locations = np.empty(len(df), dtype=np.int64)
+        for i, location in enumerate(df[self.location_columns].astype(str).itertuples(index=False, name=None)):
+            location_id = location_ids.get(location)
+            if location_id is None:
+                location_id = location_ids[location] = len(location_ids)
+                new_locations.append(location)
+            row_locations[i] = location_id
+
+        if new_locations:
+            new_locations = np.asarray(new_locations, dtype=str).reshape(len(new_locations), -1)
+            self.locations = np.concatenate([self.locations.astype(str), new_locations])
+
+        row_starts, row_ends = seconds_to_minutes(
+            series_to_seconds(df["started_at"]).to_numpy(), series_to_seconds(df["finished_at"]).to_numpy()
+        )
+
+        run_locations = np.repeat(np.arange(len(self.offsets) - 1, dtype=np.int64), np.diff(self.offsets))
+        self.offsets, self.starts, self.ends = merge_runs(
+            np.concatenate([run_locations, row_locations]),
+            np.concatenate([self.starts, row_starts]),
+            np.concatenate([self.ends, row_ends]),
+            len(self.locations),
+        )
+
+    def save(self, path: pathlib.Path, tail_hash: str):
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        content = io.BytesIO()
+        np.savez(
+            content,
+            source_size=np.array(self.source_size, dtype=np.int64),
+            tail_hash=np.array(tail_hash),
+            locations=self.locations,
+            offsets=self.offsets,
+            starts=self.starts,
+            ends=self.ends,
+        )
+        write_atomically(path, content.getvalue())
+
+    @classmethod
+    def load(cls, dataset_name: str, lang: str = "uk") -> "AlertBitmaps":
+        """
+        Loads bitmaps from cache, rows appended to the dataset since then are merged in.
+        The bitmaps are rebuilt if the processed part of the dataset was changed.
+        """
+        csv_path = dataset_path(dataset_name, lang)
+        csv_size = os.path.getsize(csv_path)
+        bitmaps_path = bitmaps_dir_path / f"{csv_path.stem}.npz"
+
+        bitmaps = None
+        if os.path.exists(bitmaps_path):
+            try:
+                with np.load(bitmaps_path) as cached:
+                    source_size = int(cached["source_size"])
+                    if source_size <= csv_size and str(cached["tail_hash"]) == file_tail_hash(csv_path, source_size):
+                        bitmaps = cls(
+                            dataset_name,
+                            locations=cached["locations"],
+                            offsets=cached["offsets"],
+                            starts=cached["starts"],
+                            ends=cached["ends"],
+                            source_size=source_size,
+                        )
+            except (ValueError, KeyError, OSError):
+                logger.warning("Bitmaps %s are broken, rebuilding them", bitmaps_path)
+
+        if bitmaps is None:
+            logger.info("Building bitmaps for %s", csv_path)
+            bitmaps = cls.from_dataframe(dataset_name, read_dataset(dataset_name, lang), csv_size)
+        elif bitmaps.source_size < csv_size:
+            appended_rows = bitmaps.read_appended_rows(csv_path)
+            logger.info("Merging %s appended rows into bitmaps for %s", len(appended_rows), csv_path)
+            bitmaps.append(appended_rows)
+        else:
+            return bitmaps
+
+        bitmaps.save(bitmaps_path, file_tail_hash(csv_path, bitmaps.source_size))
+
+        return bitmaps
+
+    def read_appended_rows(self, csv_path: pathlib.Path) -> pd.DataFrame:
+        """
+        Rows after the processed part of the file, `source_size` is moved to the end of the last complete row.
+        """
+        with open(csv_path, "rb") as f:
+            header = f.readline()
+            f.seek(self.source_size)
+            data = f.read()
+
+        # The last row could be written partially at the moment
+        data = data[: data.rfind(b"\n") + 1]
+        self.source_size += len(data)
+
+        df = pd.read_csv(io.BytesIO(header + data), dtype=str, keep_default_na=False)
+        for column in ["started_at", "finished_at"]:
+            df[column] = pd.to_datetime(df[column], utc=True, format="ISO8601")
+
+        return df
+
+    def location_ids(self, **location) -> np.ndarray:
+        """
+        :param location: filter by location columns, e.g. oblast="Харківська область", level="oblast"
+        :return: ids of matching locations
+        """
+        unknown_columns = set(location) - set(self.location_columns)
+        if unknown_columns:
+            raise ValueError(f"Unknown location columns for {self.dataset_name} dataset: {sorted(unknown_columns)}")
+
+        mask = np.ones(len(self.locations), dtype=bool)
+        for column, value in location.items():
+            mask &= self.locations[:, self.location_columns.index(column)] == value
+
+        return np.flatnonzero(mask)
+
+    def runs(
+        self,
+        location_ids: np.ndarray,
+        start: Optional[Union[datetime.datetime, str]] = None,
+        end: Optional[Union[datetime.datetime, str]] = None,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Runs of locations clipped to [start, end).
+
+        :return: tuple (position of location in `location_ids`, starts, ends) of all runs
+        """
+        location_ids = np.asarray(location_ids, dtype=np.int64)
+        lengths = self.offsets[location_ids + 1] - self.offsets[location_ids]
+        # Position of every run within runs of its location is added to the offset of the location
+        first_positions = np.cumsum(lengths) - lengths
+        positions = np.repeat(self.offsets[location_ids] - first_positions, lengths) + np.arange(lengths.sum())
+        owners = np.repeat(np.arange(len(location_ids)), lengths)
+
+        starts = self.starts[positions]
+        ends = self.ends[positions]
+        if start is not None:
+            starts = np.maximum(starts, to_minute(start))
+        if end is not None:
+            ends = np.minimum(ends, to_minute(end, round_up=True))
+
+        is_empty = ends <= starts
+        return owners[~is_empty], starts[~is_empty], ends[~is_empty]
+
+    def at_least(
+        self,
+        location_ids: np.ndarray,
+        count: int,
+        start: Optional[Union[datetime.datetime, str]] = None,
+        end: Optional[Union[datetime.datetime, str]] = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Minutes when at least `count` of locations were under alert.
+
+        :return: tuple (starts, ends) of runs
+        """
+        _, starts, ends = self.runs(location_ids, start, end)
+        return combine_runs(starts, ends, count)
+
+    def intersection(self, location_ids: np.ndarray, start=None, end=None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Minutes when all locations were under alert.
+        """
+        return self.at_least(location_ids, len(location_ids), start, end)
+
+    def union(self, location_ids: np.ndarray, start=None, end=None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Minutes when any of locations was under alert.
+        """
+        return self.at_least(location_ids, 1, start, end)
+
+    def popcount(self, location_ids: Optional[np.ndarray] = None, start=None, end=None) -> np.ndarray:
+        """
+        :return: Number of minutes under alert of every location, all locations by default
+        """
+        if location_ids is None:
+            location_ids = np.arange(len(self.locations))
+
+        owners, starts, ends = self.runs(location_ids, start, end)
+        return np.bincount(owners, weights=ends - starts, minlength=len(location_ids)).astype(np.int64)
+
+    def cooccurrence(self, location_ids: np.ndarray, start=None, end=None) -> np.ndarray:
+        """
+        :return: Matrix of minutes when both locations were under alert, popcounts are on the diagonal
+        """
+        location_ids = np.asarray(location_ids, dtype=np.int64)
+        owners, starts, ends = self.runs(location_ids, start, end)
+        matrix = np.zeros((len(location_ids), len(location_ids)), dtype=np.float64)
+
+        # Elementary segments between all run boundaries, every run either covers a segment or not
+        boundaries = np.unique(np.concatenate([starts, ends]))
+        segments = len(boundaries) - 1
+        if segments < 1:
+            return matrix.astype(np.int64)
+
+        # Segments are processed in chunks, so coverage matrix of one chunk is bounded for any time range
+        chunk_size = max(MAX_COVERAGE_CELLS // len(location_ids), 1)
+        first_segments = np.searchsorted(boundaries, starts)
+        end_segments = np.searchsorted(boundaries, ends)
+
+        # Runs are split at chunk boundaries, pieces of every chunk are [piece_offsets[c], piece_offsets[c + 1])
+        first_chunks = first_segments // chunk_size
+        pieces = (end_segments - 1) // chunk_size - first_chunks + 1
+        piece_owners = np.repeat(owners, pieces)
+        piece_chunks = np.repeat(first_chunks - np.cumsum(pieces) + pieces, pieces) + np.arange(pieces.sum())
+        piece_firsts = np.maximum(np.repeat(first_segments, pieces), piece_chunks * chunk_size)
+        piece_ends = np.minimum(np.repeat(end_segments, pieces), (piece_chunks + 1) * chunk_size)
+
+        order = np.argsort(piece_chunks, kind="stable")
+        piece_offsets = np.searchsorted(piece_chunks[order], np.arange(-(-segments // chunk_size) + 1))
+
+        for chunk in range(len(piece_offsets) - 1):
+            chunk_pieces = order[piece_offsets[chunk] : piece_offsets[chunk + 1]]
+            if not len(chunk_pieces):
+                continue
+
+            first_segment = chunk * chunk_size
+            lengths = np.diff(boundaries[first_segment : first_segment + chunk_size + 1])
+
+            # Difference array of coverage, row per location
+            coverage = np.zeros((len(location_ids), len(lengths) + 1), dtype=np.int32)
+            np.add.at(coverage, (piece_owners[chunk_pieces], piece_firsts[chunk_pieces] - first_segment), 1)
+            np.add.at(coverage, (piece_owners[chunk_pieces], piece_ends[chunk_pieces] - first_segment), -1)
+            is_covered = (np.cumsum(coverage, axis=1)[:, :-1] > 0).astype(np.float64)
+
+            # Minute counts are far below 2**53, so products in floats are exact
+            matrix += (is_covered * lengths) @ is_covered.T
+
+        return np.rint(matrix).astype(np.int64)
+
+    def to_bits(self, location_ids: np.ndarray, start, end) -> np.ndarray:
+        """
+        Plain bitmaps of minutes [start, end), bits are packed by `numpy.packbits` along the last axis.
+        """
+        location_ids = np.asarray(location_ids, dtype=np.int64)
+        first_minute = to_minute(start)
+        minutes = to_minute(end, round_up=True) - first_minute
+
+        owners, starts, ends = self.runs(location_ids, start, end)
+        coverage = np.zeros((len(location_ids), minutes + 1), dtype=np.int32)
+        np.add.at(coverage, (owners, starts - first_minute), 1)
+        np.add.at(coverage, (owners, ends - first_minute), -1)
+
+        return np.packbits(np.cumsum(coverage, axis=1)[:, :-1] > 0, axis=1)
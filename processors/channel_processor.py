@@ -0,0 +1,351 @@
+"""
+Common part of channel processors: reading messages, streaming completed alerts to datasets and checkpoints.
+
+Subclasses parse messages of their channel into location events (`location_events`) and run the state machine
+of one location (`update_location`), everything else doesn't depend on the channel.
+"""
+
+import datetime
+import logging
+import os
+import pathlib
+import pickle
+import time
+from typing import Optional
+
+from telethon.tl.types import Message
+
+from .checkpoint import alert_from_state, alert_to_state, load_checkpoint, row_key, truncate_datasets
+from .message_archive import ArchivingMessageSource, MessageArchive
+from .message_sources import TelegramMessageSource
+from .metrics import ProcessingMetrics
+from .serialization import open_csv_writers, open_tail_indexes, save_tail_indexes, write_records
+from .state_store import StateStore
+from .streaming_writer import StreamingAlertWriter, active_watermark
+
+logger = logging.getLogger(__name__)
+
+
+class ChannelProcessor:
+    channel_name: str
+    dataset_name: str
+    fieldnames: list[str]
+    # Dataclass of alerts, see tg_dataclasses module
+    alert_class: type
+
+    active_alerts_by_location: dict
+    completed_alerts: list
+
+    last_processed_id: int = 0
+
+    dataset_file_paths: dict[str, pathlib.Path]
+
+    # State of versions before the state store, removed after the first successful run
+    pkl_file_path: pathlib.Path
+    last_processed_id_path: pathlib.Path
+    legacy_checkpoint_path: pathlib.Path
+
+    # State is saved every N messages or T seconds, whichever comes first
+    checkpoint_every_messages = 5000
+    checkpoint_every_seconds = 60
+    # Write all alerts which can't be preceded anymore with every checkpoint, not only full batches of them
+    advance_on_checkpoint = False
+
+    def __init__(self, client=None, source=None, state_store: Optional[StateStore] = None):
+        """
+        :param client: Telethon client, used when no explicit source is passed
+        :param source: Message source, e.g. local archive from `message_sources`
+        :param state_store: Storage of cursor and active alerts, default database is used if not passed
+        """
+        self.client = client
+        # Every message fetched from Telegram is stored into local archive for later replays
+        self.source = source or ArchivingMessageSource(TelegramMessageSource(client), MessageArchive())
+        # Timings and counters of the run, see metrics module
+        self.metrics = ProcessingMetrics(self.channel_name)
+
+        # Class-level containers would be shared between instances, e.g. after restart of a failed run
+        self.active_alerts_by_location = {}
+        self.completed_alerts = []
+
+        # Completed alerts which were not written before the last checkpoint
+        self.pending_alerts = []
+        # Pending alerts which are not in the state store yet, e.g. migrated from legacy checkpoint
+        self.unsaved_pending_alerts = []
+        # Sizes of dataset files at the last checkpoint
+        self.dataset_sizes = {}
+        # Locations with started or finished alerts since the last checkpoint
+        self.changed_locations = set()
+        # tuples (alert, dataset row) of alerts written to datasets since the last checkpoint
+        self.emitted_alerts = []
+        # Called with processor and message after every processed message, e.g. by live sinks
+        self.message_listeners = []
+
+        self.messages_since_checkpoint = 0
+        self.last_checkpoint_time = time.monotonic()
+
+        self.state_store = state_store or StateStore()
+        self.restore_checkpoint()
+
+    async def process(self):
+        started_at = time.perf_counter()
+        previous_day = None
+
+        logger.info("Starting processing %s channel messages from %s", self.dataset_name, self.last_processed_id)
+
+        # Completed alerts are written while processing, so memory doesn't grow with the processed history
+        writer = StreamingAlertWriter(self.dataset_file_paths, self.fieldnames, on_write=self.on_alerts_written)
+
+        # Rows written after the last checkpoint will be written again
+        truncate_datasets(self.dataset_file_paths, self.dataset_sizes)
+        # Initial checkpoint, so rows written by this run could be rolled back as well
+        self.dump_checkpoint()
+
+        with writer:
+            writer.restore(self.pending_alerts)
+            self.pending_alerts = []
+
+            messages = self.source.iter_messages(self.channel_name, min_id=self.last_processed_id)
+            async for message in self.metrics.timed_messages(messages):
+                if not previous_day or previous_day != message.date.date():
+                    previous_day = message.date.date()
+                    logger.info("Processing day %s", previous_day)
+
+                if not message.message:
+                    self.metrics.count_parse_failure("empty")
+                    continue
+
+                self.process_message(message)
+
+                self.last_processed_id = message.id
+
+                for listener in self.message_listeners:
+                    listener(self, message)
+
+                with self.metrics.timer("write"):
+                    self.stream_completed_alerts(writer, message.date)
+                with self.metrics.timer("checkpoint"):
+                    self.maybe_dump_checkpoint(writer, message.date)
+
+        logger.info("Finished processing %s channel messages at %s", self.dataset_name, self.last_processed_id)
+        self.write()
+
+        self.metrics.add_time("total", time.perf_counter() - started_at)
+
+    def process_message(self, message: Message):
+        location_events = self.location_events(message)
+
+        started_at = time.perf_counter()
+        for location, is_activated, is_deactivated in location_events:
+            self.update_location(location, message.date, is_activated, is_deactivated)
+        self.metrics.add_time("state_transition", time.perf_counter() - started_at)
+
+    def location_events(self, message: Message) -> list[tuple[str, Optional[bool], Optional[bool]]]:
+        """
+        :return: list of tuples (location, is_enabled, is_disabled), empty if message can't be parsed
+        """
+        raise NotImplementedError
+
+    def update_location(
+        self, location: str, date: datetime.datetime, is_activated: Optional[bool], is_deactivated: Optional[bool]
+    ):
+        """
+        State machine of one location, it must not depend on other locations (see sharded_rebuild module).
+        """
+        raise NotImplementedError
+
+    def load_active_alerts(self):
+        if not os.path.exists(self.pkl_file_path):
+            return
+
+        with open(self.pkl_file_path, "rb") as f:
+            self.active_alerts_by_location = pickle.load(f)
+
+    def load_last_processed_id(self):
+        if not os.path.exists(self.last_processed_id_path):
+            return
+
+        with open(self.last_processed_id_path, "r") as f:
+            self.last_processed_id = int(f.read())
+
+    def remove_legacy_state(self):
+        for file_path in [self.pkl_file_path, self.last_processed_id_path, self.legacy_checkpoint_path]:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+    def has_written_rows(self) -> bool:
+        for file_path in self.dataset_file_paths.values():
+            if not os.path.exists(file_path):
+                continue
+
+            with open(file_path, "rb") as f:
+                # The first line is header
+                f.readline()
+                if f.readline():
+                    return True
+
+        return False
+
+    def restore_checkpoint(self):
+        checkpoint = self.state_store.load_checkpoint(self.channel_name)
+
+        if checkpoint is None:
+            # First run with the state store, so state is migrated from legacy files
+            checkpoint = load_checkpoint(self.legacy_checkpoint_path)
+
+            if checkpoint is None:
+                self.load_active_alerts()
+                self.load_last_processed_id()
+
+                if not self.last_processed_id and self.has_written_rows():
+                    # State is lost, e.g. evicted from Actions cache,
+                    #  processing from the first message would append the whole history to datasets again
+                    raise RuntimeError(
+                        f"There is no state of {self.channel_name} channel, but its datasets are not empty: "
+                        "restore processors/state/, or remove datasets to rebuild them from the first message"
+                    )
+
+                self.changed_locations = set(self.active_alerts_by_location)
+                return
+
+            self.changed_locations = set(checkpoint.active_alerts)
+            self.unsaved_pending_alerts = [
+                alert_from_state(self.alert_class, state) for state in checkpoint.pending_alerts
+            ]
+
+        self.last_processed_id = checkpoint.last_processed_id
+        self.active_alerts_by_location = {
+            location: alert_from_state(self.alert_class, state) for location, state in checkpoint.active_alerts.items()
+        }
+        self.pending_alerts = self.unsaved_pending_alerts or [
+            alert_from_state(self.alert_class, state) for state in checkpoint.pending_alerts
+        ]
+        self.dataset_sizes = checkpoint.dataset_sizes
+
+    def maybe_dump_checkpoint(self, writer: StreamingAlertWriter, current_date: datetime.datetime):
+        self.messages_since_checkpoint += 1
+
+        if (
+            self.messages_since_checkpoint < self.checkpoint_every_messages
+            and time.monotonic() - self.last_checkpoint_time < self.checkpoint_every_seconds
+        ):
+            return
+
+        if self.advance_on_checkpoint:
+            self.stream_completed_alerts(writer, current_date, force=True)
+
+        self.dump_checkpoint(writer)
+
+    def dump_checkpoint(self, writer: Optional[StreamingAlertWriter] = None):
+        """
+        Saves cursor, active alerts, not yet written alerts and dataset sizes together.
+        """
+        added_alerts = self.unsaved_pending_alerts
+        self.unsaved_pending_alerts = []
+
+        if writer:
+            writer.flush()
+            added_alerts = added_alerts + writer.take_added_alerts()
+            self.dataset_sizes = writer.file_sizes()
+        else:
+            self.dataset_sizes = {
+                lang: os.path.getsize(file_path) if os.path.exists(file_path) else 0
+                for lang, file_path in self.dataset_file_paths.items()
+            }
+
+        # Only changed locations are updated, None means there is no active alert anymore
+        changed_active_alerts = {
+            location: alert_to_state(self.active_alerts_by_location[location])
+            if location in self.active_alerts_by_location
+            else None
+            for location in self.changed_locations
+        }
+
+        # Only changes of the reorder buffer are saved, alerts both added and written since then are not stored at all
+        emitted_ids = {id(alert) for alert, _ in self.emitted_alerts}
+        added_ids = {id(alert) for alert in added_alerts}
+        lang = next(iter(self.dataset_file_paths))
+
+        emitted_rows = [(alert.started_at.isoformat(), row_key(row)) for alert, row in self.emitted_alerts]
+        added_pending_alerts = {
+            row_key(alert.rows()[lang]): alert_to_state(alert) for alert in added_alerts if id(alert) not in emitted_ids
+        }
+        removed_pending_keys = [
+            key for (alert, _), (_, key) in zip(self.emitted_alerts, emitted_rows) if id(alert) not in added_ids
+        ]
+
+        self.state_store.save_checkpoint(
+            self.channel_name,
+            last_processed_id=self.last_processed_id,
+            changed_active_alerts=changed_active_alerts,
+            dataset_sizes=self.dataset_sizes,
+            added_pending_alerts=added_pending_alerts,
+            removed_pending_keys=removed_pending_keys,
+            emitted_rows=emitted_rows,
+        )
+
+        self.changed_locations = set()
+        self.emitted_alerts.clear()
+
+        self.messages_since_checkpoint = 0
+        self.last_checkpoint_time = time.monotonic()
+
+    def on_alerts_written(self, alerts: list, rows: list):
+        self.emitted_alerts.extend(zip(alerts, rows))
+        self.metrics.count("rows_written", len(alerts))
+
+    def stream_completed_alerts(
+        self, writer: StreamingAlertWriter, current_date: datetime.datetime, force: bool = False
+    ):
+        for alert in self.completed_alerts:
+            writer.add(alert)
+        self.completed_alerts = []
+
+        # Any alert completed later is either active now or will be started by one of the next messages
+        writer.advance(
+            lambda: active_watermark(
+                (alert.started_at for alert in self.active_alerts_by_location.values()), current_date
+            ),
+            force=force,
+        )
+
+    def write(self):
+        """
+        Writes alerts collected in `completed_alerts` (if they were not streamed) and saves current state.
+        """
+        if self.completed_alerts:
+            self.completed_alerts.sort(key=lambda x: x.started_at)
+
+            with self.metrics.timer("write"):
+                self.write_to_files()
+
+            self.completed_alerts = []
+
+        with self.metrics.timer("checkpoint"):
+            self.dump_checkpoint()
+
+        self.state_store.prune_emitted_alerts(self.channel_name, datetime.datetime.now(datetime.timezone.utc))
+        self.remove_legacy_state()
+
+    def write_to_file(self, lang: str = "uk"):
+        self.write_to_files(langs=[lang])
+
+    def write_to_files(self, langs: Optional[list[str]] = None):
+        """
+        Appends `completed_alerts` to datasets of all (or given) languages in one pass.
+        """
+        file_paths = self.dataset_file_paths
+        if langs is not None:
+            file_paths = {lang: file_paths[lang] for lang in langs}
+
+        tail_indexes = open_tail_indexes(file_paths)
+        files, writers = open_csv_writers(file_paths, self.fieldnames)
+
+        try:
+            # Alerts already written by a previous run are skipped
+            rows = []
+            write_records(self.completed_alerts, writers, tail_indexes, serialized_rows=rows)
+            save_tail_indexes(tail_indexes, files)
+            self.on_alerts_written(self.completed_alerts, rows)
+        finally:
+            for f in files.values():
+                f.close()
@@ -0,0 +1,84 @@
+"""
+Crash-safe checkpoints of processors state.
+
+Checkpoint keeps everything needed to resume processing without duplicated or missing rows:
+ - id of the last processed message;
+ - active alerts by location;
+ - completed alerts, which are not written to datasets yet (waiting in the reorder buffer);
+ - sizes of dataset files, rows after them were written after the checkpoint and are removed on resume.
+
+Checkpoints are stored in `state_store`, JSON files are read only to migrate state of older versions.
+"""
+
+import datetime
+import json
+import logging
+import os
+import pathlib
+from dataclasses import asdict, dataclass, field
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+DATE_FIELDS = ("started_at", "finished_at")
+
+
+@dataclass
+class Checkpoint:
+    last_processed_id: int
+    # location => alert state
+    active_alerts: dict[str, dict] = field(default_factory=dict)
+    # Completed, but not written alerts in the order of completion
+    pending_alerts: list[dict] = field(default_factory=list)
+    # language => size of dataset file in bytes
+    dataset_sizes: dict[str, int] = field(default_factory=dict)
+
+
+def alert_to_state(alert) -> dict:
+    return {k: v.isoformat() if isinstance(v, datetime.datetime) else v for k, v in asdict(alert).items()}
+
+
+def row_key(row: list[str]) -> str:
+    """
+    Key of a completed alert in the state store, it's made of the dataset row, which is serialized anyway.
+    """
+    return json.dumps(row, ensure_ascii=False)
+
+
+def alert_from_state(alert_class, state: dict):
+    return alert_class(
+        **{k: datetime.datetime.fromisoformat(v) if k in DATE_FIELDS and v is not None else v for k, v in state.items()}
+    )
+
+
+def load_checkpoint(path: pathlib.Path) -> Optional[Checkpoint]:
+    """
+    Loads legacy checkpoint from JSON file.
+    """
+    if not os.path.exists(path):
+        return None
+
+    with open(path, "r", encoding="utf-8") as f:
+        return Checkpoint(**json.load(f))
+
+
+def truncate_datasets(file_paths: dict[str, pathlib.Path], dataset_sizes: dict[str, int]):
+    """
+    Removes rows written after the checkpoint.
+    """
+    for lang, file_path in file_paths.items():
+        if lang not in dataset_sizes or not os.path.exists(file_path):
+            continue
+
+        if os.path.getsize(file_path) <= dataset_sizes[lang]:
+            continue
+
+        logger.warning("Removing rows of %s written after the last checkpoint", file_path)
+
+        if dataset_sizes[lang] == 0:
+            # File was created after the checkpoint, so it should be created again with a header
+            os.remove(file_path)
+            continue
+
+        with open(file_path, "r+b") as f:
+            f.truncate(dataset_sizes[lang])
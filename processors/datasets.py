@@ -0,0 +1,79 @@
+"""
+Helpers for reading published datasets with proper types.
+"""
+
+import datetime
+import math
+import pathlib
+from typing import Union
+
+import numpy as np
+import pandas as pd
+
+from .serialization import LANGUAGES
+
+datasets_dir_path = pathlib.Path(__file__).parent.resolve() / "../datasets"
+
+# Dataset name => columns with repeated values (place names and enums)
+CATEGORICAL_COLUMNS = {
+    "official": ["oblast", "raion", "hromada", "level", "source"],
+    "volunteer": ["region"],
+}
+
+DATASET_NAMES = list(CATEGORICAL_COLUMNS.keys())
+
+# Dataset name => columns identifying location
+LOCATION_COLUMNS = {
+    "official": ["oblast", "raion", "hromada", "level"],
+    "volunteer": ["region"],
+}
+
+# Seconds since epoch of `finished_at` of alerts without it, they're active forever
+NOT_FINISHED = np.iinfo(np.int64).max
+
+EPOCH = pd.Timestamp(0, tz="UTC")
+
+# Volunteer dataset names Kyiv city differently from `states.json`
+VOLUNTEER_REGION_ALIASES = {"Київ": "м. Київ"}
+
+
+def dataset_path(dataset_name: str, lang: str = "uk") -> pathlib.Path:
+    return datasets_dir_path / f"{dataset_name}_data_{lang}.csv"
+
+
+def to_seconds(moment: Union[datetime.datetime, str], round_up: bool = False) -> int:
+    """
+    Naive moments are treated as UTC. Datasets have second precision, so fractions are rounded.
+    """
+    timestamp = pd.Timestamp(moment)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.tz_localize("UTC")
+
+    return math.ceil(timestamp.timestamp()) if round_up else math.floor(timestamp.timestamp())
+
+
+def series_to_seconds(dates: pd.Series) -> pd.Series:
+    """
+    Seconds since epoch, missing dates are `NOT_FINISHED`.
+    """
+    seconds = ((dates.fillna(EPOCH) - EPOCH) // pd.Timedelta(seconds=1)).astype("int64")
+    return seconds.where(dates.notna(), NOT_FINISHED)
+
+
+def read_dataset(dataset_name: str, lang: str = "uk") -> pd.DataFrame:
+    """
+    Reads dataset CSV with UTC timestamps, categorical place names and boolean `naive` flag.
+    """
+    # Empty raion and hromada are empty strings, not missing values
+    df = pd.read_csv(dataset_path(dataset_name, lang), dtype=str, keep_default_na=False)
+
+    for column in ["started_at", "finished_at"]:
+        df[column] = pd.to_datetime(df[column], utc=True, format="ISO8601")
+
+    for column in CATEGORICAL_COLUMNS[dataset_name]:
+        df[column] = df[column].astype("category")
+
+    if "naive" in df.columns:
+        df["naive"] = df["naive"] == "True"
+
+    return df
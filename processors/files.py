@@ -0,0 +1,21 @@
+"""
+Atomic replacement of files that are read by other processes: caches, metrics and reports.
+"""
+
+import os
+import pathlib
+from typing import Union
+
+
+def write_atomically(path: pathlib.Path, content: Union[str, bytes]):
+    """
+    Writes temporary file first and replaces the file at once, so readers never see partially written file.
+    """
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    if isinstance(content, bytes):
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+    else:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(content)
+    os.replace(tmp_path, path)
@@ -0,0 +1,149 @@
+"""
+Coverage of raions and oblasts derived from alerts of all levels of the official dataset.
+
+Raion is under alert when there is an alert for the raion itself, for any of its hromadas or for the whole oblast.
+Oblast is under alert when any part of it is. Intervals of every raion and oblast are merged with a single
+sweep over alerts sorted by location and `started_at` and written to `datasets/derived/`.
+"""
+
+import logging
+import pathlib
+
+import numpy as np
+import pandas as pd
+
+from .datasets import LANGUAGES, datasets_dir_path
+from .loader import load_dataset
+from .location_index import load_location_index
+from .transliteration import transliterate
+
+logger = logging.getLogger(__name__)
+
+derived_dir_path = datasets_dir_path / "derived"
+
+# Seconds fit into 34 bits, location number is kept in higher bits
+LOCATION_SHIFT = 34
+
+
+def merge_intervals(locations: np.ndarray, started_at: np.ndarray, finished_at: np.ndarray) -> pd.DataFrame:
+    """
+    Merges overlapping and touching intervals of every location.
+
+    :param locations: Integer location number of every interval
+    :return: DataFrame with `location`, `started_at`, `finished_at` and `alerts` (number of merged intervals)
+    """
+    order = np.lexsort((started_at, locations))
+    locations, started_at, finished_at = locations[order], started_at[order], finished_at[order]
+
+    # Running maximum of `finished_at` restarts at every location, because location is in higher bits
+    location_bits = locations.astype(np.int64) << LOCATION_SHIFT
+    covered_till = np.maximum.accumulate(location_bits | finished_at) - location_bits
+
+    # Interval starts a new one if it's the first of the location or there is a gap before it
+    is_first = np.ones(len(locations), dtype=bool)
+    is_first[1:] = (locations[1:] != locations[:-1]) | (started_at[1:] > covered_till[:-1])
+
+    first_indices = np.flatnonzero(is_first)
+    last_indices = np.append(first_indices[1:], len(locations)) - 1
+
+    return pd.DataFrame(
+        {
+            "location": locations[first_indices],
+            "started_at": started_at[first_indices],
+            "finished_at": covered_till[last_indices],
+            "alerts": last_indices - first_indices + 1,
+        }
+    )
+
+
+def raions_by_oblast() -> dict[str, list[str]]:
+    """
+    Current raions of every oblast from the location index.
+    """
+    raions = {}
+    for oblast, raion, _, level in load_location_index().values():
+        if level == "raion":
+            raions.setdefault(oblast, set()).add(raion)
+
+    return {oblast: sorted(names) for oblast, names in raions.items()}
+
+
+def coverage_frame(intervals: pd.DataFrame, location_names: pd.DataFrame) -> pd.DataFrame:
+    df = location_names.iloc[intervals["location"]].reset_index(drop=True)
+    df["started_at"] = pd.to_datetime(intervals["started_at"].to_numpy(), unit="s", utc=True)
+    df["finished_at"] = pd.to_datetime(intervals["finished_at"].to_numpy(), unit="s", utc=True)
+    df["alerts"] = intervals["alerts"].to_numpy()
+
+    return df.sort_values(["started_at"] + list(location_names.columns), kind="stable").reset_index(drop=True)
+
+
+def compute_coverage() -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    :return: tuple (raion coverage, oblast coverage)
+    """
+    dataset = load_dataset("official", "uk")
+    oblasts = dataset.decode("oblast")
+    raions = dataset.decode("raion")
+    levels = dataset.decode("level")
+    started_at = np.asarray(dataset.started_at)
+    finished_at = np.asarray(dataset.finished_at)
+
+    # Oblast alerts are copied to every raion of the oblast
+    is_oblast_level = levels == "oblast"
+    oblast_raions = raions_by_oblast()
+    copies = np.array([len(oblast_raions.get(oblast, [])) for oblast in oblasts[is_oblast_level]], dtype=np.int64)
+
+    has_raion = ~is_oblast_level & (raions != "")
+    raion_keys = pd.DataFrame(
+        {
+            "oblast": np.concatenate([oblasts[has_raion], np.repeat(oblasts[is_oblast_level], copies)]),
+            "raion": np.concatenate(
+                [
+                    raions[has_raion],
+                    np.array(
+                        [raion for oblast in oblasts[is_oblast_level] for raion in oblast_raions.get(oblast, [])],
+                        dtype=object,
+                    ),
+                ]
+            ),
+        }
+    )
+    raion_locations, raion_names = pd.MultiIndex.from_frame(raion_keys).factorize()
+    raion_intervals = merge_intervals(
+        raion_locations,
+        np.concatenate([started_at[has_raion], np.repeat(started_at[is_oblast_level], copies)]),
+        np.concatenate([finished_at[has_raion], np.repeat(finished_at[is_oblast_level], copies)]),
+    )
+
+    oblast_locations, oblast_names = pd.factorize(oblasts)
+    oblast_intervals = merge_intervals(oblast_locations, started_at, finished_at)
+
+    return (
+        coverage_frame(raion_intervals, raion_names.to_frame(index=False, name=["oblast", "raion"])),
+        coverage_frame(oblast_intervals, pd.DataFrame({"oblast": oblast_names})),
+    )
+
+
+def write_coverage() -> list[pathlib.Path]:
+    """
+    Writes coverage of raions and oblasts in all languages, returns paths of written files.
+    """
+    raion_coverage, oblast_coverage = compute_coverage()
+    derived_dir_path.mkdir(parents=True, exist_ok=True)
+
+    paths = []
+    for lang in LANGUAGES:
+        for level, coverage in [("raion", raion_coverage), ("oblast", oblast_coverage)]:
+            df = coverage.copy()
+            if lang != "uk":
+                for column in ["oblast", "raion"]:
+                    if column in df.columns:
+                        df[column] = df[column].map(transliterate)
+
+            path = derived_dir_path / f"official_{level}_coverage_{lang}.csv"
+            df.to_csv(path, index=False)
+            paths.append(path)
+
+    logger.info("Derived %s raion and %s oblast coverage intervals", len(raion_coverage), len(oblast_coverage))
+
+    return paths
@@ -0,0 +1,102 @@
+"""
+Multi-keyword matcher, which finds region and air raid state in one pass over the message.
+"""
+
+import re
+from typing import Generic, Optional, TypeVar
+
+Region = TypeVar("Region")
+State = TypeVar("State")
+
+
+def keywords_to_pattern(keywords: set[str]) -> str:
+    """
+    Builds regex from keywords prefix tree, e.g. {"київ", "київська", "київській"} => київ(?:ськ(?:а|ій))?
+
+    At every position such regex matches the longest keyword which starts there.
+    """
+    trie: dict = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        # Empty key marks the end of a keyword
+        node[""] = {}
+
+    def build(node: dict) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+
+        if len(branches) == 1 and "" not in node:
+            return branches[0]
+
+        pattern = "(?:" + "|".join(branches) + ")"
+
+        # Greedy optional group tries longer keywords first
+        return pattern + "?" if "" in node else pattern
+
+    return build(trie)
+
+
+class KeywordsMatcher(Generic[Region, State]):
+    """
+    Matches regions and states by keywords, where the order of dicts is the priority (first wins).
+
+    Keywords are lowercased and compiled once, then the whole message is scanned with a single regex.
+    """
+
+    def __init__(self, region_keywords: dict[Region, set[str]], state_keywords: dict[str, State]):
+        self.regions = list(region_keywords.keys())
+        self.states = list(state_keywords.values())
+
+        # lowercased keyword => priority (index in related dict)
+        region_priorities: dict[str, int] = {}
+        for priority, keywords in enumerate(region_keywords.values()):
+            for keyword in keywords:
+                keyword = keyword.lower()
+                region_priorities[keyword] = min(region_priorities.get(keyword, priority), priority)
+
+        state_priorities: dict[str, int] = {}
+        for priority, keyword in enumerate(state_keywords.keys()):
+            keyword = keyword.lower()
+            state_priorities[keyword] = min(state_priorities.get(keyword, priority), priority)
+
+        all_keywords = set(region_priorities) | set(state_priorities)
+
+        # Regex finds only the longest keyword at every position, but shorter keywords starting
+        # at the same position are its prefixes, so precompute the best priorities among them
+        self.priorities_by_keyword: dict[str, tuple[Optional[int], Optional[int]]] = {}
+        for keyword in all_keywords:
+            prefixes = [prefix for prefix in all_keywords if keyword.startswith(prefix)]
+            self.priorities_by_keyword[keyword] = (
+                min((region_priorities[p] for p in prefixes if p in region_priorities), default=None),
+                min((state_priorities[p] for p in prefixes if p in state_priorities), default=None),
+            )
+
+        # Lookahead makes matches zero-width, so overlapping keywords are found as well
+        self.pattern = re.compile(f"(?=({keywords_to_pattern(all_keywords)}))")
+
+    def match(self, text: str) -> tuple[Optional[Region], Optional[State]]:
+        """
+        :return: tuple (region with the highest priority, state with the highest priority), None if not found
+        """
+        best_region: Optional[int] = None
+        best_state: Optional[int] = None
+
+        for match in self.pattern.finditer(text.lower()):
+            region_priority, state_priority = self.priorities_by_keyword[match.group(1)]
+
+            if region_priority is not None and (best_region is None or region_priority < best_region):
+                best_region = region_priority
+
+            if state_priority is not None and (best_state is None or state_priority < best_state):
+                best_state = state_priority
+
+            if best_region == 0 and best_state == 0:
+                break
+
+        return (
+            self.regions[best_region] if best_region is not None else None,
+            self.states[best_state] if best_state is not None else None,
+        )
@@ -0,0 +1,149 @@
+"""
+Live mode: processors are kept in memory and fed by Telegram new-message events.
+
+`LiveMessageSource` yields the history since the cursor first and then every new message of the channel,
+so `process()` of a processor never ends. Checkpoints are saved with the first message after
+`CHECKPOINT_EVERY_SECONDS`, while `LiveSink` publishes completed alerts and the snapshot of active alerts
+to `live/` directory right after every message.
+"""
+
+import asyncio
+import json
+import logging
+import pathlib
+from typing import AsyncIterator, Union
+
+from telethon import events
+
+from .checkpoint import alert_to_state
+from .files import write_atomically
+from .message_archive import ArchivingMessageSource
+from .message_sources import TelegramMessageSource
+
+logger = logging.getLogger(__name__)
+
+live_dir_path = pathlib.Path(__file__).parent.resolve() / "../live"
+
+# Datasets and cursor are saved more often than in batch runs, the live sink is updated with every message anyway
+CHECKPOINT_EVERY_SECONDS = 30
+
+
+class LiveMessageSource:
+    """
+    History since `min_id` followed by new messages of the channel, never ends.
+    """
+
+    def __init__(self, client, history_source=None):
+        """
+        :param history_source: Source of missed messages, Telegram itself by default
+        """
+        self.client = client
+        self.history_source = history_source or TelegramMessageSource(client)
+
+    async def iter_history(self, channel_name: str, min_id: int, max_id: int) -> AsyncIterator:
+        """
+        Messages with min_id < id < max_id.
+        """
+        async for message in self.history_source.iter_messages(channel_name, min_id=min_id):
+            if message.id >= max_id:
+                break
+
+            yield message
+
+    async def iter_messages(self, channel_name: str, min_id: int = 0) -> AsyncIterator:
+        queue = asyncio.Queue()
+
+        async def on_new_message(event):
+            await queue.put(event.message)
+
+        # Subscribed before reading the history, so nothing is posted unnoticed in between
+        event_filter = events.NewMessage(chats=channel_name)
+        self.client.add_event_handler(on_new_message, event_filter)
+
+        try:
+            last_id = min_id
+
+            async for message in self.history_source.iter_messages(channel_name, min_id=min_id):
+                last_id = message.id
+                yield message
+
+            logger.info("Caught up with %s at %s, waiting for new messages", channel_name, last_id)
+
+            while True:
+                message = await queue.get()
+                if message.id <= last_id:
+                    continue
+
+                if message.id > last_id + 1:
+                    # Events could be lost on reconnects, missed messages are fetched from the history
+                    async for missed_message in self.iter_history(channel_name, last_id, message.id):
+                        last_id = missed_message.id
+                        yield missed_message
+
+                last_id = message.id
+                yield message
+        finally:
+            self.client.remove_event_handler(on_new_message, event_filter)
+
+
+class LiveSink:
+    """
+    Publishes state of a processor after every message:
+     - `<dataset>_completed.jsonl` gets every completed alert appended;
+     - `<dataset>_active.json` is replaced by the snapshot of active alerts.
+
+    Messages after the last checkpoint are processed again after restart,
+    so alerts completed by them may be appended to `<dataset>_completed.jsonl` twice.
+    """
+
+    def __init__(self, dataset_name: str, directory: Union[str, pathlib.Path] = live_dir_path):
+        self.directory = pathlib.Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        self.completed_path = self.directory / f"{dataset_name}_completed.jsonl"
+        self.active_path = self.directory / f"{dataset_name}_active.json"
+
+        self.snapshot_written = False
+
+    def __call__(self, processor, message):
+        if processor.completed_alerts:
+            self.write_completed(processor.completed_alerts)
+
+        # Skipped for messages which didn't change anything since the last checkpoint
+        if processor.completed_alerts or processor.changed_locations or not self.snapshot_written:
+            self.write_snapshot(processor, message)
+
+    def write_completed(self, alerts: list):
+        with open(self.completed_path, "a", encoding="utf-8") as f:
+            for alert in alerts:
+                f.write(json.dumps(alert_to_state(alert), ensure_ascii=False) + "\n")
+
+    def write_snapshot(self, processor, message):
+        snapshot = {
+            "last_processed_id": message.id,
+            "updated_at": message.date.isoformat(),
+            "active_alerts": {
+                location: alert_to_state(alert) for location, alert in processor.active_alerts_by_location.items()
+            },
+        }
+
+        write_atomically(self.active_path, json.dumps(snapshot, ensure_ascii=False))
+
+        self.snapshot_written = True
+
+
+def make_live(processor, client, archive=None):
+    """
+    Switches processor to live mode: endless source, frequent checkpoints and live sink.
+
+    :param archive: `MessageArchive` to store received messages, not stored if None
+    """
+    source = LiveMessageSource(client)
+    processor.source = ArchivingMessageSource(source, archive) if archive is not None else source
+
+    processor.checkpoint_every_seconds = CHECKPOINT_EVERY_SECONDS
+    # Otherwise completed alerts would wait in the reorder buffer until a whole batch of them is collected
+    processor.advance_on_checkpoint = True
+    processor.message_listeners.append(LiveSink(processor.dataset_name))
+
+    return processor
@@ -0,0 +1,158 @@
+"""
+Typed binary copy of datasets for fast repeated loads.
+
+Every dataset CSV is converted once into `datasets/.cache/<file name>/`:
+ - `started_at.npy`, `finished_at.npy` with int64 seconds since epoch, `NOT_FINISHED` if there is no finish;
+ - `<column>.npy` with codes of place names and enums, names are in `meta.json`;
+ - `naive.npy` with booleans for volunteer dataset;
+ - `meta.json` with size and mtime of the CSV, the cache is rebuilt when they're changed.
+
+Rows are sorted by `started_at`, so arrays are opened with `numpy.memmap` and sliced by time without copying.
+"""
+
+import datetime
+import json
+import os
+import pathlib
+import shutil
+from typing import Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from .datasets import CATEGORICAL_COLUMNS, dataset_path, datasets_dir_path, read_dataset, series_to_seconds, to_seconds
+
+cache_dir_path = datasets_dir_path / ".cache"
+
+# Bump it when the layout is changed
+LAYOUT_VERSION = 1
+
+TIMESTAMP_COLUMNS = ["started_at", "finished_at"]
+
+
+class TypedDataset:
+    def __init__(self, dataset_name: str, arrays: dict[str, np.ndarray], names: dict[str, list[str]]):
+        """
+        :param arrays: Column arrays, place names and enums are codes in `names` tables
+        :param names: Names by codes for every categorical column
+        """
+        self.dataset_name = dataset_name
+        self.arrays = arrays
+        self.names = names
+
+    def __len__(self) -> int:
+        return len(self.arrays["started_at"])
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        return self.arrays[column]
+
+    @property
+    def started_at(self) -> np.ndarray:
+        return self.arrays["started_at"]
+
+    @property
+    def finished_at(self) -> np.ndarray:
+        return self.arrays["finished_at"]
+
+    def slice(self, start: int, stop: int) -> "TypedDataset":
+        return TypedDataset(
+            self.dataset_name, {column: array[start:stop] for column, array in self.arrays.items()}, self.names
+        )
+
+    def started_between(
+        self, start: Union[datetime.datetime, str], end: Optional[Union[datetime.datetime, str]] = None
+    ) -> "TypedDataset":
+        """
+        Alerts with start <= started_at < end, arrays are views of the cache files.
+        """
+        start_index = np.searchsorted(self.started_at, to_seconds(start), side="left")
+        end_index = len(self) if end is None else np.searchsorted(self.started_at, to_seconds(end), side="left")
+
+        return self.slice(start_index, end_index)
+
+    def decode(self, column: str) -> np.ndarray:
+        """
+        :return: Array of names for categorical column
+        """
+        return np.asarray(self.names[column], dtype=object)[self.arrays[column]]
+
+    def to_pandas(self) -> pd.DataFrame:
+        """
+        DataFrame of the same shape as `datasets.read_dataset` returns.
+        """
+        data = {}
+        for column, array in self.arrays.items():
+            if column in self.names:
+                data[column] = pd.Categorical.from_codes(array, categories=self.names[column])
+            elif column in TIMESTAMP_COLUMNS:
+                data[column] = pd.to_datetime(np.asarray(array), unit="s", utc=True)
+            else:
+                data[column] = np.asarray(array)
+
+        return pd.DataFrame(data)
+
+
+def source_stat(csv_path: pathlib.Path) -> dict:
+    stat = os.stat(csv_path)
+    return {"layout_version": LAYOUT_VERSION, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def build_cache(dataset_name: str, lang: str, directory: pathlib.Path):
+    csv_path = dataset_path(dataset_name, lang)
+    stat = source_stat(csv_path)
+
+    df = read_dataset(dataset_name, lang)
+    df = df.sort_values("started_at", kind="stable").reset_index(drop=True)
+
+    # Written into temporary directory, which then replaces the old one
+    tmp_directory = directory.with_name(f"{directory.name}.{os.getpid()}.tmp")
+    shutil.rmtree(tmp_directory, ignore_errors=True)
+    tmp_directory.mkdir(parents=True)
+
+    names = {}
+    columns = []
+    for column in df.columns:
+        if column in TIMESTAMP_COLUMNS:
+            array = series_to_seconds(df[column]).to_numpy()
+        elif column in CATEGORICAL_COLUMNS[dataset_name]:
+            names[column] = [str(name) for name in df[column].cat.categories]
+            array = df[column].cat.codes.to_numpy()
+        else:
+            array = df[column].to_numpy()
+
+        np.save(tmp_directory / f"{column}.npy", array, allow_pickle=False)
+        columns.append(column)
+
+    with open(tmp_directory / "meta.json", "w", encoding="utf-8") as f:
+        json.dump({**stat, "rows": len(df), "columns": columns, "names": names}, f, ensure_ascii=False)
+
+    old_directory = directory.with_name(f"{directory.name}.{os.getpid()}.old")
+    if directory.exists():
+        # Files of the old cache stay valid for readers which have them mapped
+        os.replace(directory, old_directory)
+    os.replace(tmp_directory, directory)
+    shutil.rmtree(old_directory, ignore_errors=True)
+
+
+def load_dataset(dataset_name: str, lang: str = "uk") -> TypedDataset:
+    """
+    Opens typed copy of dataset, it's built first if the CSV file was changed.
+    """
+    directory = cache_dir_path / dataset_path(dataset_name, lang).stem
+    meta_path = directory / "meta.json"
+
+    meta = None
+    if meta_path.exists():
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+    stat = source_stat(dataset_path(dataset_name, lang))
+    if meta is None or any(meta.get(key) != value for key, value in stat.items()):
+        build_cache(dataset_name, lang, directory)
+
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+    arrays = {column: np.load(directory / f"{column}.npy", mmap_mode="r") for column in meta["columns"]}
+
+    return TypedDataset(dataset_name, arrays, meta["names"])
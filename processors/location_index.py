@@ -0,0 +1,206 @@
+"""
+Index of locations used in hashtags of the official channel.
+
+Building the index walks the whole `states.json`, so the result is cached in `cache/location_index.json`
+and rebuilt only when `states.json`, `legacy_states.py` or special rules below are changed.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import sys
+
+from .files import write_atomically
+from .legacy_states import get_new_name
+
+logger = logging.getLogger(__name__)
+
+states_file_path = pathlib.Path(__file__).parent.resolve() / "states.json"
+legacy_states_file_path = pathlib.Path(__file__).parent.resolve() / "legacy_states.py"
+location_index_path = pathlib.Path(__file__).parent.resolve() / "cache" / "location_index.json"
+
+# Bump it when the building logic is changed
+INDEX_VERSION = 1
+
+# There are hromadas with duplicated names, so adding only hromadas where sirens were used at least once.
+# Other hromadas located far away from battlefield.
+HROMADA_SPECIAL_RULES = {
+    # hromada: (raion, oblast)
+    "Широківська територіальна громада": (
+        "Баштанський район",
+        "Миколаївська область",
+    ),
+    "Воскресенська територіальна громада": (
+        "Миколаївський район",
+        "Миколаївська область",
+    ),
+    "Софіївська територіальна громада": (
+        "Баштанський район",
+        "Миколаївська область",
+    ),
+    "Костянтинівська територіальна громада": (
+        "Миколаївський район",
+        "Миколаївська область",
+    ),
+    "Привільненська територіальна громада": (
+        "Баштанський район",
+        "Миколаївська область",
+    ),
+    "Горохівська територіальна громада": (
+        "Баштанський район",
+        "Миколаївська область",
+    ),
+    "Гребінківська територіальна громада": (
+        "Лубенський район",
+        "Полтавська область",
+    ),
+    "Покровська територіальна громада": (
+        "Покровський район",
+        "Донецька область",
+    ),
+    "Лиманська територіальна громада": (
+        "Краматорський район",
+        "Донецька область",
+    ),
+    "Олександрівська територіальна громада": (
+        "Вознесенський район",
+        "Миколаївська область",
+    ),
+    "Золочівська територіальна громада": (
+        "Богодухівський район",
+        "Харківська область",
+    ),
+    "Українська територіальна громада": (
+        "Обухівський район",
+        "Київська область",
+    ),
+}
+
+
+def location_to_hashtag(location: str) -> str:
+    # Івано-Франківськ => #ІваноФранківськ
+    # Запорізька область => #Запорізька_область
+    # м. Кривий Ріг... → м_Кривий_Ріг_та_Криворізька_територіальна_громада
+
+    hashtag_value = (
+        location.lower().replace("-", "").replace(" ", "_").replace(".", "").replace("'", "").replace("’", "")
+    )
+    return f"#{hashtag_value}"
+
+
+def build_location_index(raw_states: dict) -> dict[str, tuple[str, str, str, str]]:
+    """
+    :return: dict where key is place name in hashtag format,
+             value is tuple (oblast name, raion name, hromada name, level)
+    """
+    hash_states_by_name = {}
+
+    for state in raw_states["states"]:
+        state_name = state["stateName"]
+        hashed_state_name = location_to_hashtag(state_name)
+        hash_states_by_name[hashed_state_name] = (state_name, "", "", "oblast")
+
+        for raion in state["districts"]:
+            raion_name = raion["districtName"]
+
+            maybe_renamed_raion = get_new_name(state_name, raion_name)
+            maybe_renamed_raion_name = maybe_renamed_raion[0] if maybe_renamed_raion else None
+
+            hashed_raion_name = location_to_hashtag(raion_name)
+            hash_states_by_name[hashed_raion_name] = (
+                state_name,
+                maybe_renamed_raion_name or raion_name,
+                "",
+                "raion",
+            )
+
+            # Special fix for renamed raions
+            if maybe_renamed_raion_name:
+                hashed_renamed_raion_name = location_to_hashtag(maybe_renamed_raion_name)
+                hash_states_by_name[hashed_renamed_raion_name] = (
+                    state_name,
+                    maybe_renamed_raion_name,
+                    "",
+                    "raion",
+                )
+
+            for hromada in raion["communities"]:
+                hromada_name = hromada["communityName"]
+                maybe_renamed_hromada = get_new_name(state_name, raion_name, hromada_name)
+                maybe_renamed_hromada_name = maybe_renamed_hromada[1] if maybe_renamed_hromada else None
+                hashed_hromada_name = location_to_hashtag(hromada_name)
+
+                if hromada_name in HROMADA_SPECIAL_RULES:
+                    special_hromada = HROMADA_SPECIAL_RULES[hromada_name]
+                    hash_states_by_name[hashed_hromada_name] = (
+                        special_hromada[1],
+                        special_hromada[0],
+                        hromada_name,
+                        "hromada",
+                    )
+                else:
+                    hash_states_by_name[hashed_hromada_name] = (
+                        state_name,
+                        raion_name,
+                        maybe_renamed_hromada_name or hromada_name,
+                        "hromada",
+                    )
+
+                    # Special fix for renamed hromadas
+                    if maybe_renamed_hromada_name:
+                        hashed_renamed_hromada_name = location_to_hashtag(maybe_renamed_hromada_name)
+                        hash_states_by_name[hashed_renamed_hromada_name] = (
+                            state_name,
+                            maybe_renamed_raion_name or raion_name,
+                            maybe_renamed_hromada_name,
+                            "hromada",
+                        )
+
+    return hash_states_by_name
+
+
+def sources_hash(states_content: bytes) -> str:
+    content_hash = hashlib.sha256()
+    content_hash.update(str(INDEX_VERSION).encode())
+    content_hash.update(states_content)
+
+    with open(legacy_states_file_path, "rb") as f:
+        content_hash.update(f.read())
+
+    content_hash.update(json.dumps(HROMADA_SPECIAL_RULES, sort_keys=True).encode())
+
+    return content_hash.hexdigest()
+
+
+def load_location_index() -> dict[str, tuple[str, str, str, str]]:
+    """
+    Loads prebuilt index from cache or builds it from `states.json` if sources were changed.
+    """
+    with open(states_file_path, "rb") as f:
+        states_content = f.read()
+
+    current_hash = sources_hash(states_content)
+
+    if os.path.exists(location_index_path):
+        try:
+            with open(location_index_path, "r", encoding="utf-8") as f:
+                cached_index = json.load(f)
+
+            if cached_index["hash"] == current_hash:
+                # Names are repeated in many locations, so they're interned to be shared
+                return {k: tuple(sys.intern(name) for name in v) for k, v in cached_index["locations"].items()}
+        except (ValueError, KeyError):
+            logger.warning("Location index cache %s is broken, rebuilding it", location_index_path)
+
+    logger.info("Building location index from %s", states_file_path)
+    hash_states_by_name = build_location_index(json.loads(states_content))
+
+    location_index_path.parent.mkdir(parents=True, exist_ok=True)
+    write_atomically(
+        location_index_path,
+        json.dumps({"hash": current_hash, "locations": hash_states_by_name}, ensure_ascii=False),
+    )
+
+    return hash_states_by_name
@@ -0,0 +1,490 @@
+"""
+Maps of active alerts.
+
+Place names of datasets are joined with admin boundaries only once: `build_geometry_lookup` matches locations
+of the location index with boundary files by normalized names of their current names (see `legacy_states`),
+simplifies the shapes and caches them in `cache/maps/geometries.parquet`. Basemap of the whole country
+is downloaded once as well and kept in `cache/maps/` as an array.
+
+`render_frames` draws a map per moment of a time range. Active locations of every frame are found by a single
+vectorized sweep over the dataset, and every frame only recolors the same prebuilt collection of shapes,
+so frames are cheap and are rendered by several worker processes at once.
+
+Boundaries are expected in the layout of OCHA COD-AB for Ukraine (`ADM1_UA`, `ADM2_UA`, `ADM3_UA` name columns):
+
+    python -m processors.maps --oblasts adm1.geojson --raions adm2.geojson --hromadas adm3.geojson \
+        --start 2022-02-24 --freq 1h
+"""
+
+import argparse
+import concurrent.futures
+import hashlib
+import io
+import json
+import logging
+import os
+import pathlib
+import re
+from typing import Optional, Union
+
+import contextily as ctx
+import geopandas as gpd
+import matplotlib
+import numpy as np
+import pandas as pd
+from matplotlib import pyplot as plt
+from matplotlib.collections import PatchCollection
+from matplotlib.patches import PathPatch
+from matplotlib.path import Path
+
+from .datasets import LOCATION_COLUMNS, VOLUNTEER_REGION_ALIASES
+from .files import write_atomically
+from .legacy_states import get_new_name
+from .loader import load_dataset
+from .location_index import load_location_index
+
+logger = logging.getLogger(__name__)
+
+# Frames are rendered into files only
+matplotlib.use("Agg")
+
+maps_cache_dir_path = pathlib.Path(__file__).parent.resolve() / "cache" / "maps"
+geometries_path = maps_cache_dir_path / "geometries.parquet"
+tiles_cache_dir_path = maps_cache_dir_path / "tiles"
+maps_dir_path = pathlib.Path(__file__).parent.resolve() / "../maps"
+
+# Bump it when the matching logic is changed
+LOOKUP_VERSION = 1
+
+# Level => name column of boundaries file
+BOUNDARY_NAME_COLUMNS = {"oblast": "ADM1_UA", "raion": "ADM2_UA", "hromada": "ADM3_UA"}
+# Name columns of parent places, used to tell apart hromadas and raions with the same names
+BOUNDARY_PARENT_COLUMNS = {"oblast": [], "raion": ["ADM1_UA"], "hromada": ["ADM1_UA", "ADM2_UA"]}
+
+# Web Mercator, the projection of basemap tiles
+MAP_CRS = "EPSG:3857"
+# In meters, invisible on a map of the whole country
+SIMPLIFY_TOLERANCE = 300
+
+# Oblasts are drawn first, so smaller places are on top of them
+LEVEL_ORDER = {"oblast": 0, "raion": 1, "hromada": 2}
+
+ALERT_COLOR = (0.86, 0.15, 0.15, 0.75)
+BORDER_COLOR = (0.3, 0.3, 0.3, 0.6)
+
+FIGURE_SIZE = (12, 8)
+DPI = 100
+
+
+def normalize_name(name: str) -> str:
+    """
+    Name without type of place, so names of `states.json` match names of boundaries.
+
+    "м. Нікополь та Нікопольська територіальна громада" => "нікопольська"
+    """
+    name = name.lower().replace("’", "'").replace("ʼ", "'").strip()
+    name = re.sub(r"^м\. .+ та ", "", name)
+    name = re.sub(r" (область|район|(міська |селищна |сільська )?територіальна громада)$", "", name)
+    # Kyiv and Sevastopol are cities with special status
+    name = re.sub(r"^м\. ", "", name)
+
+    return name
+
+
+def current_location(location: tuple[str, str, str, str]) -> tuple[str, str, str, str]:
+    """
+    Location with renamed raion and hromada, boundaries are usually named by current names.
+    """
+    oblast, raion, hromada, level = location
+    new_names = get_new_name(oblast, raion, hromada or None)
+    if new_names is None:
+        return location
+
+    new_raion, new_hromada = new_names
+    return oblast, new_raion, new_hromada or "", level
+
+
+def sources_hash(boundary_paths: dict[str, pathlib.Path]) -> str:
+    content_hash = hashlib.sha256()
+    content_hash.update(str(LOOKUP_VERSION).encode())
+    content_hash.update(json.dumps(sorted(load_location_index().items()), ensure_ascii=False).encode())
+
+    for level, path in sorted(boundary_paths.items()):
+        stat = os.stat(path)
+        content_hash.update(f"{level}:{path}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+
+    return content_hash.hexdigest()
+
+
+def match_level(boundaries, level: str, locations: list[tuple[str, str, str, str]]) -> dict[tuple, int]:
+    """
+    :return: dict where key is location, value is row number of its boundary
+    """
+    name_column = BOUNDARY_NAME_COLUMNS[level]
+    parent_columns = BOUNDARY_PARENT_COLUMNS[level]
+
+    full_keys = {}
+    name_keys = {}
+    for row_number, row in enumerate(boundaries[[*parent_columns, name_column]].itertuples(index=False)):
+        names = tuple(normalize_name(str(name)) for name in row)
+        full_keys[names] = row_number
+        # Hromada could be matched by oblast and its name only, if raion is named differently
+        short_key = (names[0], names[-1])
+        name_keys[short_key] = None if short_key in name_keys else row_number
+
+    matched = {}
+    for location in locations:
+        oblast, raion, hromada, _ = current_location(location)
+        names = {"oblast": (oblast,), "raion": (oblast, raion), "hromada": (oblast, raion, hromada)}[level]
+        names = tuple(normalize_name(name) for name in names)
+
+        row_number = full_keys.get(names)
+        if row_number is None and level == "hromada":
+            row_number = name_keys.get((names[0], names[-1]))
+
+        if row_number is not None:
+            matched[location] = row_number
+
+    return matched
+
+
+def build_geometry_lookup(boundary_paths: dict[str, Union[str, pathlib.Path]]):
+    """
+    Matches every location of the location index with its boundary and caches simplified shapes.
+
+    :param boundary_paths: Boundaries file (any format readable by geopandas) by level
+    :return: GeoDataFrame with location columns and geometry in `MAP_CRS`, oblasts go first
+    """
+    boundary_paths = {level: pathlib.Path(path) for level, path in boundary_paths.items()}
+    locations = sorted(set(load_location_index().values()))
+
+    rows = []
+    geometries = []
+    for level, path in boundary_paths.items():
+        logger.info("Matching %s boundaries from %s", level, path)
+        boundaries = gpd.read_file(path).to_crs(MAP_CRS)
+        boundaries["geometry"] = boundaries.geometry.simplify(SIMPLIFY_TOLERANCE, preserve_topology=True)
+
+        level_locations = [location for location in locations if location[3] == level]
+        matched = match_level(boundaries, level, level_locations)
+
+        unmatched = [location for location in level_locations if location not in matched]
+        if unmatched:
+            logger.warning(
+                "%s of %s %s locations have no boundaries, e.g. %s",
+                len(unmatched),
+                len(level_locations),
+                level,
+                ", ".join(name for name in unmatched[0] if name),
+            )
+
+        for location, row_number in matched.items():
+            rows.append(location)
+            geometries.append(boundaries.geometry.iloc[row_number])
+
+    lookup = gpd.GeoDataFrame(
+        pd.DataFrame(rows, columns=LOCATION_COLUMNS["official"]), geometry=geometries, crs=MAP_CRS
+    )
+    lookup = lookup.sort_values("level", key=lambda levels: levels.map(LEVEL_ORDER), kind="stable")
+    lookup = lookup.reset_index(drop=True)
+
+    maps_cache_dir_path.mkdir(parents=True, exist_ok=True)
+    content = io.BytesIO()
+    lookup.to_parquet(content)
+    write_atomically(geometries_path, content.getvalue())
+    write_atomically(geometries_path.with_suffix(".json"), json.dumps({"hash": sources_hash(boundary_paths)}))
+
+    return lookup
+
+
+def load_geometry_lookup(boundary_paths: Optional[dict[str, Union[str, pathlib.Path]]] = None):
+    """
+    Loads cached lookup, it's rebuilt if boundaries are passed and were changed.
+    """
+    if boundary_paths:
+        boundary_paths = {level: pathlib.Path(path) for level, path in boundary_paths.items()}
+        meta_path = geometries_path.with_suffix(".json")
+
+        cached_hash = None
+        if meta_path.exists():
+            with open(meta_path, "r", encoding="utf-8") as f:
+                cached_hash = json.load(f).get("hash")
+
+        if not geometries_path.exists() or cached_hash != sources_hash(boundary_paths):
+            return build_geometry_lookup(boundary_paths)
+
+    if not geometries_path.exists():
+        raise FileNotFoundError(f"{geometries_path} is not built yet, pass boundary files to build it")
+
+    return gpd.read_parquet(geometries_path)
+
+
+def load_basemap(bounds: tuple[float, float, float, float], zoom: int) -> tuple[np.ndarray, tuple]:
+    """
+    Basemap image of bounds (in `MAP_CRS`), downloaded once and cached.
+
+    :return: tuple (image, extent)
+    """
+    source = ctx.providers.CartoDB.Positron
+    key = hashlib.sha256(json.dumps([source.name, zoom, [round(value) for value in bounds]]).encode()).hexdigest()
+    basemap_path = maps_cache_dir_path / f"basemap_{key[:16]}.npz"
+
+    if basemap_path.exists():
+        with np.load(basemap_path) as cached:
+            return cached["image"], tuple(cached["extent"])
+
+    # Tiles are cached as well, so another zoom or extent downloads only missing ones
+    tiles_cache_dir_path.mkdir(parents=True, exist_ok=True)
+    ctx.set_cache_dir(str(tiles_cache_dir_path))
+
+    logger.info("Downloading basemap tiles at zoom %s", zoom)
+    image, extent = ctx.bounds2img(*bounds, zoom=zoom, source=source)
+
+    maps_cache_dir_path.mkdir(parents=True, exist_ok=True)
+    np.savez(basemap_path, image=image, extent=np.asarray(extent))
+
+    return image, tuple(extent)
+
+
+def geometry_to_path(geometry):
+    """
+    Matplotlib path of polygon or multipolygon, holes included.
+    """
+    polygons = getattr(geometry, "geoms", [geometry])
+    rings = [ring for polygon in polygons for ring in [polygon.exterior, *polygon.interiors]]
+
+    return Path.make_compound_path(*(Path(np.asarray(ring.coords)[:, :2], closed=True) for ring in rings))
+
+
+def active_geometries_by_frame(dataset_name: str, lookup, frames: np.ndarray) -> list[np.ndarray]:
+    """
+    Alert is active in frame at moment t when started_at <= t < finished_at.
+
+    :param frames: Moments of frames, seconds since epoch, sorted
+    :return: Row numbers of active locations of `lookup` for every frame
+    """
+    # Place names of boundaries are in Ukrainian
+    dataset = load_dataset(dataset_name, "uk")
+    # Alerts started after the last frame are not needed
+    end_row = np.searchsorted(dataset.started_at, frames[-1], side="right")
+    dataset = dataset.slice(0, end_row)
+
+    # Volunteer regions are looked up as official oblasts
+    location_columns = LOCATION_COLUMNS["official"]
+
+    geometry_ids = {}
+    for row_number, location in enumerate(lookup[location_columns].itertuples(index=False, name=None)):
+        # Rows written before renames have legacy names, see legacy_states
+        geometry_ids.setdefault(current_location(location), row_number)
+        geometry_ids[location] = row_number
+
+    def geometry_id(location: tuple[str, str, str, str]) -> int:
+        row_number = geometry_ids.get(location)
+        if row_number is None:
+            row_number = geometry_ids.get(current_location(location), -1)
+
+        return row_number
+
+    if dataset_name == "official":
+        # Locations are looked up once per distinct combination of codes
+        codes = np.stack([np.asarray(dataset[column]) for column in location_columns], axis=1)
+        unique_codes, inverse = np.unique(codes, axis=0, return_inverse=True)
+        location_geometries = [
+            geometry_id(tuple(dataset.names[column][code] for column, code in zip(location_columns, row)))
+            for row in unique_codes
+        ]
+        row_geometries = np.asarray(location_geometries, dtype=np.int64)[inverse.reshape(-1)]
+    else:
+        region_geometries = [
+            geometry_id((VOLUNTEER_REGION_ALIASES.get(region, region), "", "", "oblast"))
+            for region in dataset.names["region"]
+        ]
+        row_geometries = np.asarray(region_geometries, dtype=np.int64)[np.asarray(dataset["region"])]
+
+    first_frames = np.searchsorted(frames, np.asarray(dataset.started_at), side="left")
+    end_frames = np.searchsorted(frames, np.asarray(dataset.finished_at), side="left")
+    frames_count = np.maximum(end_frames - first_frames, 0)
+    frames_count[row_geometries < 0] = 0
+
+    # Every alert is expanded into (frame, location) pairs of the frames it covers
+    pair_frames = np.repeat(first_frames, frames_count)
+    pair_frames += np.arange(len(pair_frames)) - np.repeat(np.cumsum(frames_count) - frames_count, frames_count)
+    pair_geometries = np.repeat(row_geometries, frames_count)
+
+    order = np.argsort(pair_frames, kind="stable")
+    pair_frames, pair_geometries = pair_frames[order], pair_geometries[order]
+    bounds = np.searchsorted(pair_frames, np.arange(len(frames) + 1), side="left")
+
+    return [np.unique(pair_geometries[bounds[i] : bounds[i + 1]]) for i in range(len(frames))]
+
+
+class FrameRenderer:
+    """
+    Figure with all shapes drawn once, every frame only changes their colors and the title.
+    """
+
+    def __init__(self, lookup, basemap: Optional[tuple[np.ndarray, tuple]] = None):
+        self.figure, self.ax = plt.subplots(figsize=FIGURE_SIZE, dpi=DPI)
+        self.ax.set_axis_off()
+        self.figure.subplots_adjust(left=0, right=1, bottom=0, top=0.95)
+
+        if basemap is not None:
+            image, extent = basemap
+            self.ax.imshow(image, extent=extent, interpolation="bilinear")
+
+        self.colors = np.zeros((len(lookup), 4))
+        self.collection = PatchCollection(
+            [PathPatch(geometry_to_path(geometry)) for geometry in lookup.geometry],
+            facecolors=self.colors,
+            edgecolors=np.where((lookup["level"] == "oblast").to_numpy()[:, None], BORDER_COLOR, (0, 0, 0, 0)),
+            linewidths=0.5,
+        )
+        self.ax.add_collection(self.collection)
+
+        min_x, min_y, max_x, max_y = lookup.total_bounds
+        self.ax.set_xlim(min_x, max_x)
+        self.ax.set_ylim(min_y, max_y)
+        self.ax.set_aspect("equal")
+
+        self.title = self.ax.set_title("")
+
+    def render(self, title: str, active_geometries: np.ndarray, path: pathlib.Path):
+        self.colors[:] = 0
+        self.colors[active_geometries] = ALERT_COLOR
+        self.collection.set_facecolor(self.colors)
+        self.title.set_text(title)
+
+        self.figure.savefig(path, dpi=DPI)
+
+    def close(self):
+        plt.close(self.figure)
+
+
+# Figure of a worker process, see `init_render_worker`
+worker_renderer: Optional[FrameRenderer] = None
+
+
+def init_render_worker(basemap_zoom: Optional[int]):
+    """
+    Every worker reads cached lookup and basemap and draws shapes once.
+    """
+    global worker_renderer
+
+    lookup = load_geometry_lookup()
+    basemap = load_basemap(tuple(lookup.total_bounds), basemap_zoom) if basemap_zoom is not None else None
+    worker_renderer = FrameRenderer(lookup, basemap)
+
+
+def render_chunk(frame_paths: list[pathlib.Path], titles: list[str], active_geometries: list[np.ndarray]) -> int:
+    for path, title, geometries in zip(frame_paths, titles, active_geometries):
+        worker_renderer.render(title, geometries, path)
+
+    return len(frame_paths)
+
+
+def to_utc(moment: Union[str, pd.Timestamp]) -> pd.Timestamp:
+    timestamp = pd.Timestamp(moment)
+    # Datasets are in UTC
+    return timestamp.tz_localize("UTC") if timestamp.tzinfo is None else timestamp.tz_convert("UTC")
+
+
+def render_frames(
+    start: Union[str, pd.Timestamp],
+    end: Optional[Union[str, pd.Timestamp]] = None,
+    freq: str = "1h",
+    dataset_name: str = "official",
+    output_dir: Union[str, pathlib.Path] = maps_dir_path,
+    boundary_paths: Optional[dict[str, Union[str, pathlib.Path]]] = None,
+    basemap_zoom: Optional[int] = 6,
+    processes: Optional[int] = None,
+    overwrite: bool = False,
+) -> list[pathlib.Path]:
+    """
+    Renders a PNG map of active alerts for every moment from start to end (now by default) with given frequency.
+
+    :param boundary_paths: Boundary files by level, cached lookup is used if not passed
+    :param basemap_zoom: Zoom of basemap tiles, no basemap if None
+    :param processes: Number of worker processes, number of CPUs by default
+    :param overwrite: Frames rendered by previous runs are kept unless it's True
+    :return: Paths of all frames of the range
+    """
+    lookup = load_geometry_lookup(boundary_paths)
+    if basemap_zoom is not None:
+        # Downloaded before workers are started, so they only read the cache
+        load_basemap(tuple(lookup.total_bounds), basemap_zoom)
+
+    moments = pd.date_range(to_utc(start), pd.Timestamp.now(tz="UTC") if end is None else to_utc(end), freq=freq)
+    frames = (moments - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(seconds=1)
+    frames = np.asarray(frames, dtype=np.int64)
+
+    output_dir = pathlib.Path(output_dir) / dataset_name
+    output_dir.mkdir(parents=True, exist_ok=True)
+    paths = [output_dir / f"{moment:%Y%m%dT%H%M}Z.png" for moment in moments]
+
+    active_geometries = active_geometries_by_frame(dataset_name, lookup, frames)
+    titles = [f"{moment.tz_convert('Europe/Kyiv'):%Y-%m-%d %H:%M} (Kyiv)" for moment in moments]
+
+    todo = [i for i, path in enumerate(paths) if overwrite or not path.exists()]
+    logger.info("Rendering %s of %s frames into %s", len(todo), len(paths), output_dir)
+    if not todo:
+        return paths
+
+    processes = processes or os.cpu_count() or 1
+    # Contiguous chunks, so progress is kept if rendering is interrupted
+    chunks = np.array_split(np.asarray(todo), min(processes * 4, len(todo)))
+    arguments = [
+        ([paths[i] for i in chunk], [titles[i] for i in chunk], [active_geometries[i] for i in chunk])
+        for chunk in chunks
+    ]
+
+    if processes == 1:
+        init_render_worker(basemap_zoom)
+        for chunk_arguments in arguments:
+            render_chunk(*chunk_arguments)
+    else:
+        with concurrent.futures.ProcessPoolExecutor(
+            processes, initializer=init_render_worker, initargs=(basemap_zoom,)
+        ) as executor:
+            for _ in executor.map(render_chunk, *zip(*arguments)):
+                pass
+
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render maps of active alerts")
+    parser.add_argument("--oblasts", help="Boundaries of oblasts, needed only to build the lookup")
+    parser.add_argument("--raions", help="Boundaries of raions")
+    parser.add_argument("--hromadas", help="Boundaries of hromadas")
+    parser.add_argument("--dataset", default="official", choices=["official", "volunteer"])
+    parser.add_argument("--start", required=True, help="The first frame, UTC if timezone is not set")
+    parser.add_argument("--end", help="The last frame, now by default")
+    parser.add_argument("--freq", default="1h", help="Time between frames, pandas frequency")
+    parser.add_argument("--zoom", type=int, default=6, help="Zoom of basemap tiles")
+    parser.add_argument("--no-basemap", action="store_true")
+    parser.add_argument("--processes", type=int, help="Number of worker processes, number of CPUs by default")
+    parser.add_argument("--overwrite", action="store_true", help="Render again frames which already exist")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    boundary_paths = {
+        level: path
+        for level, path in [("oblast", args.oblasts), ("raion", args.raions), ("hromada", args.hromadas)]
+        if path
+    }
+
+    render_frames(
+        args.start,
+        args.end,
+        freq=args.freq,
+        dataset_name=args.dataset,
+        boundary_paths=boundary_paths or None,
+        basemap_zoom=None if args.no_basemap else args.zoom,
+        processes=args.processes,
+        overwrite=args.overwrite,
+    )
+
+
+if __name__ == "__main__":
+    main()
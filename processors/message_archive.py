@@ -0,0 +1,275 @@
+"""
+Append-only compressed archive of raw channel messages.
+
+Every channel is stored as two files:
+ - `<channel>.blocks` with zlib-compressed blocks, each block is JSON Lines of `id`, `date` and `text`;
+ - `<channel>.index` with one JSON line per block: byte offset, length and id/date ranges of the block.
+
+Blocks are appended before their index lines, so a crash can leave a partial index line or unindexed blocks
+at the end of files. On load the index is cut to its last complete line, complete unindexed blocks are indexed
+again and a partially written block is truncated, so the next block is never appended to broken data.
+
+Messages buffered in memory are lost on crash, while the processor could have saved its cursor after them,
+so `ArchivingMessageSource` downloads messages again since the last archived one.
+"""
+
+import datetime
+import json
+import logging
+import os
+import pathlib
+import zlib
+from typing import AsyncIterator, Iterator, Optional, Union
+
+from .message_sources import ArchivedMessage, parse_date
+
+logger = logging.getLogger(__name__)
+
+archive_dir_path = pathlib.Path(__file__).parent.resolve() / "../archive"
+
+DEFAULT_BLOCK_SIZE = 1000
+
+
+class ChannelArchive:
+    def __init__(self, directory: pathlib.Path, channel_name: str, block_size: int = DEFAULT_BLOCK_SIZE):
+        self.channel_name = channel_name
+        self.block_size = block_size
+
+        self.blocks_path = directory / f"{channel_name}.blocks"
+        self.index_path = directory / f"{channel_name}.index"
+
+        # List of dicts with keys offset, length, count, min_id, max_id, min_date, max_date
+        self.blocks: list[dict] = []
+        self.buffer: list[ArchivedMessage] = []
+
+        self.load_index()
+
+    @property
+    def last_id(self) -> int:
+        if self.buffer:
+            return self.buffer[-1].id
+
+        if self.blocks:
+            return self.blocks[-1]["max_id"]
+
+        return 0
+
+    def load_index(self):
+        if os.path.exists(self.index_path):
+            valid_size = 0
+
+            with open(self.index_path, "rb") as f:
+                for line in f:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("Line is not complete")
+                        if line.strip():
+                            self.blocks.append(json.loads(line))
+                    except ValueError:
+                        break
+
+                    valid_size += len(line)
+
+            if valid_size < os.path.getsize(self.index_path):
+                # Last line was partially written, the next line would be appended to it otherwise
+                logger.warning("Truncating broken index line of %s", self.index_path)
+                with open(self.index_path, "r+b") as f:
+                    f.truncate(valid_size)
+
+        self.recover_blocks()
+
+    def recover_blocks(self):
+        """
+        Indexes blocks written after the last index line and truncates a partially written block.
+        """
+        if not os.path.exists(self.blocks_path):
+            return
+
+        offset = self.blocks[-1]["offset"] + self.blocks[-1]["length"] if self.blocks else 0
+        blocks_size = os.path.getsize(self.blocks_path)
+        if offset >= blocks_size:
+            return
+
+        with open(self.blocks_path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+
+        recovered_blocks = []
+        while data:
+            decompressor = zlib.decompressobj()
+            try:
+                content = decompressor.decompress(data)
+            except zlib.error:
+                break
+            if not decompressor.eof:
+                break
+
+            length = len(data) - len(decompressor.unused_data)
+            recovered_blocks.append(self.make_block(offset, length, list(self.decode_block(content))))
+
+            offset += length
+            data = decompressor.unused_data
+
+        if recovered_blocks:
+            logger.warning("Indexing %s blocks of %s written after the index", len(recovered_blocks), self.blocks_path)
+            self.write_index(recovered_blocks)
+
+        if offset < blocks_size:
+            logger.warning("Truncating partially written block of %s", self.blocks_path)
+            with open(self.blocks_path, "r+b") as f:
+                f.truncate(offset)
+
+    def append(self, message) -> bool:
+        """
+        Adds message to the archive. Messages with ids already archived are skipped.
+
+        :return: True if message was added
+        """
+        if message.id <= self.last_id:
+            return False
+
+        self.buffer.append(ArchivedMessage(id=message.id, date=message.date, message=message.message or ""))
+
+        if len(self.buffer) >= self.block_size:
+            self.flush()
+
+        return True
+
+    def flush(self):
+        if not self.buffer:
+            return
+
+        lines = [
+            json.dumps({"id": m.id, "date": m.date.isoformat(), "text": m.message}, ensure_ascii=False)
+            for m in self.buffer
+        ]
+        data = zlib.compress("\n".join(lines).encode("utf-8"), 6)
+
+        self.blocks_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.blocks_path, "ab") as f:
+            offset = f.tell()
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.write_index([self.make_block(offset, len(data), self.buffer)])
+        self.buffer = []
+
+    @staticmethod
+    def make_block(offset: int, length: int, messages: list[ArchivedMessage]) -> dict:
+        return {
+            "offset": offset,
+            "length": length,
+            "count": len(messages),
+            "min_id": messages[0].id,
+            "max_id": messages[-1].id,
+            "min_date": min(m.date for m in messages).isoformat(),
+            "max_date": max(m.date for m in messages).isoformat(),
+        }
+
+    def write_index(self, blocks: list[dict]):
+        with open(self.index_path, "a", encoding="utf-8") as f:
+            for block in blocks:
+                f.write(json.dumps(block) + "\n")
+
+        self.blocks.extend(blocks)
+
+    @staticmethod
+    def decode_block(content: bytes) -> Iterator[ArchivedMessage]:
+        for line in content.decode("utf-8").split("\n"):
+            raw_message = json.loads(line)
+            yield ArchivedMessage(
+                id=raw_message["id"], date=parse_date(raw_message["date"]), message=raw_message["text"]
+            )
+
+    def read_block(self, f, block: dict) -> Iterator[ArchivedMessage]:
+        f.seek(block["offset"])
+        return self.decode_block(zlib.decompress(f.read(block["length"])))
+
+    def read(self, min_id: int = 0, max_id: Optional[int] = None) -> Iterator[ArchivedMessage]:
+        """
+        Yields archived messages with min_id < id <= max_id, ordered by id.
+        """
+        if self.blocks:
+            with open(self.blocks_path, "rb") as f:
+                for block in self.blocks:
+                    if block["max_id"] <= min_id or (max_id is not None and block["min_id"] > max_id):
+                        continue
+
+                    for message in self.read_block(f, block):
+                        if message.id > min_id and (max_id is None or message.id <= max_id):
+                            yield message
+
+        for message in self.buffer:
+            if message.id > min_id and (max_id is None or message.id <= max_id):
+                yield message
+
+    def read_dates(self, started_at: datetime.datetime, finished_at: datetime.datetime) -> Iterator[ArchivedMessage]:
+        """
+        Yields archived messages with started_at <= date < finished_at, ordered by id.
+        """
+        if self.blocks:
+            with open(self.blocks_path, "rb") as f:
+                for block in self.blocks:
+                    if parse_date(block["max_date"]) < started_at or parse_date(block["min_date"]) >= finished_at:
+                        continue
+
+                    for message in self.read_block(f, block):
+                        if started_at <= message.date < finished_at:
+                            yield message
+
+        for message in self.buffer:
+            if started_at <= message.date < finished_at:
+                yield message
+
+
+class MessageArchive:
+    """
+    Archive of all channels in one directory, could be used as a message source.
+    """
+
+    def __init__(self, directory: Union[str, pathlib.Path] = archive_dir_path, block_size: int = DEFAULT_BLOCK_SIZE):
+        self.directory = pathlib.Path(directory)
+        self.block_size = block_size
+        self.channels: dict[str, ChannelArchive] = {}
+
+    def channel(self, channel_name: str) -> ChannelArchive:
+        if channel_name not in self.channels:
+            self.channels[channel_name] = ChannelArchive(self.directory, channel_name, self.block_size)
+
+        return self.channels[channel_name]
+
+    def flush(self):
+        for channel_archive in self.channels.values():
+            channel_archive.flush()
+
+    async def iter_messages(self, channel_name: str, min_id: int = 0) -> AsyncIterator[ArchivedMessage]:
+        for message in self.channel(channel_name).read(min_id=min_id):
+            yield message
+
+
+class ArchivingMessageSource:
+    """
+    Wraps another source and stores every fetched message into the archive.
+    """
+
+    def __init__(self, source, archive: MessageArchive):
+        self.source = source
+        self.archive = archive
+
+    async def iter_messages(self, channel_name: str, min_id: int = 0) -> AsyncIterator:
+        """
+        Yields messages since `min_id`, messages missing in the archive since its last message are fetched as well.
+
+        Archive which is empty or started after `min_id` isn't filled with earlier messages.
+        """
+        channel_archive = self.archive.channel(channel_name)
+        fetch_min_id = min(min_id, channel_archive.last_id) if channel_archive.last_id else min_id
+
+        try:
+            async for message in self.source.iter_messages(channel_name, min_id=fetch_min_id):
+                channel_archive.append(message)
+                if message.id > min_id:
+                    yield message
+        finally:
+            channel_archive.flush()
@@ -0,0 +1,131 @@
+"""
+Message sources for channel processors.
+
+Processors only need `id`, `date` and `message` attributes of a Telegram message,
+so they can be fed either by Telegram itself or by a local archive of exported messages.
+"""
+
+import datetime
+import json
+import pathlib
+import sqlite3
+from dataclasses import dataclass
+from typing import AsyncIterator, Iterator, Union
+
+
+@dataclass(frozen=True)
+class ArchivedMessage:
+    """Minimal message shape used by processors, compatible with `telethon.tl.types.Message`."""
+
+    id: int
+    date: datetime.datetime
+    message: str
+
+
+def parse_date(value: str) -> datetime.datetime:
+    # Telegram dates are always in UTC, treat naive values from archives the same way
+    date = datetime.datetime.fromisoformat(value)
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=datetime.timezone.utc)
+
+    return date
+
+
+class TelegramMessageSource:
+    """Live source, iterates over channel history with Telethon client."""
+
+    def __init__(self, client):
+        self.client = client
+
+    async def iter_messages(self, channel_name: str, min_id: int = 0) -> AsyncIterator:
+        async for message in self.client.iter_messages(channel_name, reverse=True, min_id=min_id):
+            yield message
+
+
+class JSONLMessageSource:
+    """
+    Local source, reads messages from a JSON Lines file.
+
+    Each line is an object with `id`, `date` (ISO 8601) and `text` keys.
+    Lines may be in any order, messages are yielded sorted by id.
+    """
+
+    def __init__(self, path: Union[str, pathlib.Path]):
+        self.path = pathlib.Path(path)
+
+    def read(self, min_id: int = 0) -> Iterator[ArchivedMessage]:
+        messages = []
+
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+
+                raw_message = json.loads(line)
+                if raw_message["id"] <= min_id:
+                    continue
+
+                messages.append(
+                    ArchivedMessage(
+                        id=raw_message["id"],
+                        date=parse_date(raw_message["date"]),
+                        message=raw_message.get("text") or "",
+                    )
+                )
+
+        messages.sort(key=lambda x: x.id)
+        return iter(messages)
+
+    async def iter_messages(self, channel_name: str, min_id: int = 0) -> AsyncIterator[ArchivedMessage]:
+        for message in self.read(min_id=min_id):
+            yield message
+
+
+class SQLiteMessageSource:
+    """
+    Local source, reads messages from SQLite database.
+
+    Expects a table (`messages` by default) with `id`, `date` (ISO 8601) and `text` columns.
+    If the table has a `channel` column, only messages of the processed channel are read.
+    """
+
+    def __init__(self, path: Union[str, pathlib.Path], table: str = "messages"):
+        self.path = pathlib.Path(path)
+        self.table = table
+
+    def read(self, channel_name: str, min_id: int = 0) -> Iterator[ArchivedMessage]:
+        connection = sqlite3.connect(self.path)
+
+        try:
+            columns = {row[1] for row in connection.execute(f"PRAGMA table_info({self.table})")}
+
+            query = f"SELECT id, date, text FROM {self.table} WHERE id > ?"
+            params: tuple = (min_id,)
+            if "channel" in columns:
+                query += " AND channel = ?"
+                params += (channel_name,)
+            query += " ORDER BY id"
+
+            for message_id, date, text in connection.execute(query, params):
+                yield ArchivedMessage(id=message_id, date=parse_date(date), message=text or "")
+        finally:
+            connection.close()
+
+    async def iter_messages(self, channel_name: str, min_id: int = 0) -> AsyncIterator[ArchivedMessage]:
+        for message in self.read(channel_name, min_id=min_id):
+            yield message
+
+
+def source_from_path(path: Union[str, pathlib.Path]):
+    """Picks archive source by file extension, directories are treated as compressed `MessageArchive`."""
+    path = pathlib.Path(path)
+
+    if path.is_dir():
+        from .message_archive import MessageArchive
+
+        return MessageArchive(path)
+
+    if path.suffix in (".db", ".sqlite", ".sqlite3"):
+        return SQLiteMessageSource(path)
+
+    return JSONLMessageSource(path)
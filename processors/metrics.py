@@ -0,0 +1,161 @@
+"""
+Timings and counters of processing runs.
+
+Every processor collects wall time of its stages (fetch, parse, state transitions, write, checkpoint)
+and counters of messages, parse failures by reason, alerts and written rows.
+After the run they're written to `metrics/processing.json` and `metrics/processing.prom`,
+the latter is in Prometheus text format for node_exporter's textfile collector.
+"""
+
+import collections
+import json
+import pathlib
+import time
+from typing import AsyncIterator, Iterable
+
+from .files import write_atomically
+
+metrics_dir_path = pathlib.Path(__file__).parent.resolve() / "../metrics"
+
+METRIC_PREFIX = "air_raid_datasets"
+
+
+class StageTimer:
+    __slots__ = ("metrics", "stage", "started_at")
+
+    def __init__(self, metrics: "ProcessingMetrics", stage: str):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.started_at = time.perf_counter()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.metrics.stage_seconds[self.stage] += time.perf_counter() - self.started_at
+
+
+class ProcessingMetrics:
+    def __init__(self, channel_name: str):
+        self.channel_name = channel_name
+
+        self.stage_seconds: dict[str, float] = collections.defaultdict(float)
+        self.counters: dict[str, int] = collections.Counter()
+        self.parse_failures: dict[str, int] = collections.Counter()
+
+    def timer(self, stage: str) -> StageTimer:
+        return StageTimer(self, stage)
+
+    def add_time(self, stage: str, seconds: float):
+        self.stage_seconds[stage] += seconds
+
+    def count(self, counter: str, value: int = 1):
+        self.counters[counter] += value
+
+    def count_parse_failure(self, reason: str):
+        self.parse_failures[reason] += 1
+
+    async def timed_messages(self, messages: AsyncIterator, stage: str = "fetch") -> AsyncIterator:
+        """
+        Passes messages through, time spent waiting for the next message is added to the stage.
+        """
+        iterator = messages.__aiter__()
+
+        try:
+            while True:
+                started_at = time.perf_counter()
+                try:
+                    message = await iterator.__anext__()
+                except StopAsyncIteration:
+                    return
+                finally:
+                    self.stage_seconds[stage] += time.perf_counter() - started_at
+
+                self.counters["messages"] += 1
+                yield message
+        finally:
+            # Sources flush their archives on close
+            if hasattr(iterator, "aclose"):
+                await iterator.aclose()
+
+    def to_dict(self) -> dict:
+        return {
+            "channel": self.channel_name,
+            "stage_seconds": dict(self.stage_seconds),
+            "counters": dict(self.counters),
+            "parse_failures": dict(self.parse_failures),
+        }
+
+
+def to_prometheus(all_metrics: Iterable[ProcessingMetrics], failed_channels: Iterable[str] = ()) -> str:
+    lines = []
+
+    def add_metric(name: str, help_text: str, samples: list[tuple[dict[str, str], float]]):
+        lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+        lines.append(f"# TYPE {METRIC_PREFIX}_{name} gauge")
+        for labels, value in samples:
+            labels_text = ",".join(f'{key}="{value}"' for key, value in labels.items())
+            lines.append(f"{METRIC_PREFIX}_{name}{{{labels_text}}} {value}")
+
+    all_metrics = list(all_metrics)
+    failed_channels = set(failed_channels)
+
+    add_metric(
+        "stage_seconds",
+        "Wall time of processing stages during the last run",
+        [
+            ({"channel": metrics.channel_name, "stage": stage}, seconds)
+            for metrics in all_metrics
+            for stage, seconds in sorted(metrics.stage_seconds.items())
+        ],
+    )
+    add_metric(
+        "events",
+        "Number of processed messages, alerts and written rows during the last run",
+        [
+            ({"channel": metrics.channel_name, "event": counter}, value)
+            for metrics in all_metrics
+            for counter, value in sorted(metrics.counters.items())
+        ],
+    )
+    add_metric(
+        "parse_failures",
+        "Number of skipped messages by reason during the last run",
+        [
+            ({"channel": metrics.channel_name, "reason": reason}, value)
+            for metrics in all_metrics
+            for reason, value in sorted(metrics.parse_failures.items())
+        ],
+    )
+    add_metric(
+        "success",
+        "1 if the last run of the channel finished without errors",
+        [
+            ({"channel": metrics.channel_name}, int(metrics.channel_name not in failed_channels))
+            for metrics in all_metrics
+        ],
+    )
+    add_metric(
+        "last_run_timestamp_seconds",
+        "Time of the last run",
+        [({}, int(time.time()))],
+    )
+
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(
+    all_metrics: Iterable[ProcessingMetrics],
+    failed_channels: Iterable[str] = (),
+    directory: pathlib.Path = metrics_dir_path,
+):
+    all_metrics = list(all_metrics)
+    failed_channels = list(failed_channels)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    summary = {
+        "finished_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "failed_channels": failed_channels,
+        "channels": [metrics.to_dict() for metrics in all_metrics],
+    }
+    write_atomically(directory / "processing.json", json.dumps(summary, indent=2))
+    write_atomically(directory / "processing.prom", to_prometheus(all_metrics, failed_channels))
@@ -1,15 +1,14 @@
-import csv
 import datetime
-import json
 import logging
-import os.path
 import pathlib
-import pickle
+import time
 from typing import Optional, List
 
 from telethon.tl.types import Message
 
-from .legacy_states import get_new_name
+from .channel_processor import ChannelProcessor
+from .location_index import load_location_index, location_to_hashtag
+from .state_store import StateStore
 from .tg_dataclasses import OfficialAirRaidAlertChannelAlert, PLACE_LEVEL
 
 logging.basicConfig()
@@ -21,138 +20,108 @@ data_en_file_path = pathlib.Path(__file__).parent.resolve() / "../datasets/offic
 
 last_processed_id_path = pathlib.Path(__file__).parent.resolve() / "pkl" / "official_last_processed_id.txt"
 pkl_file_path = pathlib.Path(__file__).parent.resolve() / "pkl" / "official_active_alerts.pkl"
+legacy_checkpoint_path = pathlib.Path(__file__).parent.resolve() / "pkl" / "official_checkpoint.json"
 
 
-class OfficialAirAlertProcessor:
+class OfficialAirAlertProcessor(ChannelProcessor):
     channel_name = "air_alert_ua"
+    dataset_name = "official"
+    fieldnames = [
+        "oblast",
+        "raion",
+        "hromada",
+        "level",
+        "started_at",
+        "finished_at",
+        "source",
+    ]
+    alert_class = OfficialAirRaidAlertChannelAlert
 
     # State
     # key is place name in hashtag format, value is tuple (oblast name, raion name, hromada name, level)
     hash_states_by_name: dict[str, tuple[str, str, str, PLACE_LEVEL]] = {}
 
-    active_alerts_by_location: dict[str, OfficialAirRaidAlertChannelAlert] = {}
-    completed_alerts: list[OfficialAirRaidAlertChannelAlert] = []
+    active_alerts_by_location: dict[str, OfficialAirRaidAlertChannelAlert]
+    completed_alerts: list[OfficialAirRaidAlertChannelAlert]
 
-    last_processed_id: int = 0
+    dataset_file_paths = {"uk": data_uk_file_path, "en": data_en_file_path}
 
-    def __init__(self, client):
-        self.client = client
+    pkl_file_path = pkl_file_path
+    last_processed_id_path = last_processed_id_path
+    legacy_checkpoint_path = legacy_checkpoint_path
 
-        self.load_states()
-        self.load_active_alerts()
-        self.load_last_processed_id()
-
-    async def process(self):
-        previous_day = None
-
-        logging.info("Starting processing official channel messages from %s", self.last_processed_id)
-
-        # TODO Fetch latest days from .csv file and just append it
-        async for message in self.client.iter_messages(self.channel_name, reverse=True, min_id=self.last_processed_id):
-            if not previous_day or previous_day != message.date.date():
-                previous_day = message.date.date()
-                logger.info("Processing day %s", previous_day)
-
-            if not message.message:
-                continue
-
-            self.process_message(message)
-
-            self.last_processed_id = message.id
-
-        logging.info("Finished processing official channel messages at %s", self.last_processed_id)
-        self.write()
-
-    def load_active_alerts(self):
-        if not os.path.exists(pkl_file_path):
-            return
-
-        with open(pkl_file_path, "rb") as f:
-            self.active_alerts_by_location = pickle.load(f)
-
-    def dump_active_alerts(self):
-        with open(pkl_file_path, "wb") as f:
-            pickle.dump(self.active_alerts_by_location, f)
-
-    def load_last_processed_id(self):
-        if not os.path.exists(last_processed_id_path):
-            return
-
-        with open(last_processed_id_path, "r") as f:
-            self.last_processed_id = int(f.read())
-
-    def dump_last_processed_id(self):
-        with open(last_processed_id_path, "w") as f:
-            f.write(str(self.last_processed_id))
-
-    def write(self):
-        self.completed_alerts.sort(key=lambda x: x.started_at)
-
-        self.write_to_file(lang="uk")
-        self.write_to_file(lang="en")
-
-        self.dump_active_alerts()
-        self.dump_last_processed_id()
-
-    def write_to_file(self, lang: str = "uk"):
-        file_path = data_uk_file_path if lang == "uk" else data_en_file_path
-
-        mode = "a" if os.path.exists(file_path) else "w"
-        with open(file_path, mode, newline="") as csvfile:
-            fieldnames = [
-                "oblast",
-                "raion",
-                "hromada",
-                "level",
-                "started_at",
-                "finished_at",
-                "source",
-            ]
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-
-            if mode == "w":
-                writer.writeheader()
+    def __init__(self, client=None, source=None, state_store: Optional[StateStore] = None):
+        """
+        :param client: Telethon client, used when no explicit source is passed
+        :param source: Message source, e.g. local archive from `message_sources`
+        :param state_store: Storage of cursor and active alerts, default database is used if not passed
+        """
+        super().__init__(client, source, state_store)
 
-            for record in self.completed_alerts:
-                writer.writerow(record.dict(lang=lang))
+        with self.metrics.timer("load_states"):
+            self.load_states()
 
     def process_message(self, message: Message):
         logger.info("Processing message %s", message.message)
 
+        super().process_message(message)
+
+    def location_events(self, message: Message) -> list[tuple[str, Optional[bool], Optional[bool]]]:
+        """
+        :return: list of tuples (hashed location name, is_enabled, is_disabled), empty if message can't be parsed
+        """
+        started_at = time.perf_counter()
         hashed_locations, is_activated, is_deactivated = self.parse_message(message)
+        self.metrics.add_time("parse", time.perf_counter() - started_at)
 
         if not is_activated and not is_deactivated:
             logger.error("Can't parse %s, skipping...", message.message)
-            return
-
-        for hashed_location in hashed_locations:
-            oblast_name, raion_name, hromada_name, level = self.hash_states_by_name[hashed_location]
-
-            if is_activated:
-                if current_alert := self.active_alerts_by_location.get(hashed_location):
-                    # Looks like it was started some time ago, but there are no message when alert was completed
-                    more_than_3_hours_difference = (message.date - current_alert.started_at) > datetime.timedelta(hours=3)
-                    if more_than_3_hours_difference:
-                        # Looks like it was not marked as completed, but another alert was started
-                        # otherwise just rewrite this alert
-                        current_alert.finished_at = current_alert.started_at + datetime.timedelta(hours=1)
-                        self.completed_alerts.append(current_alert)
-
-                alert = OfficialAirRaidAlertChannelAlert(
-                    started_at=message.date,
-                    oblast=oblast_name,
-                    raion=raion_name,
-                    hromada=hromada_name,
-                    level=level,
-                )
-                self.active_alerts_by_location[hashed_location] = alert
-
-            if is_deactivated:
-                if alert := self.active_alerts_by_location.get(hashed_location):
-                    alert.finished_at = message.date
-                    self.completed_alerts.append(alert)
-
-                    del self.active_alerts_by_location[hashed_location]
+            return []
+
+        return [(hashed_location, is_activated, is_deactivated) for hashed_location in hashed_locations]
+
+    def update_location(
+        self,
+        hashed_location: str,
+        date: datetime.datetime,
+        is_activated: Optional[bool],
+        is_deactivated: Optional[bool],
+    ):
+        """
+        State machine of one location, it doesn't depend on other locations (see sharded_rebuild module).
+        """
+        oblast_name, raion_name, hromada_name, level = self.hash_states_by_name[hashed_location]
+
+        if is_activated:
+            if current_alert := self.active_alerts_by_location.get(hashed_location):
+                # Looks like it was started some time ago, but there are no message when alert was completed
+                more_than_3_hours_difference = (date - current_alert.started_at) > datetime.timedelta(hours=3)
+                if more_than_3_hours_difference:
+                    # Looks like it was not marked as completed, but another alert was started
+                    # otherwise just rewrite this alert
+                    current_alert.finished_at = current_alert.started_at + datetime.timedelta(hours=1)
+                    self.completed_alerts.append(current_alert)
+                    self.metrics.count("synthesized_finishes")
+
+            alert = OfficialAirRaidAlertChannelAlert(
+                started_at=date,
+                oblast=oblast_name,
+                raion=raion_name,
+                hromada=hromada_name,
+                level=level,
+            )
+            self.active_alerts_by_location[hashed_location] = alert
+            self.changed_locations.add(hashed_location)
+            self.metrics.count("alerts_started")
+
+        if is_deactivated:
+            if alert := self.active_alerts_by_location.get(hashed_location):
+                alert.finished_at = date
+                self.completed_alerts.append(alert)
+
+                del self.active_alerts_by_location[hashed_location]
+                self.changed_locations.add(hashed_location)
+                self.metrics.count("alerts_finished")
 
     @staticmethod
     def is_ignored_message(message: Message) -> bool:
@@ -175,6 +144,7 @@ class OfficialAirAlertProcessor:
 
         if self.is_ignored_message(message):
             logger.error("Message %s is ignored", message.message)
+            self.metrics.count_parse_failure("ignored")
             return None, None, None
 
         first_line = message.message.split("\n")[0]
@@ -194,6 +164,7 @@ class OfficialAirAlertProcessor:
             if not self.hash_states_by_name.get(hashtag_location):
                 # TODO Raise an exception someday
                 logger.error("Can't process %s", hashtag_location)
+                self.metrics.count_parse_failure("unknown_hashtag")
                 return None, None, None
 
         is_activated = ("Повітряна" in first_line) or ("🔴" in first_line)
@@ -207,138 +178,15 @@ class OfficialAirAlertProcessor:
                 message.date,
                 first_line,
             )
+            self.metrics.count_parse_failure("unknown_state")
             return None, None, None
 
         return hashtag_locations, is_activated, is_deactivated
 
     @staticmethod
     def location_to_hashtag(location: str) -> str:
-        # Івано-Франківськ => #ІваноФранківськ
-        # Запорізька область => #Запорізька_область
-        # м. Кривий Ріг... → м_Кривий_Ріг_та_Криворізька_територіальна_громада
-
-        hashtag_value = (
-            location.lower().replace("-", "").replace(" ", "_").replace(".", "").replace("'", "").replace("’", "")
-        )
-        return f"#{hashtag_value}"
+        return location_to_hashtag(location)
 
     def load_states(self):
-        states_file_path = pathlib.Path(__file__).parent.resolve() / "states.json"
-
-        with open(states_file_path, "r") as json_file:
-            raw_states = json.load(json_file)
-
-        for state in raw_states["states"]:
-            state_name = state["stateName"]
-            hashed_state_name = self.location_to_hashtag(state_name)
-            self.hash_states_by_name[hashed_state_name] = (state_name, "", "", "oblast")
-
-            for raion in state["districts"]:
-                raion_name = raion["districtName"]
-
-                maybe_renamed_raion = get_new_name(state_name, raion_name)
-                maybe_renamed_raion_name = maybe_renamed_raion[0] if maybe_renamed_raion else None
-
-                hashed_raion_name = self.location_to_hashtag(raion_name)
-                self.hash_states_by_name[hashed_raion_name] = (
-                    state_name,
-                    maybe_renamed_raion_name or raion_name,
-                    "",
-                    "raion",
-                )
-
-                # Special fix for renamed raions
-                if maybe_renamed_raion_name:
-                    hashed_renamed_raion_name = self.location_to_hashtag(maybe_renamed_raion_name)
-                    self.hash_states_by_name[hashed_renamed_raion_name] = (
-                        state_name,
-                        maybe_renamed_raion_name,
-                        "",
-                        "raion",
-                    )
-
-                for hromada in raion["communities"]:
-                    hromada_name = hromada["communityName"]
-                    maybe_renamed_hromada = get_new_name(state_name, raion_name, hromada_name)
-                    maybe_renamed_hromada_name = maybe_renamed_hromada[1] if maybe_renamed_hromada else None
-                    hashed_hromada_name = self.location_to_hashtag(hromada_name)
-
-                    # There are hromadas with duplicated names, so adding only hromadas where sirens were used at least once.
-                    # Other hromadas located far away from battlefield.
-                    hromada_special_rules = {
-                        # hromada: (raion, oblast)
-                        "Широківська територіальна громада": (
-                            "Баштанський район",
-                            "Миколаївська область",
-                        ),
-                        "Воскресенська територіальна громада": (
-                            "Миколаївський район",
-                            "Миколаївська область",
-                        ),
-                        "Софіївська територіальна громада": (
-                            "Баштанський район",
-                            "Миколаївська область",
-                        ),
-                        "Костянтинівська територіальна громада": (
-                            "Миколаївський район",
-                            "Миколаївська область",
-                        ),
-                        "Привільненська територіальна громада": (
-                            "Баштанський район",
-                            "Миколаївська область",
-                        ),
-                        "Горохівська територіальна громада": (
-                            "Баштанський район",
-                            "Миколаївська область",
-                        ),
-                        "Гребінківська територіальна громада": (
-                            "Лубенський район",
-                            "Полтавська область",
-                        ),
-                        "Покровська територіальна громада": (
-                            "Покровський район",
-                            "Донецька область",
-                        ),
-                        "Лиманська територіальна громада": (
-                            "Краматорський район",
-                            "Донецька область",
-                        ),
-                        "Олександрівська територіальна громада": (
-                            "Вознесенський район",
-                            "Миколаївська область",
-                        ),
-                        "Золочівська територіальна громада": (
-                            "Богодухівський район",
-                            "Харківська область",
-                        ),
-                        "Українська територіальна громада": (
-                            "Обухівський район",
-                            "Київська область",
-                        ),
-                    }
-
-                    if hromada_name in hromada_special_rules:
-                        special_hromada = hromada_special_rules[hromada_name]
-                        self.hash_states_by_name[hashed_hromada_name] = (
-                            special_hromada[1],
-                            special_hromada[0],
-                            hromada_name,
-                            "hromada",
-                        )
-                    else:
-                        self.hash_states_by_name[hashed_hromada_name] = (
-                            state_name,
-                            raion_name,
-                            maybe_renamed_hromada_name or hromada_name,
-                            "hromada",
-                        )
-
-                        # Special fix for renamed hromadas
-                        if maybe_renamed_hromada_name:
-                            hashed_renamed_hromada_name = self.location_to_hashtag(maybe_renamed_hromada_name)
-                            self.hash_states_by_name[hashed_renamed_hromada_name] = (
-                                state_name,
-                                maybe_renamed_raion_name or raion_name,
-                                maybe_renamed_hromada_name,
-                                "hromada",
-                            )
+        # Prebuilt from states.json and cached, see location_index module
+        self.hash_states_by_name = load_location_index()
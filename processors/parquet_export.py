@@ -0,0 +1,93 @@
+"""
+Export of datasets to Parquet, partitioned by month of `started_at`.
+
+Every CSV file is exported to `datasets/parquet/<file name>/month=YYYY-MM/part-0.parquet`,
+place names are dictionary-encoded and timestamps are stored as UTC timestamps.
+
+Datasets are only appended, so `_export.json` keeps the size of the CSV file at the last export,
+and only months of rows appended since then are rewritten. Any other change of the CSV file rewrites all months.
+"""
+
+import io
+import json
+import logging
+import os
+import pathlib
+import shutil
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .datasets import LANGUAGES, dataset_path, datasets_dir_path, read_dataset
+from .files import write_atomically
+
+logger = logging.getLogger(__name__)
+
+parquet_dir_path = datasets_dir_path / "parquet"
+
+
+def appended_months(csv_path: pathlib.Path, offset: int) -> set[str]:
+    """
+    :param offset: Size of the file before rows were appended, only rows after it are read
+    :return: Months of `started_at` of appended rows
+    """
+    with open(csv_path, "rb") as f:
+        header = f.readline()
+        f.seek(offset)
+        appended = f.read()
+
+    df = pd.read_csv(io.BytesIO(header + appended), usecols=["started_at"], dtype=str)
+    return set(pd.to_datetime(df["started_at"], utc=True, format="ISO8601").dt.strftime("%Y-%m"))
+
+
+def export_to_parquet(dataset_name: str, lang: str = "uk") -> pathlib.Path:
+    """
+    Updates Parquet copy of a dataset, returns its directory.
+    """
+    csv_path = dataset_path(dataset_name, lang)
+    csv_size = os.path.getsize(csv_path)
+
+    output_path = parquet_dir_path / csv_path.stem
+    state_path = output_path / "_export.json"
+
+    exported_size = None
+    if os.path.exists(state_path):
+        with open(state_path, "r", encoding="utf-8") as f:
+            exported_size = json.load(f)["csv_size"]
+
+    if exported_size == csv_size:
+        logger.info("Parquet copy of %s dataset is up to date", dataset_name)
+        return output_path
+
+    df = read_dataset(dataset_name, lang)
+    df["month"] = df["started_at"].dt.strftime("%Y-%m")
+
+    if exported_size is not None and exported_size < csv_size:
+        months = appended_months(csv_path, exported_size)
+        df = df[df["month"].isin(months)]
+    else:
+        # Months without rows anymore are removed as well
+        shutil.rmtree(output_path, ignore_errors=True)
+
+    # Categorical columns become dictionary-encoded arrays
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    # Only partitions of exported months are replaced
+    pq.write_to_dataset(
+        table,
+        root_path=output_path,
+        partition_cols=["month"],
+        basename_template="part-{i}.parquet",
+        existing_data_behavior="delete_matching",
+    )
+    write_atomically(state_path, json.dumps({"csv_size": csv_size}))
+
+    logger.info("Exported %s rows of %s dataset to %s", len(df), dataset_name, output_path)
+
+    return output_path
+
+
+def export_all(dataset_name: str):
+    for lang in LANGUAGES:
+        export_to_parquet(dataset_name, lang)
@@ -0,0 +1,24 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+async def run_processors(processors: list) -> list[str]:
+    """
+    Runs processors of independent channels concurrently on the current event loop.
+
+    Failure of one processor doesn't interrupt others, its state and datasets are just not updated.
+
+    :param processors: Objects with `channel_name` attribute and async `process()` method
+    :return: List of channel names which were failed
+    """
+    results = await asyncio.gather(*(processor.process() for processor in processors), return_exceptions=True)
+
+    failed_channels = []
+    for processor, result in zip(processors, results):
+        if isinstance(result, BaseException):
+            logger.error("Processing of %s channel failed", processor.channel_name, exc_info=result)
+            failed_channels.append(processor.channel_name)
+
+    return failed_channels
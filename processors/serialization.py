@@ -0,0 +1,82 @@
+"""
+Writing of alerts into datasets of all languages at once.
+"""
+
+import csv
+import os
+import pathlib
+from typing import IO, Iterable, Optional
+
+from .tail_index import TailIndex
+
+LANGUAGES = ["uk", "en"]
+
+
+def open_csv_writers(file_paths: dict[str, pathlib.Path], fieldnames: list[str]) -> tuple[dict[str, IO], dict]:
+    """
+    Opens dataset files for appending, header is written to new files.
+
+    :param file_paths: File path by language code
+    :return: tuple (files by language, csv writers by language)
+    """
+    files = {}
+    writers = {}
+
+    for lang, file_path in file_paths.items():
+        mode = "a" if os.path.exists(file_path) else "w"
+
+        files[lang] = open(file_path, mode, newline="")
+        writers[lang] = csv.writer(files[lang])
+
+        if mode == "w":
+            writers[lang].writerow(fieldnames)
+
+    return files, writers
+
+
+def open_tail_indexes(file_paths: dict[str, pathlib.Path]) -> dict[str, TailIndex]:
+    return {lang: TailIndex.load(file_path) for lang, file_path in file_paths.items()}
+
+
+def save_tail_indexes(tail_indexes: dict[str, TailIndex], files: dict[str, IO]):
+    for lang, tail_index in tail_indexes.items():
+        files[lang].flush()
+        tail_index.save(os.fstat(files[lang].fileno()).st_size)
+
+
+def write_records(
+    records: Iterable,
+    writers: dict,
+    tail_indexes: Optional[dict[str, TailIndex]] = None,
+    serialized_rows: Optional[list] = None,
+) -> int:
+    """
+    Serializes every record once and writes its rows to writers of all languages.
+
+    :param records: Alerts with `rows()` method
+    :param writers: csv writers by language
+    :param tail_indexes: Tail indexes by language, rows already present in the tail of a file are skipped
+    :param serialized_rows: Rows of the first language of every record are appended to it, written or skipped
+    :return: Number of written records
+    """
+    count = 0
+    first_lang = next(iter(writers), None)
+
+    for record in records:
+        rows = record.rows()
+
+        if serialized_rows is not None:
+            serialized_rows.append(rows[first_lang])
+
+        if tail_indexes is None:
+            for lang, writer in writers.items():
+                writer.writerow(rows[lang])
+            count += 1
+            continue
+
+        is_written = False
+        for lang, writer in writers.items():
+            is_written |= tail_indexes[lang].append_row(writer, rows[lang])
+        count += is_written
+
+    return count
@@ -0,0 +1,290 @@
+"""
+Rebuild of datasets from long history with state machines of locations run in parallel.
+
+Alert lifecycle of a location (start, finish, synthesized finish of a stale alert) doesn't depend on other locations,
+so parsed location events are partitioned into shards by crc32 of the location name,
+and every shard runs `update_location` of the processor in a worker process.
+
+Messages are read in batches of `batch_size`, only one batch of events is kept in memory.
+Active alerts of every shard are passed back and forth with every batch, and checkpoint is saved after every batch.
+
+Completed alerts of all shards are k-way merged back in the order the sequential run completes them and passed to
+the same `StreamingAlertWriter` with the same watermark (`active_watermark` of active alerts of all shards)
+after every message, so datasets are byte-identical to the ones written by `process()` of the processor.
+"""
+
+import asyncio
+import concurrent.futures
+import contextlib
+import datetime
+import heapq
+import logging
+import os
+import time
+import zlib
+from typing import AsyncIterator, Callable, NamedTuple, Optional
+
+from .checkpoint import truncate_datasets
+from .metrics import ProcessingMetrics
+from .streaming_writer import StreamingAlertWriter, active_watermark
+
+logger = logging.getLogger(__name__)
+
+
+def shard_of(location: str, shards: int) -> int:
+    # Stable between processes, unlike built-in hash() of strings
+    return zlib.crc32(location.encode("utf-8")) % shards
+
+
+class ShardState:
+    """
+    State of locations of one shard.
+
+    It has the attributes used by `update_location` of processors, so workers run the very same state machine.
+    """
+
+    def __init__(self, channel_name: str, active_alerts_by_location: dict, hash_states_by_name: dict):
+        self.active_alerts_by_location = active_alerts_by_location
+        self.completed_alerts = []
+        self.changed_locations = set()
+        self.metrics = ProcessingMetrics(channel_name)
+        # Used by the official processor only
+        self.hash_states_by_name = hash_states_by_name
+
+
+class ShardResult(NamedTuple):
+    # tuples (event sequence, alert) in the order of completion
+    completed_alerts: list[tuple]
+    # tuples (event sequence, location, started_at of its active alert or None), only changes are listed
+    active_starts: list[tuple]
+    active_alerts_by_location: dict
+    changed_locations: set
+    counters: dict[str, int]
+
+
+# Location index of a worker process, it's sent once instead of with every batch, see `init_shard_worker`
+worker_hash_states_by_name: dict = {}
+
+
+def init_shard_worker(hash_states_by_name: dict):
+    global worker_hash_states_by_name
+    worker_hash_states_by_name = hash_states_by_name
+
+
+def run_shard(
+    update_location: Callable,
+    channel_name: str,
+    active_alerts_by_location: dict,
+    events: list[tuple],
+    hash_states_by_name: Optional[dict] = None,
+) -> ShardResult:
+    """
+    :param update_location: `update_location` function of processor class, called with `ShardState` as self
+    :param events: tuples (event sequence, location, date, is_activated, is_deactivated) in the order of messages
+    :param hash_states_by_name: Location index, the one of the worker process by default
+    """
+    if hash_states_by_name is None:
+        hash_states_by_name = worker_hash_states_by_name
+
+    state = ShardState(channel_name, active_alerts_by_location, hash_states_by_name)
+    completed_alerts = []
+    active_starts = []
+
+    def active_start(location: str) -> Optional[datetime.datetime]:
+        alert = state.active_alerts_by_location.get(location)
+        return alert.started_at if alert else None
+
+    for sequence, location, date, is_activated, is_deactivated in events:
+        started_at = active_start(location)
+        update_location(state, location, date, is_activated, is_deactivated)
+
+        for alert in state.completed_alerts:
+            completed_alerts.append((sequence, alert))
+        state.completed_alerts = []
+
+        if (new_started_at := active_start(location)) != started_at:
+            active_starts.append((sequence, location, new_started_at))
+
+    return ShardResult(
+        completed_alerts,
+        active_starts,
+        state.active_alerts_by_location,
+        state.changed_locations,
+        dict(state.metrics.counters),
+    )
+
+
+class ShardedRebuild:
+    """
+    Runs processor with state machines of locations in `shards` worker processes,
+    has the same interface as processors for `runner.run_processors`.
+
+    Listeners of messages are not called.
+    """
+
+    def __init__(self, processor, shards: Optional[int] = None, batch_size: Optional[int] = None):
+        """
+        :param shards: Number of worker processes, number of CPUs by default
+        :param batch_size: Number of messages sent to shards at once, checkpoint is saved after every batch,
+                           `checkpoint_every_messages` of the processor by default
+        """
+        self.processor = processor
+        self.shards = shards or os.cpu_count() or 1
+        self.batch_size = batch_size or processor.checkpoint_every_messages
+
+    @property
+    def channel_name(self) -> str:
+        return self.processor.channel_name
+
+    async def read_batches(self) -> AsyncIterator[tuple[list[tuple], list[list[tuple]]]]:
+        """
+        Reads and parses messages since the last processed one.
+
+        :return: tuples (tuples (message id, date, sequence after the last event of message) for every message,
+                         events of every shard) for every batch of messages
+        """
+        processor = self.processor
+        messages = []
+        shard_events = [[] for _ in range(self.shards)]
+        sequence = 0
+
+        iterator = processor.source.iter_messages(processor.channel_name, min_id=processor.last_processed_id)
+        async for message in processor.metrics.timed_messages(iterator):
+            if not message.message:
+                processor.metrics.count_parse_failure("empty")
+                continue
+
+            for location, is_activated, is_deactivated in processor.location_events(message):
+                event = (sequence, location, message.date, is_activated, is_deactivated)
+                shard_events[shard_of(location, self.shards)].append(event)
+                sequence += 1
+
+            messages.append((message.id, message.date, sequence))
+
+            if len(messages) >= self.batch_size:
+                yield messages, shard_events
+
+                messages = []
+                shard_events = [[] for _ in range(self.shards)]
+                sequence = 0
+
+        if messages:
+            yield messages, shard_events
+
+    async def run_shards(
+        self, executor: Optional[concurrent.futures.Executor], shard_events: list[list[tuple]]
+    ) -> list[ShardResult]:
+        """
+        :param executor: Pool of `shards` worker processes, shard is run in the current process if None
+        """
+        processor = self.processor
+        update_location = type(processor).update_location
+
+        shard_active_alerts = [{} for _ in range(self.shards)]
+        for location, alert in processor.active_alerts_by_location.items():
+            shard_active_alerts[shard_of(location, self.shards)][location] = alert
+
+        if executor is None:
+            hash_states_by_name = getattr(processor, "hash_states_by_name", {})
+            return [
+                run_shard(update_location, processor.channel_name, active_alerts, events, hash_states_by_name)
+                for active_alerts, events in zip(shard_active_alerts, shard_events)
+            ]
+
+        loop = asyncio.get_running_loop()
+        return await asyncio.gather(
+            *(
+                loop.run_in_executor(
+                    executor, run_shard, update_location, processor.channel_name, active_alerts, events
+                )
+                for active_alerts, events in zip(shard_active_alerts, shard_events)
+            )
+        )
+
+    def write_batch(self, writer: StreamingAlertWriter, messages: list[tuple], results: list[ShardResult]):
+        """
+        Passes alerts completed by shards to the writer as the sequential run does, and updates the processor.
+        """
+        processor = self.processor
+
+        # Sequences of events are unique, so tuples are never compared beyond them
+        completed_alerts = heapq.merge(*(result.completed_alerts for result in results))
+        active_start_changes = heapq.merge(*(result.active_starts for result in results))
+        next_alert = next(completed_alerts, None)
+        next_change = next(active_start_changes, None)
+
+        # The same watermark as the sequential run has after every message
+        active_starts = {location: alert.started_at for location, alert in processor.active_alerts_by_location.items()}
+
+        for message_id, date, end_sequence in messages:
+            # Alerts are added in the order they're completed by the sequential run
+            while next_alert is not None and next_alert[0] < end_sequence:
+                writer.add(next_alert[1])
+                next_alert = next(completed_alerts, None)
+
+            while next_change is not None and next_change[0] < end_sequence:
+                _, location, started_at = next_change
+                if started_at is None:
+                    del active_starts[location]
+                else:
+                    active_starts[location] = started_at
+                next_change = next(active_start_changes, None)
+
+            processor.last_processed_id = message_id
+            writer.advance(lambda: active_watermark(active_starts.values(), date))
+
+        processor.active_alerts_by_location = {}
+        for result in results:
+            processor.active_alerts_by_location.update(result.active_alerts_by_location)
+            processor.changed_locations |= result.changed_locations
+            for counter, value in result.counters.items():
+                processor.metrics.count(counter, value)
+
+    async def process(self):
+        processor = self.processor
+        metrics = processor.metrics
+        started_at = time.perf_counter()
+
+        logger.info(
+            "Rebuilding %s channel from %s in %s shards",
+            processor.channel_name,
+            processor.last_processed_id,
+            self.shards,
+        )
+
+        writer = StreamingAlertWriter(
+            processor.dataset_file_paths, processor.fieldnames, on_write=processor.on_alerts_written
+        )
+
+        # Rows written after the last checkpoint will be written again
+        truncate_datasets(processor.dataset_file_paths, processor.dataset_sizes)
+        # Initial checkpoint, so rows written by this run could be rolled back as well
+        processor.dump_checkpoint()
+
+        executor = None
+        if self.shards > 1:
+            executor = concurrent.futures.ProcessPoolExecutor(
+                self.shards,
+                initializer=init_shard_worker,
+                initargs=(getattr(processor, "hash_states_by_name", {}),),
+            )
+
+        with writer, executor or contextlib.nullcontext():
+            writer.restore(processor.pending_alerts)
+            processor.pending_alerts = []
+
+            async for messages, shard_events in self.read_batches():
+                with metrics.timer("state_transition"):
+                    results = await self.run_shards(executor, shard_events)
+
+                with metrics.timer("write"):
+                    self.write_batch(writer, messages, results)
+
+                # Progress of a long rebuild isn't lost, e.g. on network errors during backfill
+                with metrics.timer("checkpoint"):
+                    processor.dump_checkpoint(writer)
+
+        logger.info("Finished rebuilding %s channel at %s", processor.channel_name, processor.last_processed_id)
+        processor.write()
+
+        metrics.add_time("total", time.perf_counter() - started_at)
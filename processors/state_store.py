@@ -0,0 +1,170 @@
+"""
+Processors state in embedded SQLite database.
+
+Every channel has its cursor, active alerts by location, not yet written alerts and sizes of dataset files.
+Checkpoints update only changed locations in a single transaction, so their cost depends on the number
+of changes since the previous checkpoint, not on the size of the whole state.
+
+Not yet written alerts are keyed by their dataset row, so checkpoints insert alerts added to the reorder buffer
+and delete written ones instead of replacing the whole buffer.
+
+Alerts written to datasets are logged (as their dataset rows) into `emitted_alerts` table for a limited period.
+"""
+
+import datetime
+import json
+import pathlib
+import sqlite3
+from typing import Iterable, Optional, Union
+
+from .checkpoint import Checkpoint
+
+state_db_path = pathlib.Path(__file__).parent.resolve() / "state" / "state.sqlite3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cursors (
+    channel TEXT PRIMARY KEY,
+    last_processed_id INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS active_alerts (
+    channel TEXT NOT NULL,
+    location TEXT NOT NULL,
+    state TEXT NOT NULL,
+    PRIMARY KEY (channel, location)
+);
+
+CREATE TABLE IF NOT EXISTS pending_alerts (
+    channel TEXT NOT NULL,
+    key TEXT NOT NULL,
+    state TEXT NOT NULL,
+    PRIMARY KEY (channel, key)
+);
+
+CREATE TABLE IF NOT EXISTS dataset_sizes (
+    channel TEXT NOT NULL,
+    lang TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    PRIMARY KEY (channel, lang)
+);
+
+CREATE TABLE IF NOT EXISTS emitted_alerts (
+    channel TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    row TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS emitted_alerts_started_at ON emitted_alerts (channel, started_at);
+"""
+
+
+class StateStore:
+    # Emitted alerts are kept only for debugging of recent runs
+    emitted_alerts_retention = datetime.timedelta(days=30)
+
+    def __init__(self, path: Union[str, pathlib.Path] = state_db_path):
+        self.path = pathlib.Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.connection = sqlite3.connect(self.path)
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def load_checkpoint(self, channel: str) -> Optional[Checkpoint]:
+        row = self.connection.execute("SELECT last_processed_id FROM cursors WHERE channel = ?", (channel,)).fetchone()
+        if row is None:
+            return None
+
+        active_alerts = {
+            location: json.loads(state)
+            for location, state in self.connection.execute(
+                "SELECT location, state FROM active_alerts WHERE channel = ?", (channel,)
+            )
+        }
+        # Rows are never updated, so rowid keeps the order of completion
+        pending_alerts = [
+            json.loads(state)
+            for (state,) in self.connection.execute(
+                "SELECT state FROM pending_alerts WHERE channel = ? ORDER BY rowid", (channel,)
+            )
+        ]
+        dataset_sizes = dict(
+            self.connection.execute("SELECT lang, size FROM dataset_sizes WHERE channel = ?", (channel,)).fetchall()
+        )
+
+        return Checkpoint(
+            last_processed_id=row[0],
+            active_alerts=active_alerts,
+            pending_alerts=pending_alerts,
+            dataset_sizes=dataset_sizes,
+        )
+
+    def save_checkpoint(
+        self,
+        channel: str,
+        last_processed_id: int,
+        changed_active_alerts: dict[str, Optional[dict]],
+        dataset_sizes: dict[str, int],
+        added_pending_alerts: Optional[dict[str, dict]] = None,
+        removed_pending_keys: Iterable[str] = (),
+        emitted_rows: Iterable[tuple[str, str]] = (),
+    ):
+        """
+        Saves the checkpoint in one transaction.
+
+        :param changed_active_alerts: Only locations changed since the previous checkpoint,
+                                      None value means that there is no active alert anymore
+        :param added_pending_alerts: Alert state by key (see `checkpoint.row_key`) of alerts not written yet,
+                                     only the ones added since the previous checkpoint
+        :param removed_pending_keys: Keys of pending alerts written since the previous checkpoint
+        :param emitted_rows: tuples (started_at, row key) of alerts written since the previous checkpoint
+        """
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO cursors (channel, last_processed_id) VALUES (?, ?)",
+                (channel, last_processed_id),
+            )
+
+            self.connection.executemany(
+                "DELETE FROM active_alerts WHERE channel = ? AND location = ?",
+                [(channel, location) for location, state in changed_active_alerts.items() if state is None],
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO active_alerts (channel, location, state) VALUES (?, ?, ?)",
+                [
+                    (channel, location, json.dumps(state, ensure_ascii=False))
+                    for location, state in changed_active_alerts.items()
+                    if state is not None
+                ],
+            )
+
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO pending_alerts (channel, key, state) VALUES (?, ?, ?)",
+                [
+                    (channel, key, json.dumps(state, ensure_ascii=False))
+                    for key, state in (added_pending_alerts or {}).items()
+                ],
+            )
+            self.connection.executemany(
+                "DELETE FROM pending_alerts WHERE channel = ? AND key = ?",
+                [(channel, key) for key in removed_pending_keys],
+            )
+
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO dataset_sizes (channel, lang, size) VALUES (?, ?, ?)",
+                [(channel, lang, size) for lang, size in dataset_sizes.items()],
+            )
+
+            self.connection.executemany(
+                "INSERT INTO emitted_alerts (channel, started_at, row) VALUES (?, ?, ?)",
+                [(channel, started_at, row) for started_at, row in emitted_rows],
+            )
+
+    def prune_emitted_alerts(self, channel: str, now: datetime.datetime):
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM emitted_alerts WHERE channel = ? AND started_at < ?",
+                (channel, (now - self.emitted_alerts_retention).isoformat()),
+            )
@@ -0,0 +1,171 @@
+"""
+Streaming writer of completed alerts into dataset files.
+
+Alerts are completed out of order (a long alert finishes after a short one which started later),
+so they're kept in a small reorder buffer and written only when no earlier alert could be completed anymore.
+
+Alerts active for longer than `MAX_ACTIVE_AGE` don't hold the buffer back, otherwise an alert without a message
+about its end (e.g. the permanent siren in Luhansk oblast since April 2022) would keep everything in the buffer.
+Such an alert is written out of order when it's completed.
+"""
+
+import datetime
+import heapq
+import itertools
+import logging
+import os
+import pathlib
+from typing import Callable, Iterable, Optional
+
+from .serialization import open_csv_writers, open_tail_indexes, save_tail_indexes, write_records
+
+logger = logging.getLogger(__name__)
+
+MAX_ACTIVE_AGE = datetime.timedelta(days=1)
+
+
+def active_watermark(
+    started_ats: Iterable[datetime.datetime],
+    current_date: datetime.datetime,
+    max_active_age: datetime.timedelta = MAX_ACTIVE_AGE,
+) -> datetime.datetime:
+    """
+    Watermark for `StreamingAlertWriter.advance`.
+
+    :param started_ats: `started_at` of active alerts
+    :param current_date: Date of the current message, all the next alerts start after it
+    :return: The earliest start of active alerts, which are not older than `max_active_age`
+    """
+    horizon = current_date - max_active_age
+    return min((started_at for started_at in started_ats if started_at >= horizon), default=current_date)
+
+
+class StreamingAlertWriter:
+    def __init__(
+        self,
+        file_paths: dict[str, pathlib.Path],
+        fieldnames: list[str],
+        batch_size: int = 500,
+        max_buffered: int = 20000,
+        on_write: Optional[Callable[[list, list], None]] = None,
+    ):
+        """
+        :param file_paths: Dataset file path by language code
+        :param fieldnames: CSV columns
+        :param batch_size: Number of alerts written to files at once
+        :param max_buffered: Reorder buffer limit, the oldest alerts are written when it's exceeded
+        :param on_write: Called with every batch of written alerts and their rows of the first language
+        """
+        self.file_paths = file_paths
+        self.fieldnames = fieldnames
+        self.batch_size = batch_size
+        self.max_buffered = max_buffered
+        self.on_write = on_write
+
+        # Heap of (started_at, completion sequence, alert), sequence keeps completion order for equal started_at
+        self.buffer: list = []
+        self.sequence = itertools.count()
+        self.ready: list = []
+        # Alerts added since the last `take_added_alerts`, so checkpoints store only changes of the buffer
+        self.added_alerts: list = []
+
+        self.files = {}
+        self.writers: dict = {}
+        self.tail_indexes: dict = {}
+
+        # Watermark is recalculated only when buffer grows, it costs a walk over active alerts
+        self.next_advance_size = batch_size
+
+        self.is_buffer_exceeded = False
+        self.rows_written = 0
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # Buffered alerts are written only on success, otherwise they would be completed again by the next run
+        self.close(flush_buffer=exc_type is None)
+
+    def open(self):
+        self.tail_indexes = open_tail_indexes(self.file_paths)
+        self.files, self.writers = open_csv_writers(self.file_paths, self.fieldnames)
+
+    def add(self, alert):
+        heapq.heappush(self.buffer, (alert.started_at, next(self.sequence), alert))
+        self.added_alerts.append(alert)
+
+    def restore(self, alerts: list):
+        """
+        Adds alerts restored from checkpoint, they're stored already, so they're not listed by `take_added_alerts`.
+        """
+        for alert in alerts:
+            heapq.heappush(self.buffer, (alert.started_at, next(self.sequence), alert))
+
+    def take_added_alerts(self) -> list:
+        """
+        :return: Alerts added since the previous call, including the ones written since then
+        """
+        added_alerts = self.added_alerts
+        self.added_alerts = []
+        return added_alerts
+
+    def advance(self, get_watermark: Callable, force: bool = False):
+        """
+        Moves buffered alerts, which can't be preceded by any future alert, to the output.
+
+        :param get_watermark: Returns the earliest `started_at` of alerts which could be completed later,
+                              usually `active_watermark` of active alerts
+        :param force: Check the watermark even if the buffer hasn't grown by a batch, e.g. before a checkpoint
+        """
+        if not force and len(self.buffer) < self.next_advance_size:
+            return
+
+        watermark = get_watermark()
+        while self.buffer and self.buffer[0][0] < watermark:
+            self.ready.append(heapq.heappop(self.buffer)[2])
+
+        if len(self.buffer) > self.max_buffered:
+            # Too many alerts started after the watermark, so order is not guaranteed anymore
+            if not self.is_buffer_exceeded:
+                logger.warning("Reorder buffer exceeded %s alerts, writing the oldest ones", self.max_buffered)
+                self.is_buffer_exceeded = True
+            while len(self.buffer) > self.max_buffered - self.batch_size:
+                self.ready.append(heapq.heappop(self.buffer)[2])
+
+        self.next_advance_size = len(self.buffer) + self.batch_size
+
+        if len(self.ready) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.ready:
+            return
+
+        # Every record is serialized once for all languages
+        # Alerts already written by a previous run are skipped
+        rows = []
+        self.rows_written += write_records(self.ready, self.writers, self.tail_indexes, serialized_rows=rows)
+        save_tail_indexes(self.tail_indexes, self.files)
+
+        if self.on_write:
+            self.on_write(self.ready, rows)
+
+        self.ready = []
+
+    def file_sizes(self) -> dict[str, int]:
+        return {lang: os.fstat(f.fileno()).st_size for lang, f in self.files.items()}
+
+    def close(self, flush_buffer: bool = True):
+        if flush_buffer:
+            while self.buffer:
+                self.ready.append(heapq.heappop(self.buffer)[2])
+
+        self.flush()
+
+        for f in self.files.values():
+            f.close()
+
+        self.files = {}
+        self.writers = {}
+        self.tail_indexes = {}
@@ -0,0 +1,135 @@
+"""
+Sidecar index of the tail of a dataset file, so appends are idempotent.
+
+`<dataset>.csv.idx` keeps the size of the CSV file, key of the last row and keys
+of the last `TAIL_SIZE` rows. Rows already present in the tail are skipped on append, so a re-run after
+a partial failure doesn't duplicate them, and nothing but the tail is ever read.
+
+If the CSV file was changed without the index (e.g. truncated to the last checkpoint),
+the index is rebuilt from the end of the file.
+"""
+
+import collections
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import pathlib
+from typing import Iterable, Optional
+
+from .files import write_atomically
+
+logger = logging.getLogger(__name__)
+
+# Rows written after the last checkpoint are much fewer
+TAIL_SIZE = 5000
+
+READ_CHUNK_SIZE = 1 << 20
+
+
+def row_key(row: Iterable) -> str:
+    # csv module writes None as an empty string
+    content = "\x1f".join("" if value is None else str(value) for value in row)
+    return hashlib.blake2b(content.encode("utf-8"), digest_size=8).hexdigest()
+
+
+class TailIndex:
+    def __init__(self, csv_path: pathlib.Path, tail_size: int = TAIL_SIZE):
+        self.csv_path = pathlib.Path(csv_path)
+        self.path = self.csv_path.with_suffix(self.csv_path.suffix + ".idx")
+        self.tail_size = tail_size
+
+        self.size = 0
+        self.last_key: Optional[str] = None
+        self.tail: collections.deque = collections.deque()
+        self.tail_keys: collections.Counter = collections.Counter()
+
+    @classmethod
+    def load(cls, csv_path: pathlib.Path, tail_size: int = TAIL_SIZE) -> "TailIndex":
+        index = cls(csv_path, tail_size)
+        csv_size = os.path.getsize(csv_path) if os.path.exists(csv_path) else 0
+
+        if os.path.exists(index.path):
+            try:
+                with open(index.path, "r", encoding="utf-8") as f:
+                    state = json.load(f)
+
+                if state["size"] == csv_size:
+                    index.size = state["size"]
+                    index.last_key = state["last_key"]
+                    for key in state["tail"][-tail_size:]:
+                        index.add(key)
+
+                    return index
+            except (ValueError, KeyError):
+                logger.warning("Tail index %s is broken, rebuilding it", index.path)
+
+        if csv_size:
+            index.rebuild(csv_size)
+
+        return index
+
+    def rebuild(self, csv_size: int):
+        """
+        Reads only the last rows of the file.
+        """
+        logger.info("Rebuilding tail index of %s", self.csv_path)
+
+        with open(self.csv_path, "rb") as f:
+            # Reading backwards till there are enough rows (plus header or partial row)
+            offset = csv_size
+            data = b""
+            while offset > 0 and data.count(b"\n") <= self.tail_size + 1:
+                offset = max(0, offset - READ_CHUNK_SIZE)
+                f.seek(offset)
+                data = f.read(csv_size - offset)
+
+        lines = data.decode("utf-8", errors="replace").splitlines(keepends=True)
+        # The first line is either header or a part of row
+        tail_rows = list(csv.reader(io.StringIO("".join(lines[1:]))))
+
+        self.size = csv_size
+        self.tail.clear()
+        self.tail_keys.clear()
+        for row in tail_rows[-self.tail_size :]:
+            self.add(row_key(row))
+        self.last_key = self.tail[-1] if self.tail else None
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.tail_keys
+
+    def add(self, key: str):
+        self.tail.append(key)
+        self.tail_keys[key] += 1
+        self.last_key = key
+
+        if len(self.tail) > self.tail_size:
+            removed_key = self.tail.popleft()
+            self.tail_keys[removed_key] -= 1
+            if not self.tail_keys[removed_key]:
+                del self.tail_keys[removed_key]
+
+    def append_row(self, writer, row: list) -> bool:
+        """
+        Writes row unless it's already in the tail.
+
+        :return: True if row was written
+        """
+        key = row_key(row)
+        if key in self.tail_keys:
+            return False
+
+        writer.writerow(row)
+        self.add(key)
+
+        return True
+
+    def save(self, csv_size: int):
+        """
+        :param csv_size: Size of CSV file with all appended rows flushed
+        """
+        self.size = csv_size
+
+        write_atomically(self.path, json.dumps({"size": self.size, "last_key": self.last_key, "tail": list(self.tail)}))
@@ -1,8 +1,8 @@
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
 from datetime import datetime
 from typing import Literal, Optional
 
-from translitua import translit
+from .transliteration import transliterate
 
 PLACE_LEVEL = Literal["oblast", "raion", "hromada"]
 
@@ -19,32 +19,21 @@ class OfficialAirRaidAlertChannelAlert:
     finished_at: Optional[datetime] = None
     source: Literal["official", "volunteer"] = "official"
 
-    def dict(self, lang: str = "uk"):
-        if lang == "uk":
-            return {k: str(v) for k, v in asdict(self).items()}
-
-        transliterated = {}
+    def rows(self) -> dict[str, list[str]]:
+        """
+        Dataset rows by language, place names are transliterated for english one.
+        """
+        tail = [self.level, str(self.started_at), str(self.finished_at), self.source]
 
-        keys_to_transliterate = ["oblast", "raion", "hromada"]
-        special_rules = {
-            # Official:
-            "м. Київ": "Kyiv City",
-            # Volunteer naming:
-            "Київ": "Kyiv City",
+        return {
+            "uk": [self.oblast, self.raion, self.hromada, *tail],
+            "en": [transliterate(self.oblast), transliterate(self.raion), transliterate(self.hromada), *tail],
         }
 
-        for k, v in asdict(self).items():
-            if k in keys_to_transliterate:
-                if v in special_rules:
-                    transliterated[k] = special_rules[v]
-                    continue
-
-                transliterated[k] = translit(v)
-                continue
-
-            transliterated[k] = str(v)
-
-        return transliterated
+    def dict(self, lang: str = "uk"):
+        return dict(
+            zip(["oblast", "raion", "hromada", "level", "started_at", "finished_at", "source"], self.rows()[lang])
+        )
 
 
 @dataclass
@@ -54,19 +43,16 @@ class ETryvogaChannelAlert:
     finished_at: Optional[datetime] = None
     naive: bool = False
 
-    def dict(self, lang: str = "uk") -> dict[str, str]:
-        if lang == "uk":
-            return {k: str(v) for k, v in asdict(self).items()}
-
-        result = {}
+    def rows(self) -> dict[str, list[str]]:
+        """
+        Dataset rows by language, region name is transliterated for english one.
+        """
+        tail = [str(self.started_at), str(self.finished_at), str(self.naive)]
 
-        for k, v in asdict(self).items():
-            if k == "region":
-                if v == "Київ":
-                    result[k] = "Kyiv City"
-                else:
-                    result[k] = translit(v)
-            else:
-                result[k] = str(v)
+        return {
+            "uk": [self.region, *tail],
+            "en": [transliterate(self.region), *tail],
+        }
 
-        return result
+    def dict(self, lang: str = "uk") -> dict[str, str]:
+        return dict(zip(["region", "started_at", "finished_at", "naive"], self.rows()[lang]))
@@ -0,0 +1,46 @@
+"""
+Transliteration of place names for english datasets.
+
+Place names are known in advance (they come from `states.json`), so they're transliterated once
+per process instead of once per row.
+"""
+
+from functools import lru_cache
+
+from translitua import translit
+
+from .location_index import load_location_index
+
+SPECIAL_RULES = {
+    # Official:
+    "м. Київ": "Kyiv City",
+    # Volunteer naming:
+    "Київ": "Kyiv City",
+}
+
+
+@lru_cache(maxsize=1)
+def transliteration_table() -> dict[str, str]:
+    """
+    Transliterations of all oblasts, raions and hromadas of the location index.
+
+    Volunteer regions are oblast names as well, except Kyiv which is covered by special rules.
+    """
+    names = {""}
+    for oblast_name, raion_name, hromada_name, _ in load_location_index().values():
+        names.update((oblast_name, raion_name, hromada_name))
+
+    table = {name: translit(name) for name in names}
+    table.update(SPECIAL_RULES)
+
+    return table
+
+
+def transliterate(name: str) -> str:
+    table = transliteration_table()
+
+    if name not in table:
+        # Unknown name (e.g. from old state file), remember it as well
+        table[name] = translit(name)
+
+    return table[name]
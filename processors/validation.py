@@ -0,0 +1,258 @@
+"""
+Data quality checks of published datasets.
+
+Every dataset is read once row by row, only the last alert of every location is kept in memory.
+Found issues are counted by check, the first examples of each check are kept with line numbers.
+
+Errors mean broken data:
+ - `malformed_row`: wrong number of columns or unparsable timestamps;
+ - `negative_duration`: `finished_at` is before `started_at`;
+ - `overlap`: alert started before the previous alert of the same location was finished;
+ - `unknown_location`: place is not in `states.json`.
+
+Warnings are usually caused by the source channels, but worth a look:
+ - `out_of_order`: row started before the previous row of the file, alerts active for longer than
+   `streaming_writer.MAX_ACTIVE_AGE` are written when they're finished, i.e. after later alerts;
+ - `zero_duration`: alert is finished at the same time it was started, e.g. both were posted in one message;
+ - `long_duration`: alert is longer than `MAX_DURATION`;
+ - `synthesized_finish`: official alert is exactly 1 hour long, i.e. its finish was not posted;
+ - `naive_run`: at least `MAX_NAIVE_RUN` volunteer alerts of a region in a row have guessed `finished_at`;
+ - `gap`: there are no alerts at all for more than `MAX_GAP`.
+
+Run `python -m processors.validation` to check all datasets, exit code is 1 if there are errors.
+"""
+
+import csv
+import datetime
+import json
+import logging
+import os
+import pathlib
+import sys
+from typing import Optional
+
+from .datasets import DATASET_NAMES, LOCATION_COLUMNS, VOLUNTEER_REGION_ALIASES, dataset_path
+from .files import write_atomically
+from .location_index import load_location_index
+from .metrics import metrics_dir_path
+
+logger = logging.getLogger(__name__)
+
+ERROR_CHECKS = ["malformed_row", "negative_duration", "overlap", "unknown_location"]
+WARNING_CHECKS = ["out_of_order", "zero_duration", "long_duration", "synthesized_finish", "naive_run", "gap"]
+
+MAX_DURATION = datetime.timedelta(days=1)
+MAX_GAP = datetime.timedelta(days=2)
+MAX_NAIVE_RUN = 5
+
+# Official channel doesn't post finishes sometimes, see `update_location` of the official processor
+SYNTHESIZED_DURATION = datetime.timedelta(hours=1)
+
+MAX_EXAMPLES = 20
+
+
+class ValidationReport:
+    def __init__(self, dataset_name: str, lang: str, max_examples: int = MAX_EXAMPLES):
+        self.dataset_name = dataset_name
+        self.lang = lang
+        self.max_examples = max_examples
+
+        self.rows = 0
+        self.counts: dict[str, int] = {check: 0 for check in ERROR_CHECKS + WARNING_CHECKS}
+        self.examples: dict[str, list[str]] = {check: [] for check in ERROR_CHECKS + WARNING_CHECKS}
+
+    def add(self, check: str, line_number: int, description: str):
+        self.counts[check] += 1
+        if len(self.examples[check]) < self.max_examples:
+            self.examples[check].append(f"line {line_number}: {description}")
+
+    @property
+    def errors(self) -> int:
+        return sum(self.counts[check] for check in ERROR_CHECKS)
+
+    @property
+    def warnings(self) -> int:
+        return sum(self.counts[check] for check in WARNING_CHECKS)
+
+    def to_dict(self) -> dict:
+        return {
+            "dataset": self.dataset_name,
+            "lang": self.lang,
+            "rows": self.rows,
+            "errors": self.errors,
+            "warnings": self.warnings,
+            "counts": self.counts,
+            "examples": {check: examples for check, examples in self.examples.items() if examples},
+        }
+
+
+class LocationState:
+    """
+    The last alert of a location, that's all what's kept in memory per location.
+    """
+
+    __slots__ = ("finished_at", "line_number", "naive_run", "naive_run_line_number")
+
+    def __init__(self):
+        self.finished_at: Optional[datetime.datetime] = None
+        self.line_number = 0
+        self.naive_run = 0
+        self.naive_run_line_number = 0
+
+
+def known_locations(dataset_name: str) -> set:
+    if dataset_name == "official":
+        return set(load_location_index().values())
+
+    oblasts = {oblast for oblast, _, _, level in load_location_index().values() if level == "oblast"}
+    return {(oblast,) for oblast in oblasts} | {(alias,) for alias in VOLUNTEER_REGION_ALIASES}
+
+
+def parse_timestamp(value: str) -> datetime.datetime:
+    timestamp = datetime.datetime.fromisoformat(value)
+    if timestamp.tzinfo is None:
+        raise ValueError(f"Timestamp {value} has no timezone")
+
+    return timestamp
+
+
+def validate_dataset(dataset_name: str, lang: str = "uk", file_path: Optional[pathlib.Path] = None) -> ValidationReport:
+    """
+    :param file_path: CSV file to check instead of the published dataset
+    """
+    file_path = file_path or dataset_path(dataset_name, lang)
+    report = ValidationReport(dataset_name, lang)
+
+    # Place names are translated in other languages, so they're checked only in Ukrainian datasets
+    locations = known_locations(dataset_name) if lang == "uk" else None
+    location_states: dict[tuple, LocationState] = {}
+
+    def end_naive_run(location: tuple, state: LocationState):
+        if state.naive_run >= MAX_NAIVE_RUN:
+            report.add(
+                "naive_run",
+                state.naive_run_line_number,
+                f"{state.naive_run} alerts with guessed finish in a row for {', '.join(location)}",
+            )
+        state.naive_run = 0
+
+    with open(file_path, "r", newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+
+        location_indices = [header.index(column) for column in LOCATION_COLUMNS[dataset_name]]
+        started_at_index = header.index("started_at")
+        finished_at_index = header.index("finished_at")
+        naive_index = header.index("naive") if "naive" in header else None
+
+        previous_started_at = None
+
+        # Header is the first line
+        for line_number, row in enumerate(reader, start=2):
+            report.rows += 1
+
+            if len(row) != len(header):
+                report.add("malformed_row", line_number, f"{len(row)} columns instead of {len(header)}")
+                continue
+
+            try:
+                started_at = parse_timestamp(row[started_at_index])
+                finished_at = parse_timestamp(row[finished_at_index])
+            except ValueError as e:
+                report.add("malformed_row", line_number, str(e))
+                continue
+
+            location = tuple(row[index] for index in location_indices)
+            location_name = ", ".join(name for name in location if name)
+
+            if locations is not None and location not in locations:
+                report.add("unknown_location", line_number, location_name)
+
+            duration = finished_at - started_at
+            if duration < datetime.timedelta(0):
+                report.add("negative_duration", line_number, f"{duration} for {location_name}")
+            elif duration == datetime.timedelta(0):
+                report.add("zero_duration", line_number, location_name)
+            elif duration > MAX_DURATION:
+                report.add("long_duration", line_number, f"{duration} for {location_name}")
+            elif dataset_name == "official" and duration == SYNTHESIZED_DURATION:
+                report.add("synthesized_finish", line_number, location_name)
+
+            if previous_started_at is not None:
+                if started_at < previous_started_at:
+                    report.add("out_of_order", line_number, f"{started_at} is before {previous_started_at}")
+                elif started_at - previous_started_at > MAX_GAP:
+                    report.add("gap", line_number, f"no alerts from {previous_started_at} to {started_at}")
+            previous_started_at = max(started_at, previous_started_at or started_at)
+
+            state = location_states.get(location)
+            if state is None:
+                state = location_states[location] = LocationState()
+            elif state.finished_at is not None and started_at < state.finished_at:
+                report.add(
+                    "overlap",
+                    line_number,
+                    f"{location_name} started at {started_at} before the end of alert at line {state.line_number}",
+                )
+
+            if state.finished_at is None or finished_at > state.finished_at:
+                state.finished_at = finished_at
+                state.line_number = line_number
+
+            if naive_index is not None:
+                if row[naive_index] == "True":
+                    if not state.naive_run:
+                        state.naive_run_line_number = line_number
+                    state.naive_run += 1
+                else:
+                    end_naive_run(location, state)
+
+    for location, state in location_states.items():
+        end_naive_run(location, state)
+
+    return report
+
+
+def validate_all(langs: Optional[list[str]] = None) -> list[ValidationReport]:
+    reports = []
+    for dataset_name in DATASET_NAMES:
+        for lang in langs or ["uk", "en"]:
+            if os.path.exists(dataset_path(dataset_name, lang)):
+                reports.append(validate_dataset(dataset_name, lang))
+
+    return reports
+
+
+def write_report(reports: list[ValidationReport], directory: pathlib.Path = metrics_dir_path) -> pathlib.Path:
+    directory.mkdir(parents=True, exist_ok=True)
+    report_path = directory / "validation.json"
+
+    write_atomically(
+        report_path, json.dumps({"datasets": [report.to_dict() for report in reports]}, ensure_ascii=False, indent=2)
+    )
+
+    return report_path
+
+
+def main() -> int:
+    logging.basicConfig(level=logging.INFO)
+
+    reports = validate_all()
+    for report in reports:
+        logger.info(
+            "%s (%s): %s rows, %s errors, %s warnings %s",
+            report.dataset_name,
+            report.lang,
+            report.rows,
+            report.errors,
+            report.warnings,
+            {check: count for check, count in report.counts.items() if count},
+        )
+
+    logger.info("Report is written to %s", write_report(reports))
+
+    return 1 if any(report.errors for report in reports) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,13 @@
-import csv
 import datetime
 import logging
-import os
 import pathlib
-import pickle
+import time
 from typing import Optional
 
 from telethon.tl.types import Message
 
+from .channel_processor import ChannelProcessor
+from .keywords_matcher import KeywordsMatcher
 from .tg_dataclasses import ETryvogaChannelAlert
 
 logging.basicConfig()
@@ -20,6 +20,7 @@ data_en_file_path = pathlib.Path(__file__).parent.resolve() / "../datasets/volun
 
 last_processed_id_path = pathlib.Path(__file__).parent.resolve() / "pkl" / "volunteer_last_processed_id.txt"
 pkl_file_path = pathlib.Path(__file__).parent.resolve() / "pkl" / "volunteer_active_alerts.pkl"
+legacy_checkpoint_path = pathlib.Path(__file__).parent.resolve() / "pkl" / "volunteer_checkpoint.json"
 
 # Order matters (Київська > Київ)
 city_keywords = {
@@ -146,116 +147,70 @@ air_raid_keywords = {
     "в укриття": True,
 }
 
+# Compiled once, keeps the priorities of both dicts above
+keywords_matcher = KeywordsMatcher(city_keywords, air_raid_keywords)
 
-class VolunteerEtryvogaProcessor:
-    channel_name = "UkraineAlarmSignal"
-
-    active_alerts_by_location: dict[str, ETryvogaChannelAlert] = {}
-    completed_alerts: list[ETryvogaChannelAlert] = []
-
-    last_processed_id: int = 0
-
-    def __init__(self, client):
-        self.client = client
-
-        self.load_active_alerts()
-        self.load_last_processed_id()
-
-    async def process(self):
-        previous_day = None
-
-        logging.info("Starting processing volunteer channel messages from %s", self.last_processed_id)
-
-        # TODO Fetch latest days from .csv file and just append it
-        async for message in self.client.iter_messages(self.channel_name, reverse=True, min_id=self.last_processed_id):
-            if not previous_day or previous_day != message.date.date():
-                previous_day = message.date.date()
-                logger.info("Processing day %s", previous_day)
-
-            if not message.message:
-                continue
-
-            self.process_message(message)
-
-            self.last_processed_id = message.id
-
-        logging.info("Finished processing volunteer channel messages at %s", self.last_processed_id)
-        self.write()
-
-    def load_active_alerts(self):
-        if not os.path.exists(pkl_file_path):
-            return
-
-        with open(pkl_file_path, "rb") as f:
-            self.active_alerts_by_location = pickle.load(f)
-
-    def dump_active_alerts(self):
-        with open(pkl_file_path, "wb") as f:
-            pickle.dump(self.active_alerts_by_location, f)
-
-    def load_last_processed_id(self):
-        if not os.path.exists(last_processed_id_path):
-            return
 
-        with open(last_processed_id_path, "r") as f:
-            self.last_processed_id = int(f.read())
-
-    def dump_last_processed_id(self):
-        with open(last_processed_id_path, "w") as f:
-            f.write(str(self.last_processed_id))
-
-    def write(self):
-        self.completed_alerts.sort(key=lambda x: x.started_at)
-
-        self.write_to_file(lang="uk")
-        self.write_to_file(lang="en")
-
-        self.dump_active_alerts()
-        self.dump_last_processed_id()
-
-    def write_to_file(self, lang: str = "uk"):
-        file_path = data_uk_file_path if lang == "uk" else data_en_file_path
+class VolunteerEtryvogaProcessor(ChannelProcessor):
+    channel_name = "UkraineAlarmSignal"
+    dataset_name = "volunteer"
+    fieldnames = ["region", "started_at", "finished_at", "naive"]
+    alert_class = ETryvogaChannelAlert
 
-        mode = "a" if os.path.exists(file_path) else "w"
-        with open(file_path, mode, newline="") as csvfile:
-            fieldnames = ["region", "started_at", "finished_at", "naive"]
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+    active_alerts_by_location: dict[str, ETryvogaChannelAlert]
+    completed_alerts: list[ETryvogaChannelAlert]
 
-            if mode == "w":
-                writer.writeheader()
+    dataset_file_paths = {"uk": data_uk_file_path, "en": data_en_file_path}
 
-            for record in self.completed_alerts:
-                writer.writerow(record.dict(lang=lang))
+    pkl_file_path = pkl_file_path
+    last_processed_id_path = last_processed_id_path
+    legacy_checkpoint_path = legacy_checkpoint_path
 
-    def process_message(self, message: Message):
+    def location_events(self, message: Message) -> list[tuple[str, bool, bool]]:
+        """
+        :return: list of tuples (region name, is_enabled, is_disabled), empty if message can't be parsed
+        """
+        started_at = time.perf_counter()
         region_name, is_activated = self.parse_message(message)
+        self.metrics.add_time("parse", time.perf_counter() - started_at)
 
         if region_name is None:
-            return
+            return []
 
+        return [(region_name, is_activated, not is_activated)]
+
+    def update_location(self, region_name: str, date: datetime.datetime, is_activated: bool, is_deactivated: bool):
+        """
+        State machine of one region, it doesn't depend on other regions (see sharded_rebuild module).
+        """
         if is_activated:
             if current_alert := self.active_alerts_by_location.get(region_name):
                 # Looks like it was started some time ago, but there are no message when alert was completed
-                more_than_3_hours_difference = (message.date - current_alert.started_at) > datetime.timedelta(hours=3)
+                more_than_3_hours_difference = (date - current_alert.started_at) > datetime.timedelta(hours=3)
                 if more_than_3_hours_difference:
                     # Looks like it was not marked as completed, but another alert was started
                     # otherwise just rewrite this alert
                     current_alert.finished_at = current_alert.started_at + datetime.timedelta(minutes=30)
                     current_alert.naive = True
                     self.completed_alerts.append(current_alert)
+                    self.metrics.count("synthesized_finishes")
 
             alert = ETryvogaChannelAlert(
-                started_at=message.date,
+                started_at=date,
                 region=region_name,
             )
             self.active_alerts_by_location[region_name] = alert
+            self.changed_locations.add(region_name)
+            self.metrics.count("alerts_started")
 
-        else:
+        elif is_deactivated:
             if alert := self.active_alerts_by_location.get(region_name):
-                alert.finished_at = message.date
+                alert.finished_at = date
                 self.completed_alerts.append(alert)
 
                 del self.active_alerts_by_location[region_name]
+                self.changed_locations.add(region_name)
+                self.metrics.count("alerts_finished")
 
     @staticmethod
     def is_ignored_message(message: Message) -> bool:
@@ -276,17 +231,20 @@ class VolunteerEtryvogaProcessor:
         """
         if self.is_ignored_message(message):
             logger.error("Message %s (%s) is ignored", message.message, message.date)
+            self.metrics.count_parse_failure("ignored")
             return None, None
 
-        region = self.guess_region(message)
+        # Region and state are found in one pass over the message
+        region, is_air_raid_enabled = keywords_matcher.match(message.message)
 
         if not region:
             logger.error("Can't parse region from %s (%s)", message.message, message.date)
+            self.metrics.count_parse_failure("unknown_region")
             return None, None
 
-        is_air_raid_enabled = self.guess_air_raid_state(message)
         if is_air_raid_enabled is None:
             logger.error("Can't parse siren state %s (%s)", message.message, message.date)
+            self.metrics.count_parse_failure("unknown_state")
             return None, None
 
         return region, is_air_raid_enabled
@@ -299,13 +257,9 @@ class VolunteerEtryvogaProcessor:
         :param message: Message object to process
         :return: Region name or None if can't be determined
         """
-        message_normalized = message.message.lower()
+        region, _ = keywords_matcher.match(message.message)
 
-        for city, keywords in city_keywords.items():
-            if any(keyword.lower() in message_normalized for keyword in keywords):
-                return city
-
-        return None
+        return region
 
     @staticmethod
     def guess_air_raid_state(message: Message) -> Optional[bool]:
@@ -315,10 +269,6 @@ class VolunteerEtryvogaProcessor:
         :param message: Message object to parse
         :return: Bool if enabled/disabled, None if can't be determined
         """
-        message_normalized = message.message.lower()
-
-        for keyword, is_enabled in air_raid_keywords.items():
-            if keyword.lower() in message_normalized:
-                return is_enabled
+        _, is_enabled = keywords_matcher.match(message.message)
 
-        return None
+        return is_enabled
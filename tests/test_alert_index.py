@@ -0,0 +1,95 @@
+import datetime
+import random
+import unittest
+
+import pandas as pd
+
+from processors.alert_index import AlertIndex
+
+STARTED_AT = pd.Timestamp("2023-01-01", tz="UTC")
+
+LOCATIONS = [
+    ("Харківська область", "", "", "oblast"),
+    ("Харківська область", "Харківський район", "", "raion"),
+    ("Харківська область", "Харківський район", "Дергачівська територіальна громада", "hromada"),
+    ("Одеська область", "", "", "oblast"),
+    ("Одеська область", "Одеський район", "", "raion"),
+]
+
+COLUMNS = ["oblast", "raion", "hromada", "level", "started_at", "finished_at"]
+
+
+def random_alerts(seed: int, count: int) -> pd.DataFrame:
+    """
+    Alerts of a few days, some of them are long and overlap later ones, the last ones may be not finished.
+    """
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(count):
+        started_at = STARTED_AT + datetime.timedelta(seconds=rng.randrange(5 * 24 * 3600))
+        duration = datetime.timedelta(seconds=rng.choice([rng.randrange(60, 3600), rng.randrange(3600, 2 * 24 * 3600)]))
+        finished_at = started_at + duration if rng.random() > 0.02 else pd.NaT
+        rows.append((*rng.choice(LOCATIONS), started_at, finished_at))
+
+    df = pd.DataFrame(rows, columns=COLUMNS)
+    df["finished_at"] = pd.to_datetime(df["finished_at"], utc=True)
+    return df
+
+
+class AlertIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.df = random_alerts(seed=1, count=500)
+        self.index = AlertIndex.from_dataframe("official", self.df)
+
+    def brute_force(self, start, end, **location) -> set:
+        """
+        Every alert overlapping [start, end], not finished alerts are active till now.
+        """
+        df = self.df
+        for column, value in location.items():
+            df = df[df[column] == value]
+
+        is_overlapping = (df["started_at"] <= end) & (df["finished_at"].isna() | (df["finished_at"] >= start))
+        return set(df[is_overlapping][COLUMNS].itertuples(index=False, name=None))
+
+    def assert_same(self, result: pd.DataFrame, expected: set):
+        rows = list(result[COLUMNS].itertuples(index=False, name=None))
+        self.assertEqual(len(rows), len(expected))
+        # NaT is not equal to itself, so not finished alerts are compared by the rest of columns
+        self.assertEqual({row[:-1] for row in rows}, {row[:-1] for row in expected})
+        self.assertEqual(
+            sorted(str(row[-1]) for row in rows),
+            sorted(str(row[-1]) for row in expected),
+        )
+
+    def test_overlapping(self):
+        rng = random.Random(2)
+        for _ in range(100):
+            start = STARTED_AT + datetime.timedelta(seconds=rng.randrange(6 * 24 * 3600))
+            end = start + datetime.timedelta(seconds=rng.randrange(6 * 3600))
+
+            self.assert_same(self.index.overlapping(start, end), self.brute_force(start, end))
+
+    def test_overlapping_of_location(self):
+        start, end = STARTED_AT + datetime.timedelta(days=2), STARTED_AT + datetime.timedelta(days=2, hours=3)
+
+        for column, value in [("oblast", "Харківська область"), ("level", "raion"), ("raion", "Одеський район")]:
+            self.assert_same(
+                self.index.overlapping(start, end, **{column: value}),
+                self.brute_force(start, end, **{column: value}),
+            )
+
+    def test_at(self):
+        rng = random.Random(3)
+        for _ in range(100):
+            moment = STARTED_AT + datetime.timedelta(seconds=rng.randrange(6 * 24 * 3600))
+
+            self.assert_same(self.index.at(moment), self.brute_force(moment, moment))
+
+    def test_unknown_column(self):
+        with self.assertRaises(ValueError):
+            self.index.at(STARTED_AT, region="Київ")
+
+
+if __name__ == "__main__":
+    unittest.main()
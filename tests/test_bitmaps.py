@@ -0,0 +1,85 @@
+import datetime
+import random
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from processors import bitmaps
+from processors.bitmaps import BITMAP_EPOCH, AlertBitmaps
+
+REGIONS = ["Київська область", "Харківська область", "Одеська область", "Львівська область"]
+
+
+def random_alerts(seed: int, count: int) -> pd.DataFrame:
+    """
+    Alerts of a few days with second precision, alerts of one region may overlap.
+    """
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(count):
+        started_at = BITMAP_EPOCH + datetime.timedelta(seconds=rng.randrange(3 * 24 * 3600))
+        finished_at = started_at + datetime.timedelta(seconds=rng.randrange(1, 4 * 3600))
+        rows.append({"region": rng.choice(REGIONS), "started_at": started_at, "finished_at": finished_at})
+
+    return pd.DataFrame(rows)
+
+
+def minutes_of(df: pd.DataFrame, region: str) -> set[int]:
+    """
+    Brute force: every minute overlapped by an alert of the region.
+    """
+    minutes = set()
+    for row in df[df["region"] == region].itertuples():
+        start = (row.started_at - BITMAP_EPOCH).total_seconds() / 60
+        end = (row.finished_at - BITMAP_EPOCH).total_seconds() / 60
+        minutes.update(range(int(np.floor(start)), int(np.ceil(end))))
+
+    return minutes
+
+
+class AlertBitmapsTest(unittest.TestCase):
+    def setUp(self):
+        self.df = random_alerts(seed=1, count=200)
+        self.bitmaps = AlertBitmaps.from_dataframe("volunteer", self.df)
+        self.location_ids = np.array([self.bitmaps.location_ids(region=region)[0] for region in REGIONS])
+        self.minutes = [minutes_of(self.df, region) for region in REGIONS]
+
+    def test_popcount(self):
+        self.assertEqual(self.bitmaps.popcount(self.location_ids).tolist(), [len(m) for m in self.minutes])
+
+    def test_popcount_of_window(self):
+        start, end = BITMAP_EPOCH + datetime.timedelta(hours=20), BITMAP_EPOCH + datetime.timedelta(hours=50)
+        window = set(range(20 * 60, 50 * 60))
+
+        self.assertEqual(
+            self.bitmaps.popcount(self.location_ids, start, end).tolist(),
+            [len(m & window) for m in self.minutes],
+        )
+
+    def test_appended_rows(self):
+        bitmaps = AlertBitmaps.from_dataframe("volunteer", self.df.iloc[:120])
+        bitmaps.append(self.df.iloc[120:])
+        location_ids = np.array([bitmaps.location_ids(region=region)[0] for region in REGIONS])
+
+        self.assertEqual(bitmaps.popcount(location_ids).tolist(), [len(m) for m in self.minutes])
+
+    def test_at_least(self):
+        starts, ends = self.bitmaps.at_least(self.location_ids, 2)
+        minutes = {m for m in set.union(*self.minutes) if sum(m in s for s in self.minutes) >= 2}
+
+        self.assertEqual(int((ends - starts).sum()), len(minutes))
+
+    def test_cooccurrence(self):
+        expected = [[len(a & b) for b in self.minutes] for a in self.minutes]
+
+        self.assertEqual(self.bitmaps.cooccurrence(self.location_ids).tolist(), expected)
+
+        # Time range is split into many chunks, runs cross their boundaries
+        with mock.patch.object(bitmaps, "MAX_COVERAGE_CELLS", 12):
+            self.assertEqual(self.bitmaps.cooccurrence(self.location_ids).tolist(), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
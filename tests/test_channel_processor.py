@@ -0,0 +1,212 @@
+import asyncio
+import datetime
+import os
+import pathlib
+import random
+import tempfile
+import unittest
+
+from processors.message_sources import ArchivedMessage
+from processors.state_store import StateStore
+from processors.volunteer_etryvoga_processor import VolunteerEtryvogaProcessor
+
+STARTED_AT = datetime.datetime(2022, 4, 10, tzinfo=datetime.timezone.utc)
+
+
+class ListSource:
+    def __init__(self, messages: list, fail_after: int = None):
+        """
+        :param fail_after: Number of messages, after which ConnectionError is raised
+        """
+        self.messages = messages
+        self.fail_after = fail_after
+
+    async def iter_messages(self, channel_name: str, min_id: int = 0):
+        for i, message in enumerate(message for message in self.messages if message.id > min_id):
+            if i == self.fail_after:
+                raise ConnectionError("Connection lost")
+            yield message
+
+
+def alert_messages(count: int) -> list[ArchivedMessage]:
+    messages = []
+    for i in range(count):
+        started_at = STARTED_AT + datetime.timedelta(minutes=15 * i)
+        messages.append(ArchivedMessage(id=2 * i + 1, date=started_at, message="Тривога Київська область"))
+        messages.append(
+            ArchivedMessage(
+                id=2 * i + 2,
+                date=started_at + datetime.timedelta(minutes=10),
+                message="Відбій тривоги Київська область",
+            )
+        )
+
+    return messages
+
+
+def random_alert_messages(seed: int, count: int) -> list[ArchivedMessage]:
+    """
+    Overlapping alerts of several regions, so completed alerts are reordered before they're written.
+    """
+    rng = random.Random(seed)
+    regions = ["Київська область", "Харківська область", "Одеська область", "Львівська область", "Сумська область"]
+    active = set()
+
+    messages = []
+    date = STARTED_AT
+    for i in range(count):
+        date += datetime.timedelta(minutes=rng.randrange(1, 30))
+        region = rng.choice(regions)
+        if region in active:
+            active.remove(region)
+            text = f"Відбій тривоги {region}"
+        else:
+            active.add(region)
+            text = f"Тривога {region}"
+        messages.append(ArchivedMessage(id=i + 1, date=date, message=text))
+
+    return messages
+
+
+class LostStateTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.directory.name)
+        directory = self.path
+
+        class Processor(VolunteerEtryvogaProcessor):
+            dataset_file_paths = {"uk": directory / "volunteer_data_uk.csv", "en": directory / "volunteer_data_en.csv"}
+            pkl_file_path = directory / "volunteer_active_alerts.pkl"
+            last_processed_id_path = directory / "volunteer_last_processed_id.txt"
+            legacy_checkpoint_path = directory / "volunteer_checkpoint.json"
+
+        self.processor_class = Processor
+        self.state_stores = []
+
+        asyncio.run(self.make_processor("state.sqlite3").process())
+
+    def tearDown(self):
+        for state_store in self.state_stores:
+            state_store.close()
+        self.directory.cleanup()
+
+    def make_processor(self, state_file_name: str) -> VolunteerEtryvogaProcessor:
+        state_store = StateStore(self.path / state_file_name)
+        self.state_stores.append(state_store)
+        return self.processor_class(source=ListSource(alert_messages(10)), state_store=state_store)
+
+    def test_existing_state_is_restored(self):
+        processor = self.make_processor("state.sqlite3")
+
+        self.assertEqual(processor.last_processed_id, 20)
+
+    def test_processing_from_first_message_is_refused(self):
+        # E.g. state evicted from Actions cache
+        with self.assertRaises(RuntimeError):
+            self.make_processor("evicted.sqlite3")
+
+    def test_rebuild_without_datasets(self):
+        for file_path in self.processor_class.dataset_file_paths.values():
+            os.remove(file_path)
+
+        processor = self.make_processor("evicted.sqlite3")
+
+        self.assertEqual(processor.last_processed_id, 0)
+
+
+class AdvanceOnCheckpointTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        directory = pathlib.Path(self.directory.name)
+
+        class Processor(VolunteerEtryvogaProcessor):
+            dataset_file_paths = {"uk": directory / "volunteer_data_uk.csv", "en": directory / "volunteer_data_en.csv"}
+            pkl_file_path = directory / "volunteer_active_alerts.pkl"
+            last_processed_id_path = directory / "volunteer_last_processed_id.txt"
+            legacy_checkpoint_path = directory / "volunteer_checkpoint.json"
+            # Every message is checkpointed, as in live mode after a pause
+            checkpoint_every_seconds = 0
+
+        self.state_store = StateStore(directory / "state.sqlite3")
+        self.processor = Processor(source=ListSource(alert_messages(10)), state_store=self.state_store)
+
+        self.dataset_path = Processor.dataset_file_paths["uk"]
+        self.written_rows = []
+        self.processor.message_listeners.append(lambda processor, message: self.written_rows.append(self.count_rows()))
+
+    def tearDown(self):
+        self.state_store.close()
+        self.directory.cleanup()
+
+    def count_rows(self) -> int:
+        if not os.path.exists(self.dataset_path):
+            return 0
+
+        with open(self.dataset_path, encoding="utf-8") as f:
+            # Header is written with the first rows
+            return len(f.readlines()[1:])
+
+    def test_completed_alerts_are_written_with_checkpoint(self):
+        self.processor.advance_on_checkpoint = True
+        asyncio.run(self.processor.process())
+
+        # Listeners are called before the checkpoint of the message, which finishes the last alert
+        self.assertEqual(self.written_rows[-1], 9)
+
+    def test_completed_alerts_wait_for_batch(self):
+        asyncio.run(self.processor.process())
+
+        self.assertEqual(self.written_rows[-1], 0)
+        self.assertEqual(self.count_rows(), 10)
+
+
+class ResumeTest(unittest.TestCase):
+    def make_processor_class(self, directory: pathlib.Path) -> type:
+        class Processor(VolunteerEtryvogaProcessor):
+            dataset_file_paths = {"uk": directory / "volunteer_data_uk.csv", "en": directory / "volunteer_data_en.csv"}
+            pkl_file_path = directory / "volunteer_active_alerts.pkl"
+            last_processed_id_path = directory / "volunteer_last_processed_id.txt"
+            legacy_checkpoint_path = directory / "volunteer_checkpoint.json"
+            checkpoint_every_messages = 100
+
+        return Processor
+
+    def run_processor(self, directory: pathlib.Path, messages: list, fail_after_list: list[int]) -> dict[str, bytes]:
+        """
+        :param fail_after_list: Every run fails after this number of messages, the last run finishes
+        :return: Content of datasets by language
+        """
+        processor_class = self.make_processor_class(directory)
+        state_store = StateStore(directory / "state.sqlite3")
+
+        try:
+            for fail_after in fail_after_list:
+                processor = processor_class(source=ListSource(messages, fail_after), state_store=state_store)
+                with self.assertRaises(ConnectionError):
+                    asyncio.run(processor.process())
+
+            asyncio.run(processor_class(source=ListSource(messages), state_store=state_store).process())
+        finally:
+            state_store.close()
+
+        result = {}
+        for lang, file_path in processor_class.dataset_file_paths.items():
+            with open(file_path, "rb") as f:
+                result[lang] = f.read()
+
+        return result
+
+    def test_datasets_are_the_same_after_failures(self):
+        messages = random_alert_messages(seed=1, count=4000)
+
+        with tempfile.TemporaryDirectory() as expected_directory, tempfile.TemporaryDirectory() as directory:
+            expected = self.run_processor(pathlib.Path(expected_directory), messages, [])
+            # Failures happen between checkpoints, with rows and pending alerts written after the last one
+            result = self.run_processor(pathlib.Path(directory), messages, [1250, 30, 999, 1601])
+
+        self.assertGreater(expected["uk"].count(b"\n"), 1000)
+        self.assertEqual(result, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import random
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from processors import hierarchy_rollup
+from processors.datasets import series_to_seconds
+from processors.hierarchy_rollup import compute_coverage, merge_intervals
+from processors.loader import TypedDataset
+
+RAIONS = {"Харківська область": ["Ізюмський район", "Харківський район"], "Одеська область": ["Одеський район"]}
+
+# (oblast, raion, level) of alerts, hromada names don't matter for coverage
+LOCATIONS = [
+    ("Харківська область", "", "oblast"),
+    ("Харківська область", "Харківський район", "raion"),
+    ("Харківська область", "Ізюмський район", "hromada"),
+    ("Одеська область", "", "oblast"),
+    ("Одеська область", "Одеський район", "hromada"),
+]
+
+
+def brute_force_merge(intervals: list[tuple[int, int]]) -> list[tuple[int, int, int]]:
+    """
+    :return: list of (started_at, finished_at, alerts) of merged overlapping and touching intervals
+    """
+    merged = []
+    for started_at, finished_at in sorted(intervals):
+        if merged and started_at <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], finished_at), merged[-1][2] + 1)
+        else:
+            merged.append((started_at, finished_at, 1))
+
+    return merged
+
+
+def random_alerts(seed: int, count: int) -> list[tuple]:
+    rng = random.Random(seed)
+    alerts = []
+    for _ in range(count):
+        started_at = rng.randrange(100_000)
+        alerts.append((*rng.choice(LOCATIONS), started_at, started_at + rng.randrange(1, 5000)))
+
+    return alerts
+
+
+def typed_dataset(alerts: list[tuple]) -> TypedDataset:
+    arrays, names = {}, {}
+    for i, column in enumerate(["oblast", "raion", "level"]):
+        codes, uniques = pd.factorize(pd.Series([alert[i] for alert in alerts]))
+        arrays[column] = codes
+        names[column] = list(uniques)
+
+    arrays["started_at"] = np.array([alert[3] for alert in alerts], dtype=np.int64)
+    arrays["finished_at"] = np.array([alert[4] for alert in alerts], dtype=np.int64)
+
+    return TypedDataset("official", arrays, names)
+
+
+def to_tuples(df: pd.DataFrame, columns: list[str]) -> set:
+    df = df.copy()
+    for column in ["started_at", "finished_at"]:
+        df[column] = series_to_seconds(df[column])
+
+    return set(df[columns + ["started_at", "finished_at", "alerts"]].itertuples(index=False, name=None))
+
+
+class MergeIntervalsTest(unittest.TestCase):
+    def test_random_intervals(self):
+        rng = random.Random(1)
+        locations = np.array([rng.randrange(5) for _ in range(2000)], dtype=np.int64)
+        started_at = np.array([rng.randrange(100_000) for _ in range(2000)], dtype=np.int64)
+        finished_at = started_at + np.array([rng.randrange(0, 500) for _ in range(2000)], dtype=np.int64)
+
+        merged = merge_intervals(locations, started_at, finished_at)
+
+        for location in range(5):
+            is_location = locations == location
+            expected = brute_force_merge(list(zip(started_at[is_location], finished_at[is_location])))
+            rows = merged[merged["location"] == location]
+
+            self.assertEqual(list(zip(rows["started_at"], rows["finished_at"], rows["alerts"])), expected)
+
+    def test_touching_intervals(self):
+        merged = merge_intervals(np.zeros(3, dtype=np.int64), np.array([0, 10, 21]), np.array([10, 20, 30]))
+
+        self.assertEqual(merged[["started_at", "finished_at", "alerts"]].values.tolist(), [[0, 20, 2], [21, 30, 1]])
+
+
+class CoverageTest(unittest.TestCase):
+    def setUp(self):
+        self.alerts = random_alerts(seed=2, count=300)
+
+        with mock.patch.object(hierarchy_rollup, "load_dataset", return_value=typed_dataset(self.alerts)):
+            with mock.patch.object(hierarchy_rollup, "raions_by_oblast", return_value=RAIONS):
+                self.raion_coverage, self.oblast_coverage = compute_coverage()
+
+    def test_raion_coverage(self):
+        expected = set()
+        for oblast, raions in RAIONS.items():
+            for raion in raions:
+                intervals = [
+                    (started_at, finished_at)
+                    for alert_oblast, alert_raion, level, started_at, finished_at in self.alerts
+                    if alert_oblast == oblast and (level == "oblast" or alert_raion == raion)
+                ]
+                expected |= {(oblast, raion, *interval) for interval in brute_force_merge(intervals)}
+
+        self.assertEqual(to_tuples(self.raion_coverage, ["oblast", "raion"]), expected)
+
+    def test_oblast_coverage(self):
+        expected = set()
+        for oblast in RAIONS:
+            intervals = [(alert[3], alert[4]) for alert in self.alerts if alert[0] == oblast]
+            expected |= {(oblast, *interval) for interval in brute_force_merge(intervals)}
+
+        self.assertEqual(to_tuples(self.oblast_coverage, ["oblast"]), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
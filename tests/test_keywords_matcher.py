@@ -0,0 +1,65 @@
+import random
+import unittest
+
+from processors.keywords_matcher import KeywordsMatcher, keywords_to_pattern
+from processors.volunteer_etryvoga_processor import air_raid_keywords, city_keywords
+
+FILLER = ["у", "в", "області", "оголошено", "для", "🔴", "🟢", "!", ",", "#", "м.", "району", "та"]
+
+
+def substring_match(region_keywords: dict, state_keywords: dict, text: str) -> tuple:
+    """
+    Matching of previous versions: the first region or state with a keyword contained in the text wins.
+    """
+    text = text.lower()
+
+    region = next(
+        (region for region, keywords in region_keywords.items() if any(k.lower() in text for k in keywords)), None
+    )
+    state = next((state for keyword, state in state_keywords.items() if keyword.lower() in text), None)
+
+    return region, state
+
+
+def random_messages(seed: int, keywords: list[str], count: int) -> list[str]:
+    rng = random.Random(seed)
+    messages = []
+    for _ in range(count):
+        words = rng.sample(keywords, rng.randrange(0, 4)) + rng.sample(FILLER, rng.randrange(0, 5))
+        rng.shuffle(words)
+        # Keywords are found inside words as well, e.g. with endings or without spaces
+        separator = rng.choice([" ", "", "-"])
+        text = separator.join(words)
+        messages.append(text.upper() if rng.random() < 0.2 else text)
+
+    return messages
+
+
+class KeywordsMatcherTest(unittest.TestCase):
+    def assert_same_as_substring_match(self, region_keywords: dict, state_keywords: dict, messages: list[str]):
+        matcher = KeywordsMatcher(region_keywords, state_keywords)
+
+        for text in messages:
+            self.assertEqual(matcher.match(text), substring_match(region_keywords, state_keywords, text), text)
+
+    def test_volunteer_keywords(self):
+        keywords = [keyword for keywords in city_keywords.values() for keyword in keywords] + list(air_raid_keywords)
+
+        self.assert_same_as_substring_match(
+            city_keywords, air_raid_keywords, random_messages(seed=1, keywords=keywords, count=5000)
+        )
+
+    def test_overlapping_keywords(self):
+        # Keywords are prefixes, suffixes and parts of each other with different priorities
+        region_keywords = {"a": {"абв", "в"}, "b": {"аб", "бвг"}, "c": {"б", "гд"}}
+        state_keywords = {"вг": False, "а": True, "абвгд": False}
+
+        messages = random_messages(seed=2, keywords=["а", "б", "в", "г", "д", "аб", "вг"], count=2000)
+        self.assert_same_as_substring_match(region_keywords, state_keywords, messages)
+
+    def test_longest_keyword_first(self):
+        self.assertEqual(keywords_to_pattern({"київ", "київська", "київській"}), "київ(?:ськ(?:а|ій))?")
+
+
+if __name__ == "__main__":
+    unittest.main()
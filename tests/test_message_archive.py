@@ -0,0 +1,105 @@
+import asyncio
+import datetime
+import os
+import pathlib
+import tempfile
+import unittest
+
+from processors.message_archive import ArchivingMessageSource, ChannelArchive, MessageArchive
+from processors.message_sources import ArchivedMessage
+
+STARTED_AT = datetime.datetime(2022, 4, 10, tzinfo=datetime.timezone.utc)
+
+
+def make_messages(min_id: int, max_id: int) -> list[ArchivedMessage]:
+    return [
+        ArchivedMessage(id=i, date=STARTED_AT + datetime.timedelta(minutes=i), message=f"Message {i}")
+        for i in range(min_id, max_id + 1)
+    ]
+
+
+class CrashRecoveryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.directory.name)
+
+        archive = ChannelArchive(self.path, "channel", block_size=10)
+        for message in make_messages(1, 30):
+            archive.append(message)
+
+        self.blocks_path = archive.blocks_path
+        self.index_path = archive.index_path
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_partial_index_line(self):
+        # The third block is written, but its index line is not
+        with open(self.index_path, "rb") as f:
+            lines = f.readlines()
+        with open(self.index_path, "wb") as f:
+            f.writelines(lines[:2])
+            f.write(lines[2][:20])
+
+        archive = ChannelArchive(self.path, "channel", block_size=10)
+        self.assertEqual(archive.last_id, 30)
+
+        for message in make_messages(31, 40):
+            archive.append(message)
+
+        archive = ChannelArchive(self.path, "channel", block_size=10)
+        self.assertEqual([message.id for message in archive.read()], list(range(1, 41)))
+
+    def test_partial_block(self):
+        with open(self.index_path, "rb") as f:
+            lines = f.readlines()
+        with open(self.index_path, "wb") as f:
+            f.writelines(lines[:2])
+        with open(self.blocks_path, "r+b") as f:
+            f.truncate(os.path.getsize(self.blocks_path) - 5)
+
+        archive = ChannelArchive(self.path, "channel", block_size=10)
+        self.assertEqual(archive.last_id, 20)
+
+        for message in make_messages(21, 30):
+            archive.append(message)
+
+        archive = ChannelArchive(self.path, "channel", block_size=10)
+        self.assertEqual([message.id for message in archive.read()], list(range(1, 31)))
+
+
+class ListSource:
+    def __init__(self, messages: list):
+        self.messages = messages
+
+    async def iter_messages(self, channel_name: str, min_id: int = 0):
+        for message in self.messages:
+            if message.id > min_id:
+                yield message
+
+
+class ArchivingMessageSourceTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.archive = MessageArchive(self.directory.name, block_size=10)
+
+        for message in make_messages(1, 20):
+            self.archive.channel("channel").append(message)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    async def collect(self, min_id: int) -> list[int]:
+        source = ArchivingMessageSource(ListSource(make_messages(1, 40)), self.archive)
+        return [message.id async for message in source.iter_messages("channel", min_id=min_id)]
+
+    def test_missing_messages_are_archived(self):
+        # Messages 21..30 were processed, but lost before they were archived
+        self.assertEqual(asyncio.run(self.collect(min_id=30)), list(range(31, 41)))
+
+        archive = MessageArchive(self.directory.name, block_size=10)
+        self.assertEqual([message.id for message in archive.channel("channel").read()], list(range(1, 41)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import asyncio
+import datetime
+import json
+import pathlib
+import tempfile
+import unittest
+
+from processors.message_sources import ArchivedMessage
+from processors.metrics import METRIC_PREFIX, write_metrics
+from processors.state_store import StateStore
+from processors.volunteer_etryvoga_processor import VolunteerEtryvogaProcessor
+
+STARTED_AT = datetime.datetime(2022, 4, 10, tzinfo=datetime.timezone.utc)
+
+TEXTS = [
+    "Тривога Київська область",
+    "",
+    "Відбій тривоги Київська область",
+    "Тривога триває Київська область",
+    "Тривога Харківська область",
+    "Тривога на Марсі",
+    "Харківська область",
+    "Відбій тривоги Харківська область",
+]
+
+
+class ListSource:
+    def __init__(self, messages: list):
+        self.messages = messages
+
+    async def iter_messages(self, channel_name: str, min_id: int = 0):
+        for message in self.messages:
+            if message.id > min_id:
+                yield message
+
+
+class ProcessingMetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.directory.name)
+        directory = self.path
+
+        class Processor(VolunteerEtryvogaProcessor):
+            dataset_file_paths = {"uk": directory / "volunteer_data_uk.csv", "en": directory / "volunteer_data_en.csv"}
+            pkl_file_path = directory / "volunteer_active_alerts.pkl"
+            last_processed_id_path = directory / "volunteer_last_processed_id.txt"
+            legacy_checkpoint_path = directory / "volunteer_checkpoint.json"
+
+        messages = [
+            ArchivedMessage(id=i + 1, date=STARTED_AT + datetime.timedelta(minutes=10 * i), message=text)
+            for i, text in enumerate(TEXTS)
+        ]
+
+        self.state_store = StateStore(directory / "state.sqlite3")
+        self.processor = Processor(source=ListSource(messages), state_store=self.state_store)
+        asyncio.run(self.processor.process())
+
+    def tearDown(self):
+        self.state_store.close()
+        self.directory.cleanup()
+
+    def test_counters(self):
+        metrics = self.processor.metrics
+
+        self.assertEqual(metrics.counters["messages"], len(TEXTS))
+        self.assertEqual(metrics.counters["alerts_started"], 2)
+        self.assertEqual(metrics.counters["alerts_finished"], 2)
+        self.assertEqual(metrics.counters["rows_written"], 2)
+        self.assertEqual(
+            dict(metrics.parse_failures), {"empty": 1, "ignored": 1, "unknown_region": 1, "unknown_state": 1}
+        )
+        self.assertGreater(metrics.stage_seconds["total"], 0)
+
+    def test_write_metrics(self):
+        write_metrics([self.processor.metrics], failed_channels=[], directory=self.path)
+
+        with open(self.path / "processing.json", encoding="utf-8") as f:
+            summary = json.load(f)
+        self.assertEqual(summary["channels"][0]["parse_failures"]["unknown_region"], 1)
+
+        with open(self.path / "processing.prom", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+
+        channel = self.processor.channel_name
+        self.assertIn(f'{METRIC_PREFIX}_events{{channel="{channel}",event="rows_written"}} 2', lines)
+        self.assertIn(f'{METRIC_PREFIX}_parse_failures{{channel="{channel}",reason="empty"}} 1', lines)
+        self.assertIn(f'{METRIC_PREFIX}_success{{channel="{channel}"}} 1', lines)
+
+
+if __name__ == "__main__":
+    unittest.main()
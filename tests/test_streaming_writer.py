@@ -0,0 +1,154 @@
+import asyncio
+import csv
+import datetime
+import os
+import pathlib
+import tempfile
+import unittest
+
+from processors.message_sources import ArchivedMessage
+from processors.state_store import StateStore
+from processors.streaming_writer import MAX_ACTIVE_AGE, active_watermark
+from processors.tg_dataclasses import ETryvogaChannelAlert
+from processors.volunteer_etryvoga_processor import VolunteerEtryvogaProcessor
+
+STARTED_AT = datetime.datetime(2022, 4, 10, tzinfo=datetime.timezone.utc)
+
+# Permanent siren, there is no message about its end
+STALE_ALERT = ETryvogaChannelAlert(
+    region="Луганська область", started_at=datetime.datetime(2022, 4, 4, 16, 45, tzinfo=datetime.timezone.utc)
+)
+
+
+class ListSource:
+    def __init__(self, messages: list, fail_after: int = None):
+        """
+        :param fail_after: Number of messages, after which ConnectionError is raised
+        """
+        self.messages = messages
+        self.fail_after = fail_after
+
+    async def iter_messages(self, channel_name: str, min_id: int = 0):
+        for i, message in enumerate(message for message in self.messages if message.id > min_id):
+            if i == self.fail_after:
+                raise ConnectionError("Connection lost")
+            yield message
+
+
+def alert_messages(count: int) -> list[ArchivedMessage]:
+    """
+    Alerts of Kyiv oblast every 15 minutes, each one is 10 minutes long.
+    """
+    messages = []
+    for i in range(count):
+        started_at = STARTED_AT + datetime.timedelta(minutes=15 * i)
+        messages.append(ArchivedMessage(id=2 * i + 1, date=started_at, message="Тривога Київська область"))
+        messages.append(
+            ArchivedMessage(
+                id=2 * i + 2,
+                date=started_at + datetime.timedelta(minutes=10),
+                message="Відбій тривоги Київська область",
+            )
+        )
+
+    return messages
+
+
+class ActiveWatermarkTest(unittest.TestCase):
+    def test_stale_alerts_are_ignored(self):
+        current_date = STARTED_AT + datetime.timedelta(days=3)
+        recent = current_date - datetime.timedelta(hours=2)
+
+        self.assertEqual(active_watermark([STALE_ALERT.started_at, recent], current_date), recent)
+        self.assertEqual(active_watermark([STALE_ALERT.started_at], current_date), current_date)
+        self.assertEqual(active_watermark([current_date - MAX_ACTIVE_AGE], current_date), current_date - MAX_ACTIVE_AGE)
+
+
+class StaleActiveAlertTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        directory = pathlib.Path(self.directory.name)
+
+        class Processor(VolunteerEtryvogaProcessor):
+            dataset_file_paths = {"uk": directory / "volunteer_data_uk.csv", "en": directory / "volunteer_data_en.csv"}
+            pkl_file_path = directory / "volunteer_active_alerts.pkl"
+            last_processed_id_path = directory / "volunteer_last_processed_id.txt"
+            legacy_checkpoint_path = directory / "volunteer_checkpoint.json"
+
+        self.processor_class = Processor
+        self.state_store = StateStore(directory / "state.sqlite3")
+        self.processor = Processor(source=ListSource(alert_messages(2000)), state_store=self.state_store)
+        self.processor.active_alerts_by_location = {STALE_ALERT.region: STALE_ALERT}
+
+        self.dataset_path = Processor.dataset_file_paths["uk"]
+
+    def read_rows(self) -> list[dict]:
+        with open(self.dataset_path, newline="", encoding="utf-8") as f:
+            return list(csv.DictReader(f))
+
+    def tearDown(self):
+        self.state_store.close()
+        self.directory.cleanup()
+
+    def test_rows_are_written_while_processing(self):
+        dataset_sizes = []
+        self.processor.message_listeners.append(
+            lambda processor, message: dataset_sizes.append(
+                os.path.getsize(self.dataset_path) if os.path.exists(self.dataset_path) else 0
+            )
+        )
+
+        asyncio.run(self.processor.process())
+
+        # Reorder buffer is flushed every few hundreds of alerts, not only at the end
+        self.assertGreater(dataset_sizes[len(dataset_sizes) // 2], 0)
+
+        rows = self.read_rows()
+
+        self.assertEqual(len(rows), 2000)
+        self.assertEqual([row["started_at"] for row in rows], sorted(row["started_at"] for row in rows))
+        self.assertIn(STALE_ALERT.region, self.processor.active_alerts_by_location)
+
+    def test_stale_alert_is_written_when_completed(self):
+        messages = self.processor.source.messages
+        messages.append(
+            ArchivedMessage(
+                id=messages[-1].id + 1,
+                date=messages[-1].date + datetime.timedelta(minutes=5),
+                message="Відбій тривоги Луганська область",
+            )
+        )
+
+        asyncio.run(self.processor.process())
+
+        rows = self.read_rows()
+
+        self.assertEqual(len(rows), 2001)
+        self.assertEqual(rows[-1]["region"], STALE_ALERT.region)
+        self.assertEqual(rows[-1]["started_at"], str(STALE_ALERT.started_at))
+
+    def test_resume_after_failure(self):
+        messages = self.processor.source.messages
+        self.processor_class.checkpoint_every_messages = 100
+        self.processor.source = ListSource(messages, fail_after=3250)
+
+        with self.assertRaises(ConnectionError):
+            asyncio.run(self.processor.process())
+
+        # Alerts waiting in the reorder buffer are kept by checkpoint
+        checkpoint = self.state_store.load_checkpoint(self.processor.channel_name)
+        self.assertTrue(checkpoint.pending_alerts)
+        self.assertEqual(checkpoint.last_processed_id, 3200)
+
+        processor = self.processor_class(source=ListSource(messages), state_store=self.state_store)
+        asyncio.run(processor.process())
+
+        rows = self.read_rows()
+
+        self.assertEqual(len(rows), 2000)
+        self.assertEqual([row["started_at"] for row in rows], sorted(row["started_at"] for row in rows))
+        self.assertFalse(self.state_store.load_checkpoint(processor.channel_name).pending_alerts)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import csv
+import os
+import pathlib
+import tempfile
+import unittest
+from unittest import mock
+
+from processors import tail_index
+from processors.tail_index import TailIndex
+
+HEADER = ["region", "started_at", "finished_at"]
+
+
+def make_rows(first: int, last: int) -> list[list[str]]:
+    return [["Київська область", f"2022-04-10 {i // 60:02}:{i % 60:02}:00+00:00", ""] for i in range(first, last + 1)]
+
+
+class TailIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.directory.name) / "volunteer_data_uk.csv"
+
+        with open(self.path, "w", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerow(HEADER)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def append(self, rows: list, save_index: bool = True, tail_size: int = 100) -> int:
+        """
+        Run of a processor: appends rows through the tail index.
+
+        :return: Number of written rows
+        """
+        index = TailIndex.load(self.path, tail_size=tail_size)
+
+        with open(self.path, "a", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            written = sum(index.append_row(writer, row) for row in rows)
+            f.flush()
+
+            if save_index:
+                index.save(os.fstat(f.fileno()).st_size)
+
+        return written
+
+    def read_rows(self) -> list:
+        with open(self.path, newline="", encoding="utf-8") as f:
+            return list(csv.reader(f))[1:]
+
+    def test_rows_of_previous_run_are_skipped(self):
+        self.append(make_rows(1, 50))
+
+        # Previous run failed after writing rows 41..50, so they're written again with new ones
+        self.assertEqual(self.append(make_rows(41, 60)), 10)
+        self.assertEqual(self.read_rows(), make_rows(1, 60))
+
+    def test_index_is_rebuilt_when_rows_were_written_without_it(self):
+        self.append(make_rows(1, 50))
+        # Rows were flushed, but the run crashed before the index was saved
+        self.append(make_rows(51, 70), save_index=False)
+
+        self.assertEqual(self.append(make_rows(61, 80)), 10)
+        self.assertEqual(self.read_rows(), make_rows(1, 80))
+
+    def test_index_is_rebuilt_from_the_end_of_file(self):
+        self.append(make_rows(1, 300))
+        os.remove(self.path.with_suffix(".csv.idx"))
+
+        # Small chunks make the file to be read backwards in several steps
+        with mock.patch.object(tail_index, "READ_CHUNK_SIZE", 256):
+            self.assertEqual(self.append(make_rows(251, 320)), 20)
+
+        self.assertEqual(self.read_rows(), make_rows(1, 320))
+
+    def test_only_tail_is_checked(self):
+        self.append(make_rows(1, 300))
+
+        # Rows older than the tail are not expected to be written again, so they're not skipped
+        self.assertEqual(self.append(make_rows(1, 1)), 1)
+
+    def test_truncated_file(self):
+        self.append(make_rows(1, 50))
+
+        # Rolled back to a checkpoint after the first 30 rows
+        with open(self.path, "r+b") as f:
+            data = f.read()
+            f.truncate(len(b"".join(data.splitlines(keepends=True)[:31])))
+
+        self.assertEqual(self.append(make_rows(31, 60)), 30)
+        self.assertEqual(self.read_rows(), make_rows(1, 60))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+import pathlib
+import tempfile
+import unittest
+
+from processors.validation import validate_dataset
+
+HEADER = "region,started_at,finished_at,naive\n"
+
+
+class DurationTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.directory.name) / "volunteer_data_uk.csv"
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def validate(self, rows: list[str]):
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(HEADER + "".join(row + "\n" for row in rows))
+
+        return validate_dataset("volunteer", "uk", self.path)
+
+    def test_zero_duration_is_warning(self):
+        report = self.validate(
+            [
+                "Київ,2022-04-10 10:00:00+00:00,2022-04-10 10:00:00+00:00,False",
+                "Київ,2022-04-10 11:00:00+00:00,2022-04-10 11:30:00+00:00,False",
+            ]
+        )
+
+        self.assertEqual(report.counts["zero_duration"], 1)
+        self.assertEqual(report.errors, 0)
+
+    def test_negative_duration_is_error(self):
+        report = self.validate(["Київ,2022-04-10 10:00:00+00:00,2022-04-10 09:00:00+00:00,False"])
+
+        self.assertEqual(report.counts["negative_duration"], 1)
+        self.assertEqual(report.errors, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()